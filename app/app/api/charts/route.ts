@@ -0,0 +1,38 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+// Chart-ready aggregates computed by the analyzer (see create_chart_data):
+// engagement score histogram, top-utilizer tool counts and mean engagement
+// score per report date
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const sessionId = searchParams.get('sessionId')
+
+    if (!sessionId) {
+      return NextResponse.json({ error: 'Session ID is required' }, { status: 400 })
+    }
+
+    const results = await analysisResults.get(sessionId)
+    if (!results) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const charts = await loadSessionDataset(sessionId, results, 'charts', raw => raw)
+    if (!charts) {
+      return NextResponse.json({ error: 'Chart data is not available for this session' }, { status: 404 })
+    }
+
+    return NextResponse.json({
+      status: 'success',
+      ...charts
+    })
+  } catch (error) {
+    console.error('Charts API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to fetch chart data' },
+      { status: 500 }
+    )
+  }
+}
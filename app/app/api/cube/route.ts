@@ -0,0 +1,74 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import {
+  CUBE_DIMENSIONS,
+  CubeDimension,
+  CubeQueryError,
+  getAggregateCube,
+  queryCube
+} from '@/lib/aggregate-cube'
+
+// Aggregate queries over Company, Department, City, month and classification,
+// answered from the session's precomputed cube, e.g.
+//   ?sessionId=...&groupBy=department&classification=For%20Reallocation
+//   ?sessionId=...&groupBy=city,month
+// Filters are repeatable (`department=Sales&department=IT`). Grouped or
+// filtered by month, metrics are that month's own; otherwise the run's.
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const sessionId = searchParams.get('sessionId')
+
+    if (!sessionId) {
+      return NextResponse.json({ error: 'Session ID is required' }, { status: 400 })
+    }
+
+    const groupBy = (searchParams.get('groupBy') || '')
+      .split(',')
+      .map(dimension => dimension.trim())
+      .filter(Boolean)
+    const unknown = groupBy.filter(dimension => !CUBE_DIMENSIONS.includes(dimension as CubeDimension))
+    if (unknown.length > 0) {
+      return NextResponse.json(
+        { error: `Unknown dimension(s): ${unknown.join(', ')}. Expected ${CUBE_DIMENSIONS.join(', ')}` },
+        { status: 400 }
+      )
+    }
+
+    const filters: Partial<Record<CubeDimension, string[]>> = {}
+    for (const dimension of CUBE_DIMENSIONS) {
+      const values = searchParams.getAll(dimension)
+      if (values.length > 0) filters[dimension] = values
+    }
+
+    const results = await analysisResults.get(sessionId)
+    if (!results) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const cube = await getAggregateCube(sessionId, results)
+    if (!cube) {
+      return NextResponse.json(
+        { error: 'Aggregate cube is only available for analyses run with a target users file' },
+        { status: 404 }
+      )
+    }
+
+    return NextResponse.json({
+      status: 'success',
+      groupBy,
+      filters,
+      rows: queryCube(cube, { groupBy: groupBy as CubeDimension[], filters }),
+      dimensionValues: cube.dimensionValues
+    })
+  } catch (error) {
+    if (error instanceof CubeQueryError) {
+      return NextResponse.json({ error: error.message }, { status: 400 })
+    }
+    console.error('Cube API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to query aggregate cube' },
+      { status: 500 }
+    )
+  }
+}
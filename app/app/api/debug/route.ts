@@ -1,6 +1,7 @@
 
 import { NextRequest, NextResponse } from 'next/server'
 import { analysisResults } from '@/lib/analysis-store'
+import { sessionManager } from '@/lib/session-manager'
 
 export async function GET(request: NextRequest) {
   try {
@@ -21,7 +22,8 @@ export async function GET(request: NextRequest) {
     return NextResponse.json({
       totalSessions: sessions.length,
       sessions: sessions,
-      sessionData: sessionData
+      sessionData: sessionData,
+      sessionIndex: sessionManager.list()
     })
   } catch (error) {
     console.error('Debug API error:', error)
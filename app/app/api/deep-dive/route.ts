@@ -1,6 +1,8 @@
 
 import { NextRequest, NextResponse } from 'next/server'
 import { analysisResults } from '@/lib/analysis-store'
+import { getToolIndex, compareCohort } from '@/lib/tool-index'
+import { ensureDeepDivePayload, sendPrecompressed } from '@/lib/precompressed'
 
 export async function GET(request: NextRequest) {
   try {
@@ -49,6 +51,15 @@ export async function GET(request: NextRequest) {
       return NextResponse.json({ error: 'No detailed user data available' }, { status: 404 })
     }
     
+    // Serve the payload serialized and compressed when the session was stored
+    const payloadPath = await ensureDeepDivePayload(results).catch(error => {
+      console.error('Deep dive payload unavailable:', error)
+      return null
+    })
+    if (payloadPath) {
+      return sendPrecompressed(request, payloadPath, { 'Content-Type': 'application/json' })
+    }
+
     // Use the real detailed user data from the Python backend
     const detailedUsers = results.detailed_users
     console.log('Returning', detailedUsers.length, 'users')
@@ -90,8 +101,12 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: 'No detailed user data available' }, { status: 404 })
     }
     
-    // Generate comparison data for selected users using real data
-    const comparisonData = generateComparisonData(selectedUsers, results.detailed_users)
+    // Generate comparison data for selected users from the session's tool index
+    const toolIndex = await getToolIndex(sessionId, results)
+    if (!toolIndex) {
+      return NextResponse.json({ error: 'No detailed user data available' }, { status: 404 })
+    }
+    const comparisonData = compareCohort(toolIndex, results.detailed_users, selectedUsers || [])
     
     return NextResponse.json({
       status: 'success',
@@ -105,89 +120,3 @@ export async function POST(request: NextRequest) {
     )
   }
 }
-
-function generateComparisonData(selectedUsers: string[], allUsers: any[]) {
-  if (selectedUsers.length === 0) {
-    return {
-      averageEngagement: 0,
-      totalToolsUsed: 0,
-      commonTools: [],
-      trendAnalysis: {
-        increasing: 0,
-        stable: 0,
-        decreasing: 0
-      },
-      riskDistribution: {
-        low: 0,
-        medium: 0,
-        high: 0
-      }
-    }
-  }
-  
-  // Filter to only selected users
-  const selectedUserData = allUsers.filter(user => selectedUsers.includes(user.email))
-  
-  // Calculate average engagement
-  const averageEngagement = selectedUserData.length > 0 
-    ? selectedUserData.reduce((sum, user) => sum + (user.engagementScore || 0), 0) / selectedUserData.length
-    : 0
-  
-  // Calculate total unique tools used
-  const allToolsUsed = new Set<string>()
-  selectedUserData.forEach(user => {
-    if (user.toolsUsed && Array.isArray(user.toolsUsed)) {
-      user.toolsUsed.forEach((tool: string) => allToolsUsed.add(tool))
-    }
-  })
-  
-  // Find common tools (tools used by at least 50% of selected users)
-  const toolCounts: { [key: string]: number } = {}
-  selectedUserData.forEach(user => {
-    if (user.toolsUsed && Array.isArray(user.toolsUsed)) {
-      user.toolsUsed.forEach((tool: string) => {
-        toolCounts[tool] = (toolCounts[tool] || 0) + 1
-      })
-    }
-  })
-  
-  const commonTools = Object.keys(toolCounts).filter((tool: string) => 
-    toolCounts[tool] >= Math.max(1, Math.floor(selectedUserData.length * 0.5))
-  )
-  
-  // Calculate trend analysis
-  const trendCounts = {
-    increasing: 0,
-    stable: 0,
-    decreasing: 0
-  }
-  
-  selectedUserData.forEach(user => {
-    const trend = (user.trend || 'N/A').toLowerCase()
-    if (trend === 'increasing') trendCounts.increasing++
-    else if (trend === 'stable') trendCounts.stable++
-    else if (trend === 'decreasing') trendCounts.decreasing++
-  })
-  
-  // Calculate risk distribution
-  const riskCounts = {
-    low: 0,
-    medium: 0,
-    high: 0
-  }
-  
-  selectedUserData.forEach(user => {
-    const risk = (user.riskLevel || 'low').toLowerCase()
-    if (risk === 'low') riskCounts.low++
-    else if (risk === 'medium') riskCounts.medium++
-    else if (risk === 'high') riskCounts.high++
-  })
-  
-  return {
-    averageEngagement: Math.round(averageEngagement * 100) / 100,
-    totalToolsUsed: allToolsUsed.size,
-    commonTools,
-    trendAnalysis: trendCounts,
-    riskDistribution: riskCounts
-  }
-}
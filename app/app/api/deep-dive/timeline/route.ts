@@ -0,0 +1,46 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import { getUsageTimelineIndex, readUserTimeline } from '@/lib/usage-timeline'
+
+// One user's per-report activity: report dates, the tools active in each
+// report with their last activity dates, and tools used per report.
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const sessionId = searchParams.get('sessionId')
+    const email = searchParams.get('email')?.trim().toLowerCase()
+
+    if (!sessionId || !email) {
+      return NextResponse.json({ error: 'Session ID and email are required' }, { status: 400 })
+    }
+
+    const results = await analysisResults.get(sessionId)
+    if (!results) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const index = await getUsageTimelineIndex(sessionId, results)
+    if (!index) {
+      return NextResponse.json(
+        { error: 'Usage timelines are not available for this analysis' },
+        { status: 404 }
+      )
+    }
+
+    const timeline = await readUserTimeline(index, email)
+    if (!timeline) {
+      return NextResponse.json({ error: `No usage records found for ${email}` }, { status: 404 })
+    }
+
+    return NextResponse.json({
+      status: 'success',
+      timeline
+    })
+  } catch (error) {
+    console.error('Usage timeline API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to fetch usage timeline' },
+      { status: 500 }
+    )
+  }
+}
@@ -1,12 +1,15 @@
 
 import { NextRequest, NextResponse } from 'next/server'
-import { readFile, readdir, stat } from 'fs/promises'
+import { readdir, stat } from 'fs/promises'
 import { analysisResults } from '@/lib/analysis-store'
+import { ensureWordReport } from '@/lib/word-report'
+import { sendPrecompressed } from '@/lib/precompressed'
+import { TEMP_ROOT } from '@/lib/temp-root'
 import path from 'path'
 
 async function findMostRecentAnalysis() {
   try {
-    const tempDir = path.join(process.cwd(), 'temp')
+    const tempDir = TEMP_ROOT
     const entries = await readdir(tempDir)
     
     let mostRecentDir = null
@@ -70,14 +73,15 @@ export async function GET(
     
     // Get the result by sessionId or the most recent one
     let result
+    let resultSessionId = sessionId
     if (sessionId) {
       result = await analysisResults.get(sessionId)
     } else {
       // Get the most recent result from memory
       const allKeys = await analysisResults.getAllKeys()
       if (allKeys.length > 0) {
-        const mostRecentKey = allKeys[allKeys.length - 1]
-        result = await analysisResults.get(mostRecentKey)
+        resultSessionId = allKeys[allKeys.length - 1]
+        result = await analysisResults.get(resultSessionId)
       }
     }
     
@@ -85,6 +89,7 @@ export async function GET(
     if (!result) {
       console.log('No results in memory, searching file system...')
       result = await findMostRecentAnalysis()
+      resultSessionId = null
       
       if (!result) {
         return NextResponse.json(
@@ -110,6 +115,23 @@ export async function GET(
       filePath = result.files.html
       contentType = 'text/html'
       filename = 'leaderboard.html'
+    } else if (type === 'org-rollup' && result.files.orgRollup) {
+      filePath = result.files.orgRollup
+      contentType = 'text/csv'
+      filename = 'org_rollup.csv'
+    } else if (type === 'docx' && resultSessionId && result.files.excel) {
+      // Built from the session's stored results, so it needs a session
+      try {
+        filePath = await ensureWordReport(resultSessionId, result)
+      } catch (error) {
+        console.error('Word report generation failed:', error)
+        return NextResponse.json(
+          { error: 'Failed to generate Word report' },
+          { status: 500 }
+        )
+      }
+      contentType = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+      filename = 'copilot_executive_summary.docx'
     } else {
       return NextResponse.json(
         { error: 'Invalid download type' },
@@ -117,20 +139,18 @@ export async function GET(
       )
     }
     
-    // Check if file exists and read it
+    // Stream the file (or its precompressed copy) from disk
     try {
-      const file = await readFile(filePath)
-      
       const headers: Record<string, string> = {
         'Content-Type': contentType
       }
       
-      // Add download disposition for excel and html downloads (not for leaderboard viewing)
+      // Add download disposition for file downloads (not for leaderboard viewing)
       if (type !== 'leaderboard') {
         headers['Content-Disposition'] = `attachment; filename="${filename}"`
       }
       
-      return new NextResponse(file, { headers })
+      return await sendPrecompressed(request, filePath, headers)
     } catch (fileError) {
       console.error('File read error:', fileError)
       return NextResponse.json(
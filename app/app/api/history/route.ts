@@ -0,0 +1,51 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+
+const GRANULARITIES = ['month', 'quarter', 'year']
+const GROUPS = ['company', 'department', 'city', 'classification']
+const PERIOD_PATTERN = /^\d{4}-\d{2}$/
+
+// Longitudinal metrics from the history store, across every recorded run:
+//   ?granularity=quarter&groupBy=department&department=Sales&from=2024-01
+//   ?user=someone@example.com   (one user's monthly snapshots)
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const granularity = searchParams.get('granularity') || 'month'
+    const groupBy = searchParams.get('groupBy')
+    const from = searchParams.get('from')
+    const to = searchParams.get('to')
+    const user = searchParams.get('user')
+
+    if (!GRANULARITIES.includes(granularity)) {
+      return NextResponse.json({ error: `granularity must be one of ${GRANULARITIES.join(', ')}` }, { status: 400 })
+    }
+    if (groupBy && !GROUPS.includes(groupBy)) {
+      return NextResponse.json({ error: `groupBy must be one of ${GROUPS.join(', ')}` }, { status: 400 })
+    }
+    if ((from && !PERIOD_PATTERN.test(from)) || (to && !PERIOD_PATTERN.test(to))) {
+      return NextResponse.json({ error: 'from and to must be months formatted as YYYY-MM' }, { status: 400 })
+    }
+
+    const filters: Record<string, string[]> = {}
+    for (const group of GROUPS) {
+      const values = searchParams.getAll(group)
+      if (values.length > 0) filters[group] = values
+    }
+
+    const query = { granularity, groupBy, filters, from, to, user }
+    const result = parseAnalyzerOutput(await runAnalyzerScript(['--history-query', JSON.stringify(query)]))
+
+    return NextResponse.json({
+      status: 'success',
+      query,
+      rows: result.rows
+    })
+  } catch (error) {
+    console.error('History API error:', error)
+    return NextResponse.json(
+      { error: error instanceof Error ? error.message : 'Failed to query history' },
+      { status: 500 }
+    )
+  }
+}
@@ -0,0 +1,74 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisJobs, JobSnapshot } from '@/lib/analysis-jobs'
+
+export const dynamic = 'force-dynamic'
+
+const KEEP_ALIVE_MS = 15000
+
+// Server-Sent Events stream of job progress. Emits `progress` events and one
+// terminal event named after the final status, then closes.
+export async function GET(
+  request: NextRequest,
+  { params }: { params: { jobId: string } }
+) {
+  const job = analysisJobs.get(params.jobId)
+  if (!job) {
+    return NextResponse.json({ error: 'Job not found' }, { status: 404 })
+  }
+
+  const encoder = new TextEncoder()
+  let cleanup = () => {}
+
+  const stream = new ReadableStream({
+    start(controller) {
+      let closed = false
+      const send = (chunk: string) => {
+        if (!closed) controller.enqueue(encoder.encode(chunk))
+      }
+      const sendEvent = (event: string, data: JobSnapshot) => {
+        send(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`)
+      }
+
+      const onProgress = (snapshot: JobSnapshot) => sendEvent('progress', snapshot)
+      const onDone = (snapshot: JobSnapshot) => {
+        sendEvent(snapshot.status, snapshot)
+        cleanup()
+      }
+      const keepAlive = setInterval(() => send(': keep-alive\n\n'), KEEP_ALIVE_MS)
+
+      cleanup = () => {
+        if (closed) return
+        closed = true
+        clearInterval(keepAlive)
+        job.off('progress', onProgress)
+        job.off('done', onDone)
+        try {
+          controller.close()
+        } catch {
+          // Already closed by the client
+        }
+      }
+
+      sendEvent('progress', job.snapshot())
+      if (job.isFinished) {
+        onDone(job.snapshot())
+        return
+      }
+      job.on('progress', onProgress)
+      job.once('done', onDone)
+      request.signal.addEventListener('abort', () => cleanup())
+    },
+    cancel() {
+      cleanup()
+    }
+  })
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no'
+    }
+  })
+}
@@ -0,0 +1,56 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import { analysisJobs } from '@/lib/analysis-jobs'
+
+export async function GET(
+  request: NextRequest,
+  { params }: { params: { jobId: string } }
+) {
+  try {
+    const job = analysisJobs.get(params.jobId)
+    if (!job) {
+      return NextResponse.json({ error: 'Job not found' }, { status: 404 })
+    }
+
+    if (job.status !== 'succeeded') {
+      return NextResponse.json(job.snapshot())
+    }
+
+    // Completed jobs carry the session result, minus server-side bookkeeping
+    const sessionData = await analysisResults.get(job.sessionId)
+    if (!sessionData) {
+      return NextResponse.json(job.snapshot())
+    }
+    const { tempDir, filePaths, uploads, ...result } = sessionData
+
+    return NextResponse.json({
+      ...job.snapshot(),
+      result: { ...result, sessionId: job.sessionId }
+    })
+  } catch (error) {
+    console.error('Job status error:', error)
+    return NextResponse.json(
+      { error: 'Failed to fetch job status' },
+      { status: 500 }
+    )
+  }
+}
+
+export async function DELETE(
+  request: NextRequest,
+  { params }: { params: { jobId: string } }
+) {
+  const job = analysisJobs.get(params.jobId)
+  if (!job) {
+    return NextResponse.json({ error: 'Job not found' }, { status: 404 })
+  }
+
+  if (!job.cancel()) {
+    return NextResponse.json(
+      { error: `Job already ${job.status}`, ...job.snapshot() },
+      { status: 409 }
+    )
+  }
+
+  return NextResponse.json(job.snapshot(), { status: 202 })
+}
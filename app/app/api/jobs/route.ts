@@ -0,0 +1,26 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { MultipartError } from '@/lib/multipart'
+import { submitAnalysisUpload } from '@/lib/analysis-jobs'
+
+// Submit an analysis job. Returns as soon as the upload has been received;
+// follow progress on the status endpoint or the SSE stream.
+export async function POST(request: NextRequest) {
+  try {
+    const job = await submitAnalysisUpload(request)
+
+    return NextResponse.json({
+      ...job.snapshot(),
+      statusUrl: `/api/jobs/${job.jobId}`,
+      eventsUrl: `/api/jobs/${job.jobId}/events`
+    }, { status: 202 })
+  } catch (error) {
+    console.error('Job submission error:', error)
+    return NextResponse.json(
+      {
+        status: 'error',
+        message: error instanceof Error ? error.message : 'Job submission failed'
+      },
+      { status: error instanceof MultipartError ? 400 : 500 }
+    )
+  }
+}
@@ -0,0 +1,22 @@
+import { NextResponse } from 'next/server'
+import { jobScheduler } from '@/lib/job-scheduler'
+import { analysisJobs } from '@/lib/analysis-jobs'
+
+export const dynamic = 'force-dynamic'
+
+// Scheduler health: queue depth, wait times and reserved memory
+export async function GET() {
+  const queue = Array.from(analysisJobs.values())
+    .filter(job => job.status === 'queued' && job.queuePosition !== null)
+    .sort((a, b) => (a.queuePosition ?? 0) - (b.queuePosition ?? 0))
+    .map(job => ({
+      jobId: job.jobId,
+      queuePosition: job.queuePosition,
+      waitingMs: Date.now() - job.createdAt.getTime()
+    }))
+
+  return NextResponse.json({
+    ...jobScheduler.stats(),
+    queue
+  })
+}
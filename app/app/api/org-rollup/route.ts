@@ -0,0 +1,53 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import { getOrgRollup, selectSubtree } from '@/lib/org-rollup'
+
+// Engagement and reclaimable-license rollups per manager subtree.
+// Optional `root` (a manager chain, e.g. "CEO -> VP Sales") and `depth`
+// narrow the response to part of the tree.
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const sessionId = searchParams.get('sessionId')
+    const root = searchParams.get('root') || ''
+    const depth = searchParams.get('depth')
+
+    if (!sessionId) {
+      return NextResponse.json({ error: 'Session ID is required' }, { status: 400 })
+    }
+
+    const results = await analysisResults.get(sessionId)
+    if (!results) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const nodes = await getOrgRollup(sessionId, results)
+    if (!nodes) {
+      return NextResponse.json(
+        { error: 'Org rollup is only available for analyses run with a target users file' },
+        { status: 404 }
+      )
+    }
+
+    const maxDepth = depth !== null ? Number(depth) : undefined
+    if (maxDepth !== undefined && (!Number.isInteger(maxDepth) || maxDepth < 0)) {
+      return NextResponse.json({ error: 'depth must be a non-negative integer' }, { status: 400 })
+    }
+
+    const subtree = selectSubtree(nodes, root, maxDepth)
+    if (subtree.length === 0) {
+      return NextResponse.json({ error: `Manager chain "${root}" not found` }, { status: 404 })
+    }
+
+    return NextResponse.json({
+      status: 'success',
+      nodes: subtree
+    })
+  } catch (error) {
+    console.error('Org rollup API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to fetch org rollup' },
+      { status: 500 }
+    )
+  }
+}
@@ -0,0 +1,24 @@
+import { NextResponse } from 'next/server'
+import { clearResultCache, resultCacheStats } from '@/lib/result-cache'
+
+export const dynamic = 'force-dynamic'
+
+// Size of the whole-run result cache and the scoring version it is keyed on
+export async function GET() {
+  try {
+    return NextResponse.json(await resultCacheStats())
+  } catch (error) {
+    console.error('Result cache stats error:', error)
+    return NextResponse.json({ error: 'Failed to read result cache' }, { status: 500 })
+  }
+}
+
+// Drop every cached run, e.g. after a scoring change that did not bump SCORING_VERSION
+export async function DELETE() {
+  try {
+    return NextResponse.json({ removed: await clearResultCache() })
+  } catch (error) {
+    console.error('Result cache clear error:', error)
+    return NextResponse.json({ error: 'Failed to clear result cache' }, { status: 500 })
+  }
+}
@@ -0,0 +1,51 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { analysisResults } from '@/lib/analysis-store'
+import { RETENTION_DIMENSIONS, RetentionDimension, getRetention, queryRetention } from '@/lib/retention'
+
+// Cohort retention by first-appearance month: for each cohort, the share of
+// its users active 0, 1, 2... months later, e.g.
+//   ?sessionId=...
+//   ?sessionId=...&department=Sales&department=IT&city=Paris
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const sessionId = searchParams.get('sessionId')
+
+    if (!sessionId) {
+      return NextResponse.json({ error: 'Session ID is required' }, { status: 400 })
+    }
+
+    const filters: Partial<Record<RetentionDimension, string[]>> = {}
+    for (const dimension of RETENTION_DIMENSIONS) {
+      const values = searchParams.getAll(dimension)
+      if (values.length > 0) filters[dimension] = values
+    }
+
+    const results = await analysisResults.get(sessionId)
+    if (!results) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const retention = await getRetention(sessionId, results)
+    if (!retention) {
+      return NextResponse.json(
+        { error: 'Retention is not available for this analysis' },
+        { status: 404 }
+      )
+    }
+
+    return NextResponse.json({
+      status: 'success',
+      filters,
+      months: retention.months,
+      cohorts: queryRetention(retention, filters),
+      dimensionValues: retention.dimensionValues
+    })
+  } catch (error) {
+    console.error('Retention API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to compute retention' },
+      { status: 500 }
+    )
+  }
+}
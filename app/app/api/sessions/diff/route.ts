@@ -0,0 +1,65 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { ChangeKind, diffSessions, pageDiff } from '@/lib/session-diff'
+
+const CHANGE_KINDS: ChangeKind[] = ['added', 'removed', 'changed', 'unchanged']
+const DEFAULT_PAGE_SIZE = 100
+const MAX_PAGE_SIZE = 1000
+
+// Who moved between classifications from one analysis (`base`) to a later
+// one (`compare`), e.g. ?base=...&compare=...&change=changed&from=Top%20Utilizer
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const base = searchParams.get('base')
+    const compare = searchParams.get('compare')
+
+    if (!base || !compare) {
+      return NextResponse.json({ error: 'Both base and compare session IDs are required' }, { status: 400 })
+    }
+
+    const changes = (searchParams.get('change') || '')
+      .split(',')
+      .map(change => change.trim())
+      .filter(Boolean) as ChangeKind[]
+    const invalid = changes.filter(change => !CHANGE_KINDS.includes(change))
+    if (invalid.length > 0) {
+      return NextResponse.json(
+        { error: `Unknown change type(s): ${invalid.join(', ')}. Expected ${CHANGE_KINDS.join(', ')}` },
+        { status: 400 }
+      )
+    }
+
+    const offset = Math.max(0, Number(searchParams.get('offset')) || 0)
+    const limit = Math.min(MAX_PAGE_SIZE, Math.max(1, Number(searchParams.get('limit')) || DEFAULT_PAGE_SIZE))
+    const sort = searchParams.get('sort') === 'engagementDelta' ? 'engagementDelta' : 'email'
+
+    const diff = await diffSessions(base, compare)
+    if (!diff) {
+      return NextResponse.json({ error: 'Session not found' }, { status: 404 })
+    }
+
+    const page = pageDiff(diff, {
+      changes,
+      from: searchParams.get('from') || undefined,
+      to: searchParams.get('to') || undefined,
+      sort,
+      offset,
+      limit
+    })
+
+    return NextResponse.json({
+      status: 'success',
+      summary: diff.summary,
+      total: page.total,
+      offset,
+      limit,
+      rows: page.rows
+    })
+  } catch (error) {
+    console.error('Session diff API error:', error)
+    return NextResponse.json(
+      { error: 'Failed to compare sessions' },
+      { status: 500 }
+    )
+  }
+}
@@ -0,0 +1,64 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { mkdir, unlink } from 'fs/promises'
+import path from 'path'
+import { v4 as uuidv4 } from 'uuid'
+import { MultipartError, receiveMultipartUpload } from '@/lib/multipart'
+import { TARGET_CACHE_DIR, cachedFilterOptions, filterOptionsFor, isContentHash } from '@/lib/target-options'
+
+export const dynamic = 'force-dynamic'
+
+// Filter options of a target users file seen before, by its sha256; lets the
+// browser skip the upload when it already hashed the file itself
+export async function GET(request: NextRequest) {
+  try {
+    const sha256 = request.nextUrl.searchParams.get('sha256')
+    if (!isContentHash(sha256)) {
+      return NextResponse.json({ error: 'A sha256 content hash is required' }, { status: 400 })
+    }
+    const options = await cachedFilterOptions(sha256)
+    if (!options) {
+      return NextResponse.json({ error: 'Filter options not found' }, { status: 404 })
+    }
+    return NextResponse.json(options)
+  } catch (error) {
+    console.error('Filter options lookup error:', error)
+    return NextResponse.json({ error: 'Failed to read filter options' }, { status: 500 })
+  }
+}
+
+// Upload a target users file (form field `targetUsersFile`) and get its filter
+// options with user counts
+export async function POST(request: NextRequest) {
+  let uploadPath: string | null = null
+  try {
+    await mkdir(TARGET_CACHE_DIR, { recursive: true })
+    const upload = await receiveMultipartUpload(request, {
+      destinationFor: (fieldName) => {
+        if (fieldName !== 'targetUsersFile' || uploadPath) return null
+        uploadPath = path.join(TARGET_CACHE_DIR, `upload-${uuidv4()}.csv`)
+        return uploadPath
+      }
+    })
+    const file = upload.files.find(candidate => candidate.fieldName === 'targetUsersFile')
+    if (!file || file.size === 0) {
+      return NextResponse.json({ error: 'Target users file is required' }, { status: 400 })
+    }
+    try {
+      return NextResponse.json(await filterOptionsFor(file.sha256, file.path))
+    } catch (error) {
+      console.error('Filter options error:', error)
+      return NextResponse.json(
+        { error: 'Could not read filter options from the target users file' },
+        { status: 422 }
+      )
+    }
+  } catch (error) {
+    console.error('Target users upload error:', error)
+    return NextResponse.json(
+      { error: error instanceof MultipartError ? error.message : 'Failed to process target users file' },
+      { status: error instanceof MultipartError ? 400 : 500 }
+    )
+  } finally {
+    if (uploadPath) await unlink(uploadPath).catch(() => undefined)
+  }
+}
@@ -6,7 +6,8 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
 import { Badge } from '@/components/ui/badge'
 import { Progress } from '@/components/ui/progress'
-import { Users, TrendingUp, TrendingDown, Download, FileSpreadsheet, Trophy } from 'lucide-react'
+import { Users, TrendingUp, TrendingDown, Download, FileSpreadsheet, FileText, Trophy, BarChart3, RefreshCw } from 'lucide-react'
+import { Bar, BarChart, CartesianGrid, Line, LineChart, ResponsiveContainer, Tooltip, XAxis, YAxis } from 'recharts'
 
 interface AnalysisResultsProps {
   results: {
@@ -24,6 +25,102 @@ interface AnalysisResultsProps {
   sessionId: string | null
 }
 
+// Aggregates written by the analyzer's create_chart_data, served by /api/charts
+interface ChartData {
+  engagementHistogram: { edges: number[], counts: number[] } | null
+  topUtilizerTools: Array<{ tool: string, count: number }>
+  engagementTrend: Array<{ reportDate: string, averageScore: number, rows: number }>
+}
+
+const CHART_COLORS = ['#60B5FF', '#72BF78', '#FF9149']
+
+function UsageCharts({ sessionId }: { sessionId: string }) {
+  const [charts, setCharts] = useState<ChartData | null>(null)
+  const [error, setError] = useState<string | null>(null)
+
+  useEffect(() => {
+    let cancelled = false
+    setCharts(null)
+    setError(null)
+    fetch(`/api/charts?sessionId=${sessionId}`)
+      .then(async response => {
+        const data = await response.json()
+        if (cancelled) return
+        if (!response.ok) setError(data.error || 'Failed to load charts')
+        else setCharts(data)
+      })
+      .catch(() => { if (!cancelled) setError('Failed to load charts') })
+    return () => { cancelled = true }
+  }, [sessionId])
+
+  const histogram = charts?.engagementHistogram
+    ? charts.engagementHistogram.counts.map((count, index) => ({
+        range: `${charts.engagementHistogram!.edges[index].toFixed(1)}–${charts.engagementHistogram!.edges[index + 1].toFixed(1)}`,
+        count
+      }))
+    : []
+
+  return (
+    <Card>
+      <CardHeader>
+        <CardTitle className="flex items-center gap-2">
+          <BarChart3 className="h-5 w-5" />
+          Usage Charts
+        </CardTitle>
+      </CardHeader>
+      <CardContent>
+        {error ? (
+          <p className="text-sm text-muted-foreground">{error}</p>
+        ) : !charts ? (
+          <div className="flex items-center gap-2 text-sm text-muted-foreground">
+            <RefreshCw className="h-4 w-4 animate-spin" />
+            Loading charts...
+          </div>
+        ) : (
+          <div className="grid lg:grid-cols-2 gap-6">
+            <div className="space-y-2">
+              <p className="text-sm font-medium">Engagement Score Distribution</p>
+              <ResponsiveContainer width="100%" height={220}>
+                <BarChart data={histogram}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="range" tick={{ fontSize: 10 }} />
+                  <YAxis allowDecimals={false} tick={{ fontSize: 10 }} />
+                  <Tooltip />
+                  <Bar dataKey="count" name="Users" fill={CHART_COLORS[0]} />
+                </BarChart>
+              </ResponsiveContainer>
+            </div>
+            <div className="space-y-2">
+              <p className="text-sm font-medium">Tools Used by Top Utilizers</p>
+              <ResponsiveContainer width="100%" height={220}>
+                <BarChart data={charts.topUtilizerTools}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="tool" tick={{ fontSize: 10 }} />
+                  <YAxis allowDecimals={false} tick={{ fontSize: 10 }} />
+                  <Tooltip />
+                  <Bar dataKey="count" name="Reports with activity" fill={CHART_COLORS[1]} />
+                </BarChart>
+              </ResponsiveContainer>
+            </div>
+            <div className="space-y-2 lg:col-span-2">
+              <p className="text-sm font-medium">Average Engagement Score Over Time</p>
+              <ResponsiveContainer width="100%" height={220}>
+                <LineChart data={charts.engagementTrend}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="reportDate" tick={{ fontSize: 10 }} />
+                  <YAxis tick={{ fontSize: 10 }} />
+                  <Tooltip />
+                  <Line type="monotone" dataKey="averageScore" name="Average score" stroke={CHART_COLORS[2]} />
+                </LineChart>
+              </ResponsiveContainer>
+            </div>
+          </div>
+        )}
+      </CardContent>
+    </Card>
+  )
+}
+
 interface CountUpProps {
   end: number
   duration?: number
@@ -75,7 +172,13 @@ export function AnalysisResults({ results, sessionId }: AnalysisResultsProps) {
     ? (summary.for_reallocation / summary.total_users) * 100 
     : 0
 
-  const handleDownload = async (type: 'excel' | 'html') => {
+  const downloadNames = {
+    excel: 'copilot_analysis.xlsx',
+    docx: 'copilot_executive_summary.docx',
+    html: 'leaderboard.html'
+  }
+
+  const handleDownload = async (type: 'excel' | 'docx' | 'html') => {
     try {
       const url = `/api/download/${type}${sessionId ? `?sessionId=${sessionId}` : ''}`
       const response = await fetch(url)
@@ -86,7 +189,7 @@ export function AnalysisResults({ results, sessionId }: AnalysisResultsProps) {
       const downloadUrl = window.URL.createObjectURL(blob)
       const a = document.createElement('a')
       a.href = downloadUrl
-      a.download = type === 'excel' ? 'copilot_analysis.xlsx' : 'leaderboard.html'
+      a.download = downloadNames[type]
       document.body.appendChild(a)
       a.click()
       window.URL.revokeObjectURL(downloadUrl)
@@ -228,6 +331,8 @@ export function AnalysisResults({ results, sessionId }: AnalysisResultsProps) {
         </CardContent>
       </Card>
 
+      {sessionId && <UsageCharts sessionId={sessionId} />}
+
       {/* Download Actions */}
       <Card>
         <CardHeader>
@@ -246,6 +351,16 @@ export function AnalysisResults({ results, sessionId }: AnalysisResultsProps) {
               <FileSpreadsheet className="h-4 w-4 mr-2" />
               Download Excel Report
             </Button>
+            {sessionId && (
+              <Button
+                onClick={() => handleDownload('docx')}
+                className="flex-1"
+                variant="outline"
+              >
+                <FileText className="h-4 w-4 mr-2" />
+                Download Word Summary
+              </Button>
+            )}
             <Button
               onClick={() => handleDownload('html')}
               className="flex-1"
@@ -17,6 +17,86 @@ interface AnalysisState {
   results: any
   error: string | null
   sessionId: string | null
+  jobId: string | null
+  jobProgress: any
+  jobPreview: any
+  queuePosition: number | null
+}
+
+const TERMINAL_JOB_STATUSES = ['succeeded', 'failed', 'cancelled']
+
+// Follow a job over SSE until it finishes, falling back to polling the status
+// endpoint if the event stream drops. Resolves with the final job snapshot.
+function waitForJob(jobId: string, onProgress: (snapshot: any) => void): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const poll = async () => {
+      try {
+        const response = await fetch(`/api/jobs/${jobId}`)
+        if (!response.ok) throw new Error(`Job status failed: ${response.statusText}`)
+        const snapshot = await response.json()
+        onProgress(snapshot)
+        if (TERMINAL_JOB_STATUSES.includes(snapshot.status)) {
+          resolve(snapshot)
+        } else {
+          setTimeout(poll, 2000)
+        }
+      } catch (error) {
+        reject(error)
+      }
+    }
+
+    const events = new EventSource(`/api/jobs/${jobId}/events`)
+    events.addEventListener('progress', (event) => {
+      onProgress(JSON.parse((event as MessageEvent).data))
+    })
+    TERMINAL_JOB_STATUSES.forEach(status => {
+      events.addEventListener(status, (event) => {
+        events.close()
+        resolve(JSON.parse((event as MessageEvent).data))
+      })
+    })
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        poll()
+      }
+    }
+  })
+}
+
+interface FilterOption {
+  value: string
+  count: number
+}
+
+interface TargetFilterOptions {
+  users: number
+  companies: FilterOption[]
+  departments: FilterOption[]
+  locations: FilterOption[]
+  managers: FilterOption[]
+}
+
+async function sha256Hex(file: File): Promise<string | null> {
+  // crypto.subtle only exists in secure contexts (https or localhost)
+  if (!globalThis.crypto?.subtle) return null
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer())
+  return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('')
+}
+
+// Ask by content hash first, so a directory the server has seen is not uploaded again
+async function fetchFilterOptions(file: File): Promise<TargetFilterOptions> {
+  const digest = await sha256Hex(file).catch(() => null)
+  if (digest) {
+    const cached = await fetch(`/api/target-users?sha256=${digest}`)
+    if (cached.ok) return cached.json()
+  }
+  
+  const formData = new FormData()
+  formData.append('targetUsersFile', file)
+  const response = await fetch('/api/target-users', { method: 'POST', body: formData })
+  const body = await response.json()
+  if (!response.ok) throw new Error(body.error || 'Could not read filter options')
+  return body
 }
 
 interface FileData {
@@ -34,6 +114,8 @@ interface FileData {
     locations: string[]
     managers: string[]
   }
+  // Users per option value, keyed like filterOptions
+  filterCounts: Record<string, Record<string, number>>
 }
 
 export function CopilotAnalysisApp() {
@@ -52,13 +134,18 @@ export function CopilotAnalysisApp() {
       departments: [],
       locations: [],
       managers: []
-    }
+    },
+    filterCounts: {}
   })
   const [analysisState, setAnalysisState] = useState<AnalysisState>({
     isProcessing: false,
     results: null,
     error: null,
-    sessionId: null
+    sessionId: null,
+    jobId: null,
+    jobProgress: null,
+    jobPreview: null,
+    queuePosition: null
   })
 
   const { toast } = useToast()
@@ -90,69 +177,43 @@ export function CopilotAnalysisApp() {
     checkForExistingResults()
   }, [toast])
 
-  const handleTargetUsersUpload = useCallback((file: File) => {
+  const handleTargetUsersUpload = useCallback(async (file: File) => {
     setFileData(prev => ({ ...prev, targetUsersFile: file }))
     
-    // Parse the file to extract filter options
-    const reader = new FileReader()
-    reader.onload = (e) => {
-      try {
-        const csv = e.target?.result as string
-        const lines = csv.split('\n')
-        const headers = lines[0].split(',').map(h => h.trim().replace(/"/g, ''))
-        
-        const companyIndex = headers.findIndex(h => h.toLowerCase().includes('company'))
-        const departmentIndex = headers.findIndex(h => h.toLowerCase().includes('department'))
-        const locationIndex = headers.findIndex(h => h.toLowerCase().includes('city'))
-        const managerIndex = headers.findIndex(h => h.toLowerCase().includes('manager'))
-        
-        const companies = new Set<string>()
-        const departments = new Set<string>()
-        const locations = new Set<string>()
-        const managers = new Set<string>()
-        
-        for (let i = 1; i < lines.length; i++) {
-          const row = lines[i].split(',').map(cell => cell.trim().replace(/"/g, ''))
-          
-          if (companyIndex !== -1 && row[companyIndex]) {
-            companies.add(row[companyIndex])
-          }
-          if (departmentIndex !== -1 && row[departmentIndex]) {
-            departments.add(row[departmentIndex])
-          }
-          if (locationIndex !== -1 && row[locationIndex]) {
-            locations.add(row[locationIndex])
-          }
-          if (managerIndex !== -1 && row[managerIndex]) {
-            const managerChain = row[managerIndex].split('->')
-            managerChain.forEach(manager => managers.add(manager.trim()))
-          }
+    // Options and user counts are computed server side, once per file content
+    try {
+      const options = await fetchFilterOptions(file)
+      const values = (entries: FilterOption[]) => entries.map(entry => entry.value)
+      const counts = (entries: FilterOption[]) => Object.fromEntries(entries.map(entry => [entry.value, entry.count]))
+      
+      setFileData(prev => prev.targetUsersFile !== file ? prev : {
+        ...prev,
+        filterOptions: {
+          companies: values(options.companies),
+          departments: values(options.departments),
+          locations: values(options.locations),
+          managers: values(options.managers)
+        },
+        filterCounts: {
+          companies: counts(options.companies),
+          departments: counts(options.departments),
+          locations: counts(options.locations),
+          managers: counts(options.managers)
         }
-        
-        setFileData(prev => ({
-          ...prev,
-          filterOptions: {
-            companies: Array.from(companies).filter(c => c).sort(),
-            departments: Array.from(departments).filter(d => d).sort(),
-            locations: Array.from(locations).filter(l => l).sort(),
-            managers: Array.from(managers).filter(m => m).sort()
-          }
-        }))
-        
-        toast({
-          title: "Target users file uploaded",
-          description: "Filter options have been populated based on your data."
-        })
-      } catch (error) {
-        console.error('Error parsing file:', error)
-        toast({
-          title: "Error parsing file",
-          description: "Could not extract filter options from the target users file.",
-          variant: "destructive"
-        })
-      }
+      })
+      
+      toast({
+        title: "Target users file uploaded",
+        description: `Filter options have been populated from ${options.users.toLocaleString()} users.`
+      })
+    } catch (error) {
+      console.error('Error reading filter options:', error)
+      toast({
+        title: "Error parsing file",
+        description: "Could not extract filter options from the target users file.",
+        variant: "destructive"
+      })
     }
-    reader.readAsText(file)
   }, [toast])
 
   const handleUsageReportsUpload = useCallback((files: File[]) => {
@@ -183,7 +244,7 @@ export function CopilotAnalysisApp() {
       return
     }
 
-    setAnalysisState(prev => ({ ...prev, isProcessing: true, error: null }))
+    setAnalysisState(prev => ({ ...prev, isProcessing: true, error: null, jobId: null, jobProgress: null, jobPreview: null, queuePosition: null }))
 
     try {
       const formData = new FormData()
@@ -200,20 +261,46 @@ export function CopilotAnalysisApp() {
       
       // Add filters
       formData.append('filters', JSON.stringify(fileData.filters))
+      // Estimated counts from a sample arrive before the exact analysis
+      formData.append('preview', 'true')
       
-      const response = await fetch('/api/analyze', {
+      // Submit the job; the request returns as soon as the upload is received
+      const response = await fetch('/api/jobs', {
         method: 'POST',
         body: formData
       })
       
-      if (!response.ok) {
-        throw new Error(`Analysis failed: ${response.statusText}`)
+      const job = await response.json()
+      
+      if (!response.ok || job.status === 'error') {
+        throw new Error(job.message || `Analysis failed: ${response.statusText}`)
+      }
+      
+      setAnalysisState(prev => ({ ...prev, jobId: job.jobId, jobProgress: job.progress, queuePosition: job.queuePosition }))
+      
+      const finalJob = await waitForJob(job.jobId, (snapshot) => {
+        setAnalysisState(prev => ({ ...prev, jobProgress: snapshot.progress, jobPreview: snapshot.preview, queuePosition: snapshot.queuePosition }))
+      })
+      
+      if (finalJob.status === 'cancelled') {
+        setAnalysisState(prev => ({ ...prev, isProcessing: false, jobId: null, jobProgress: null, jobPreview: null, queuePosition: null }))
+        toast({
+          title: "Analysis cancelled",
+          description: "The analysis was stopped before it finished."
+        })
+        return
+      }
+      
+      if (finalJob.status !== 'succeeded') {
+        throw new Error(finalJob.error || 'Analysis failed')
       }
       
-      const results = await response.json()
+      // The completed job carries the session's results
+      const statusResponse = await fetch(`/api/jobs/${job.jobId}`)
+      const { result: results } = await statusResponse.json()
       
-      if (results.status === 'error') {
-        throw new Error(results.message)
+      if (!results) {
+        throw new Error('Analysis results are no longer available')
       }
       
       setAnalysisState(prev => ({
@@ -221,7 +308,11 @@ export function CopilotAnalysisApp() {
         isProcessing: false,
         results,
         error: null,
-        sessionId: results.sessionId
+        sessionId: results.sessionId,
+        jobId: null,
+        jobProgress: null,
+        jobPreview: null,
+        queuePosition: null
       }))
       
       toast({
@@ -233,6 +324,10 @@ export function CopilotAnalysisApp() {
       setAnalysisState(prev => ({
         ...prev,
         isProcessing: false,
+        jobId: null,
+        jobProgress: null,
+        jobPreview: null,
+        queuePosition: null,
         error: error instanceof Error ? error.message : 'An unexpected error occurred'
       }))
       
@@ -244,6 +339,15 @@ export function CopilotAnalysisApp() {
     }
   }, [fileData, toast])
 
+  const handleCancel = useCallback(async () => {
+    if (!analysisState.jobId) return
+    try {
+      await fetch(`/api/jobs/${analysisState.jobId}`, { method: 'DELETE' })
+    } catch (error) {
+      console.error('Cancel error:', error)
+    }
+  }, [analysisState.jobId])
+
   const canAnalyze = fileData.usageReportsFiles.length > 0 && !analysisState.isProcessing
 
   return (
@@ -308,6 +412,7 @@ export function CopilotAnalysisApp() {
             <CardContent>
               <FilterPanel
                 filterOptions={fileData.filterOptions}
+                filterCounts={fileData.filterCounts}
                 filters={fileData.filters}
                 onFilterChange={handleFilterChange}
               />
@@ -337,7 +442,12 @@ export function CopilotAnalysisApp() {
               {/* Processing Overlay - Positioned absolutely to not affect layout */}
               {analysisState.isProcessing && (
                 <div className="absolute inset-0 bg-background/95 backdrop-blur-sm z-10 flex items-center justify-center">
-                  <ProcessingStatus />
+                  <ProcessingStatus
+                    jobProgress={analysisState.jobProgress}
+                    preview={analysisState.jobPreview}
+                    queuePosition={analysisState.queuePosition}
+                    onCancel={analysisState.jobId ? handleCancel : undefined}
+                  />
                 </div>
               )}
               
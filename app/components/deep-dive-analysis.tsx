@@ -670,6 +670,7 @@ export function DeepDiveAnalysis({ sessionId }: DeepDiveAnalysisProps) {
                   <div className="animate-in slide-in-from-right-5 duration-500">
                     <IndividualUserAnalysis 
                       user={users.find(u => selectedUsers.has(u.email))!} 
+                      sessionId={sessionId}
                     />
                   </div>
                 ) : (
@@ -722,7 +723,93 @@ export function DeepDiveAnalysis({ sessionId }: DeepDiveAnalysisProps) {
   )
 }
 
-function IndividualUserAnalysis({ user }: { user: User }) {
+interface UserTimeline {
+  reports: Array<{
+    reportDate: string
+    complexity: number
+    tools: Array<{ tool: string, lastActivity: string }>
+  }>
+  complexity: Array<{ reportDate: string, complexity: number }>
+}
+
+function UserReportTimeline({ sessionId, email }: { sessionId: string, email: string }) {
+  const [timeline, setTimeline] = useState<UserTimeline | null>(null)
+  const [error, setError] = useState<string | null>(null)
+
+  useEffect(() => {
+    let cancelled = false
+    setTimeline(null)
+    setError(null)
+    fetch(`/api/deep-dive/timeline?sessionId=${sessionId}&email=${encodeURIComponent(email)}`)
+      .then(async response => {
+        const data = await response.json()
+        if (cancelled) return
+        if (!response.ok) setError(data.error || 'Failed to load usage timeline')
+        else setTimeline(data.timeline)
+      })
+      .catch(() => { if (!cancelled) setError('Failed to load usage timeline') })
+    return () => { cancelled = true }
+  }, [sessionId, email])
+
+  return (
+    <Card>
+      <CardHeader className="pb-3">
+        <CardTitle className="text-lg flex items-center gap-2">
+          <Calendar className="h-5 w-5" />
+          Report Timeline
+        </CardTitle>
+        <CardDescription>
+          Tools active in each usage report, with their last activity dates
+        </CardDescription>
+      </CardHeader>
+      <CardContent className="space-y-4">
+        {error ? (
+          <p className="text-sm text-muted-foreground">{error}</p>
+        ) : !timeline ? (
+          <div className="flex items-center gap-2 text-sm text-muted-foreground">
+            <RefreshCw className="h-4 w-4 animate-spin" />
+            Loading timeline...
+          </div>
+        ) : (
+          <>
+            <ResponsiveContainer width="100%" height={220}>
+              <RechartsLineChart data={timeline.complexity}>
+                <CartesianGrid strokeDasharray="3 3" />
+                <XAxis dataKey="reportDate" />
+                <YAxis allowDecimals={false} />
+                <Tooltip />
+                <Line type="monotone" dataKey="complexity" stroke={COLORS[0]} name="Tools Used" />
+              </RechartsLineChart>
+            </ResponsiveContainer>
+            <ScrollArea className="h-64">
+              <div className="space-y-3 pr-4">
+                {timeline.reports.map((report, idx) => (
+                  <div key={idx}>
+                    <div className="flex justify-between text-sm font-medium">
+                      <span>Report Date: {report.reportDate}</span>
+                      <span className="text-muted-foreground">{report.complexity} tools</span>
+                    </div>
+                    {report.tools.length === 0 ? (
+                      <p className="text-xs text-muted-foreground ml-2">No tool activity recorded</p>
+                    ) : (
+                      <ul className="text-xs text-muted-foreground ml-2">
+                        {report.tools.map(({ tool, lastActivity }) => (
+                          <li key={tool}>{tool}: {lastActivity}</li>
+                        ))}
+                      </ul>
+                    )}
+                  </div>
+                ))}
+              </div>
+            </ScrollArea>
+          </>
+        )}
+      </CardContent>
+    </Card>
+  )
+}
+
+function IndividualUserAnalysis({ user, sessionId }: { user: User, sessionId: string | null }) {
   return (
     <div className="space-y-4">
       <div className="grid md:grid-cols-2 gap-4">
@@ -834,6 +921,8 @@ function IndividualUserAnalysis({ user }: { user: User }) {
           </ResponsiveContainer>
         </CardContent>
       </Card>
+      
+      {sessionId && <UserReportTimeline sessionId={sessionId} email={user.email} />}
     </div>
   )
 }
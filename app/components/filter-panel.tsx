@@ -17,6 +17,8 @@ interface FilterPanelProps {
     locations: string[]
     managers: string[]
   }
+  // Users per option value, keyed like filterOptions
+  filterCounts?: Record<string, Record<string, number>>
   filters: {
     companies: string[]
     departments: string[]
@@ -30,11 +32,12 @@ interface FilterSectionProps {
   title: string
   icon: React.ReactNode
   options: string[]
+  counts?: Record<string, number>
   selected: string[]
   onSelectionChange: (values: string[]) => void
 }
 
-function FilterSection({ title, icon, options, selected, onSelectionChange }: FilterSectionProps) {
+function FilterSection({ title, icon, options, counts, selected, onSelectionChange }: FilterSectionProps) {
   const [isOpen, setIsOpen] = useState(false)
 
   if (options.length === 0) {
@@ -109,6 +112,11 @@ function FilterSection({ title, icon, options, selected, onSelectionChange }: Fi
                   >
                     {option}
                   </label>
+                  {counts?.[option] !== undefined && (
+                    <span className="ml-auto text-xs text-muted-foreground">
+                      {counts[option].toLocaleString()}
+                    </span>
+                  )}
                 </div>
               ))}
             </div>
@@ -119,7 +127,7 @@ function FilterSection({ title, icon, options, selected, onSelectionChange }: Fi
   )
 }
 
-export function FilterPanel({ filterOptions, filters, onFilterChange }: FilterPanelProps) {
+export function FilterPanel({ filterOptions, filterCounts = {}, filters, onFilterChange }: FilterPanelProps) {
   const hasAnyFilters = Object.values(filterOptions).some(options => options.length > 0)
 
   if (!hasAnyFilters) {
@@ -169,6 +177,7 @@ export function FilterPanel({ filterOptions, filters, onFilterChange }: FilterPa
               title="Companies"
               icon={<Building className="h-4 w-4" />}
               options={filterOptions.companies}
+              counts={filterCounts.companies}
               selected={filters.companies}
               onSelectionChange={(values) => onFilterChange('companies', values)}
             />
@@ -177,6 +186,7 @@ export function FilterPanel({ filterOptions, filters, onFilterChange }: FilterPa
               title="Departments"
               icon={<Users className="h-4 w-4" />}
               options={filterOptions.departments}
+              counts={filterCounts.departments}
               selected={filters.departments}
               onSelectionChange={(values) => onFilterChange('departments', values)}
             />
@@ -185,6 +195,7 @@ export function FilterPanel({ filterOptions, filters, onFilterChange }: FilterPa
               title="Locations"
               icon={<MapPin className="h-4 w-4" />}
               options={filterOptions.locations}
+              counts={filterCounts.locations}
               selected={filters.locations}
               onSelectionChange={(values) => onFilterChange('locations', values)}
             />
@@ -193,6 +204,7 @@ export function FilterPanel({ filterOptions, filters, onFilterChange }: FilterPa
               title="Managers"
               icon={<User className="h-4 w-4" />}
               options={filterOptions.managers}
+              counts={filterCounts.managers}
               selected={filters.managers}
               onSelectionChange={(values) => onFilterChange('managers', values)}
             />
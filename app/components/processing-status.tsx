@@ -4,7 +4,8 @@
 import { useState, useEffect } from 'react'
 import { Card, CardContent } from '@/components/ui/card'
 import { Progress } from '@/components/ui/progress'
-import { Loader2, BarChart3, FileText, Trophy } from 'lucide-react'
+import { Button } from '@/components/ui/button'
+import { Loader2, BarChart3, FileText, Trophy, XCircle } from 'lucide-react'
 
 const processingSteps = [
   { id: 1, label: 'Loading data files', icon: FileText },
@@ -14,13 +15,93 @@ const processingSteps = [
   { id: 5, label: 'Creating leaderboard', icon: Trophy },
 ]
 
-export function ProcessingStatus() {
-  const [currentStep, setCurrentStep] = useState(0)
-  const [progress, setProgress] = useState(0)
+// Job stages reported by the analyzer, mapped onto the steps above
+const stageSteps: Record<string, number> = {
+  uploading: 0,
+  restoring_cached_result: 3,
+  parsing_reports: 0,
+  loading_reports: 1,
+  analyzing_users: 2,
+  analyzing_partitions: 2,
+  writing_artifacts: 3,
+  complete: 4
+}
+
+interface JobProgress {
+  stage: string
+  percent: number
+  filesParsed: number
+  filesTotal: number
+  usersProcessed: number
+  usersTotal: number
+  partitionsProcessed: number
+  partitionsTotal: number
+  artifactsWritten: number
+  artifactsTotal: number
+}
+
+interface ClassEstimate {
+  estimate: number
+  low: number
+  high: number
+}
+
+interface AnalysisPreview {
+  population: number
+  sampleSize: number
+  estimates: {
+    topUtilizers: ClassEstimate
+    underUtilized: ClassEstimate
+    forReallocation: ClassEstimate
+  }
+  etaSeconds: number
+}
+
+const previewRows: Array<{ key: keyof AnalysisPreview['estimates'], label: string }> = [
+  { key: 'topUtilizers', label: 'Top Utilizers' },
+  { key: 'underUtilized', label: 'Under-Utilized' },
+  { key: 'forReallocation', label: 'For Reallocation' }
+]
+
+interface ProcessingStatusProps {
+  // Live progress from the job API; without it the steps are simulated
+  jobProgress?: JobProgress | null
+  // Estimated class sizes, shown while the exact analysis runs
+  preview?: AnalysisPreview | null
+  // Set while the job waits for the server to admit it
+  queuePosition?: number | null
+  onCancel?: () => void
+}
+
+function describeProgress(jobProgress: JobProgress): string {
+  switch (jobProgress.stage) {
+    case 'restoring_cached_result':
+      return 'Reusing the results of an identical earlier analysis'
+    case 'parsing_reports':
+      return `Parsed ${jobProgress.filesParsed} of ${jobProgress.filesTotal} report files`
+    case 'analyzing_users':
+      return `Processed ${jobProgress.usersProcessed.toLocaleString()} of ${jobProgress.usersTotal.toLocaleString()} users`
+    case 'analyzing_partitions':
+      return `Analyzed ${jobProgress.partitionsProcessed} of ${jobProgress.partitionsTotal} data partitions`
+    case 'writing_artifacts':
+      return `Wrote ${jobProgress.artifactsWritten} of ${jobProgress.artifactsTotal} reports`
+    default:
+      return 'Please wait while we analyze your Copilot usage data'
+  }
+}
+
+export function ProcessingStatus({ jobProgress, preview, queuePosition, onCancel }: ProcessingStatusProps = {}) {
+  const [simulatedStep, setSimulatedStep] = useState(0)
+  const [simulatedProgress, setSimulatedProgress] = useState(0)
+  const isLive = !!jobProgress
+
+  const currentStep = jobProgress ? stageSteps[jobProgress.stage] ?? 0 : simulatedStep
+  const progress = jobProgress ? jobProgress.percent : simulatedProgress
 
   useEffect(() => {
+    if (isLive) return
     const interval = setInterval(() => {
-      setProgress(prev => {
+      setSimulatedProgress(prev => {
         if (prev >= 100) {
           return 100
         }
@@ -29,11 +110,12 @@ export function ProcessingStatus() {
     }, 800)
 
     return () => clearInterval(interval)
-  }, [])
+  }, [isLive])
 
   useEffect(() => {
+    if (isLive) return
     const stepInterval = setInterval(() => {
-      setCurrentStep(prev => {
+      setSimulatedStep(prev => {
         if (prev >= processingSteps.length - 1) {
           return processingSteps.length - 1
         }
@@ -42,7 +124,7 @@ export function ProcessingStatus() {
     }, 2000)
 
     return () => clearInterval(stepInterval)
-  }, [])
+  }, [isLive])
 
   return (
     <div className="text-center py-12 w-full">
@@ -51,7 +133,11 @@ export function ProcessingStatus() {
           <Loader2 className="h-12 w-12 animate-spin mx-auto text-primary" />
           <h3 className="text-lg font-semibold">Processing Your Data</h3>
           <p className="text-muted-foreground">
-            Please wait while we analyze your Copilot usage data
+            {queuePosition
+              ? `Waiting for a free analysis slot (position ${queuePosition} in queue)`
+              : jobProgress
+              ? describeProgress(jobProgress)
+              : 'Please wait while we analyze your Copilot usage data'}
           </p>
         </div>
 
@@ -102,6 +188,41 @@ export function ProcessingStatus() {
             </div>
           </CardContent>
         </Card>
+
+        {preview && (
+          <Card>
+            <CardContent className="p-4 space-y-3 text-left">
+              <div className="flex justify-between text-sm font-medium">
+                <span>Preview estimate</span>
+                <span className="text-muted-foreground">
+                  {preview.sampleSize.toLocaleString()} of {preview.population.toLocaleString()} users sampled
+                </span>
+              </div>
+              {previewRows.map(({ key, label }) => {
+                const { estimate, low, high } = preview.estimates[key]
+                return (
+                  <div key={key} className="flex justify-between text-sm">
+                    <span>{label}</span>
+                    <span>
+                      ~{estimate.toLocaleString()}
+                      <span className="text-muted-foreground"> ({low.toLocaleString()}–{high.toLocaleString()}, 95%)</span>
+                    </span>
+                  </div>
+                )
+              })}
+              <p className="text-xs text-muted-foreground">
+                Exact analysis expected to take about {Math.max(1, Math.round(preview.etaSeconds))}s
+              </p>
+            </CardContent>
+          </Card>
+        )}
+
+        {onCancel && (
+          <Button variant="outline" onClick={onCancel}>
+            <XCircle className="h-4 w-4 mr-2" />
+            Cancel Analysis
+          </Button>
+        )}
       </div>
     </div>
   )
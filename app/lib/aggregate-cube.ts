@@ -0,0 +1,147 @@
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+// Slice and roll-up queries over the cube written by
+// python_backend/aggregate_cube.py. Every combination of rolled-up
+// dimensions is materialized ('*' = all values), so a query picks the cells
+// for its combination and, for multi-value filters, sums additive measures.
+// Cells of a month measure that month's activity alone; cells over all
+// months carry the run's per-user metrics.
+
+export const CUBE_DIMENSIONS = ['company', 'department', 'city', 'month', 'classification'] as const
+export type CubeDimension = typeof CUBE_DIMENSIONS[number]
+
+const ALL = '*'
+
+// Python column headings -> API names
+const DIMENSION_COLUMNS: Record<string, CubeDimension> = {
+  'Company': 'company',
+  'Department': 'department',
+  'City': 'city',
+  'Month': 'month',
+  'Classification': 'classification'
+}
+const SUM_COLUMNS: Record<string, string> = {
+  'Users': 'users',
+  'Active Users': 'activeUsers',
+  'Tools Used': 'toolsUsed',
+  'Engagement Score': 'engagementScoreSum',
+  'Usage Consistency (%)': 'usageConsistencySum',
+  'Usage Complexity': 'usageComplexitySum',
+  'Avg Tools / Report': 'avgToolsPerReportSum'
+}
+// Mean -> [numerator, denominator], recomputed after any further roll-up
+const MEANS: Record<string, [string, string]> = {
+  meanEngagementScore: ['engagementScoreSum', 'users'],
+  meanUsageConsistency: ['usageConsistencySum', 'users'],
+  meanUsageComplexity: ['usageComplexitySum', 'users'],
+  meanAvgToolsPerReport: ['avgToolsPerReportSum', 'users'],
+  meanToolsPerActiveUser: ['toolsUsed', 'activeUsers']
+}
+
+export interface CubeRow {
+  key: Partial<Record<CubeDimension, string>>
+  measures: Record<string, number | null>
+}
+
+interface CubeCell {
+  values: string[]
+  sums: number[]
+}
+
+export interface AggregateCube {
+  sumMeasures: string[]
+  // Cells grouped by which dimensions are concrete (bit i = CUBE_DIMENSIONS[i])
+  cellsByMask: Map<number, CubeCell[]>
+  dimensionValues: Record<CubeDimension, string[]>
+}
+
+export interface CubeQuery {
+  groupBy: CubeDimension[]
+  filters: Partial<Record<CubeDimension, string[]>>
+}
+
+export class CubeQueryError extends Error {}
+
+function decodeCube(raw: any): AggregateCube {
+  const columns: string[] = raw.columns
+  const dimensionIndexes = CUBE_DIMENSIONS.map(dimension =>
+    columns.findIndex(column => DIMENSION_COLUMNS[column] === dimension)
+  )
+  const sumIndexes = columns.map((column, i) => (SUM_COLUMNS[column] ? i : -1)).filter(i => i !== -1)
+
+  const cellsByMask = new Map<number, CubeCell[]>()
+  const distinct = CUBE_DIMENSIONS.map(() => new Set<string>())
+  for (const row of raw.rows as any[][]) {
+    const values = dimensionIndexes.map(i => String(row[i]))
+    let mask = 0
+    values.forEach((value, d) => {
+      if (value !== ALL) {
+        mask |= 1 << d
+        distinct[d].add(value)
+      }
+    })
+    const cells = cellsByMask.get(mask) ?? []
+    cells.push({ values, sums: sumIndexes.map(i => Number(row[i]) || 0) })
+    cellsByMask.set(mask, cells)
+  }
+
+  const dimensionValues = {} as Record<CubeDimension, string[]>
+  CUBE_DIMENSIONS.forEach((dimension, d) => {
+    dimensionValues[dimension] = Array.from(distinct[d]).sort()
+  })
+  return {
+    sumMeasures: sumIndexes.map(i => SUM_COLUMNS[columns[i]]),
+    cellsByMask,
+    dimensionValues
+  }
+}
+
+export function getAggregateCube(sessionId: string, results: any): Promise<AggregateCube | null> {
+  return loadSessionDataset(sessionId, results, 'aggregateCube', decodeCube)
+}
+
+export function queryCube(cube: AggregateCube, query: CubeQuery): CubeRow[] {
+  const filtered = CUBE_DIMENSIONS.filter(dimension => query.filters[dimension]?.length)
+  const monthFilter = query.filters.month ?? []
+  // Users are distinct within a month but not across months
+  if (monthFilter.length > 1 && !query.groupBy.includes('month')) {
+    throw new CubeQueryError('Filtering on several months requires grouping by month')
+  }
+
+  let mask = 0
+  CUBE_DIMENSIONS.forEach((dimension, d) => {
+    if (query.groupBy.includes(dimension) || filtered.includes(dimension)) mask |= 1 << d
+  })
+  const allowed = CUBE_DIMENSIONS.map(dimension =>
+    query.filters[dimension]?.length ? new Set(query.filters[dimension]) : null
+  )
+  const groupIndexes = query.groupBy.map(dimension => CUBE_DIMENSIONS.indexOf(dimension))
+
+  const groups = new Map<string, { values: string[], sums: number[] }>()
+  for (const cell of cube.cellsByMask.get(mask) ?? []) {
+    if (!cell.values.every((value, d) => !allowed[d] || allowed[d]!.has(value))) continue
+    const values = groupIndexes.map(d => cell.values[d])
+    const key = values.join('\u0001')
+    const group = groups.get(key)
+    if (group) {
+      cell.sums.forEach((sum, i) => { group.sums[i] += sum })
+    } else {
+      groups.set(key, { values, sums: [...cell.sums] })
+    }
+  }
+
+  return Array.from(groups.values())
+    .sort((a, b) => a.values.join('\u0001').localeCompare(b.values.join('\u0001')))
+    .map(({ values, sums }) => {
+      const measures: Record<string, number | null> = {}
+      cube.sumMeasures.forEach((name, i) => { measures[name] = Math.round(sums[i] * 1000) / 1000 })
+      for (const [mean, [numerator, denominator]] of Object.entries(MEANS)) {
+        const total = measures[numerator]
+        const count = measures[denominator]
+        measures[mean] = total !== null && count ? Math.round((total / count) * 1000) / 1000 : null
+      }
+      const key: Partial<Record<CubeDimension, string>> = {}
+      query.groupBy.forEach((dimension, i) => { key[dimension] = values[i] })
+      return { key, measures }
+    })
+}
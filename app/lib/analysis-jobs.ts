@@ -0,0 +1,554 @@
+import { EventEmitter } from 'events'
+import { ChildProcess } from 'child_process'
+import { mkdir, unlink } from 'fs/promises'
+import path from 'path'
+import { v4 as uuidv4 } from 'uuid'
+import { analysisResults } from '@/lib/analysis-store'
+import { sessionManager } from '@/lib/session-manager'
+import { TEMP_ROOT } from '@/lib/temp-root'
+import { receiveMultipartUpload, MultipartError, MultipartUploadResult, StreamedUpload } from '@/lib/multipart'
+import { UsageReportPipeline } from '@/lib/ingest-pipeline'
+import { startAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+import { jobScheduler, schedulerConfig, planJobMemory } from '@/lib/job-scheduler'
+import { planExecution, planReservationMb } from '@/lib/execution-plan'
+import { precompressSession } from '@/lib/precompressed'
+import { resultCacheKey, restoreCachedResult, storeCachedResult, TrendOptions } from '@/lib/result-cache'
+
+export type JobStatus = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+
+export interface JobProgress {
+  stage: string
+  percent: number
+  filesParsed: number
+  filesTotal: number
+  usersProcessed: number
+  usersTotal: number
+  partitionsProcessed: number
+  partitionsTotal: number
+  artifactsWritten: number
+  artifactsTotal: number
+}
+
+export interface ClassEstimate {
+  estimate: number
+  // 95% confidence interval
+  low: number
+  high: number
+}
+
+// Class sizes estimated from a sample of users before the exact analysis
+export interface AnalysisPreview {
+  // Stratified by Company / Department in memory, whole partitions out of core
+  method: 'stratified' | 'cluster'
+  population: number
+  sampleSize: number
+  confidence: number
+  estimates: {
+    topUtilizers: ClassEstimate
+    underUtilized: ClassEstimate
+    forReallocation: ClassEstimate
+  }
+  // Estimated duration of the full per-user analysis
+  etaSeconds: number
+  elapsedSeconds: number
+}
+
+export interface JobSnapshot {
+  jobId: string
+  sessionId: string
+  status: JobStatus
+  // 1-based position in the admission queue while the job waits for a slot
+  queuePosition: number | null
+  // Served from the result cache of an identical earlier run
+  fromCache: boolean
+  progress: JobProgress
+  preview: AnalysisPreview | null
+  error: string | null
+  createdAt: string
+  startedAt: string | null
+  finishedAt: string | null
+}
+
+// Share of the progress bar owned by each stage, as [start, end] percentages
+const STAGE_RANGES: Record<string, [number, number]> = {
+  uploading: [0, 0],
+  restoring_cached_result: [0, 95],
+  parsing_reports: [0, 20],
+  loading_reports: [20, 30],
+  analyzing_users: [30, 85],
+  analyzing_partitions: [30, 85],
+  writing_artifacts: [85, 100]
+}
+
+// Mirrors TREND_MODELS in python_backend/out_of_core.py
+const TREND_MODELS = ['halves', 'slope']
+
+// Usage report formats the analyzer reads; anything else is stored (and
+// parsed) as CSV
+const USAGE_REPORT_EXTENSIONS = ['csv', 'xlsx', 'xls']
+
+// Runs store monthly snapshots in the history store (keyed by session id)
+// unless HISTORY_RECORDING=off
+const HISTORY_RECORDING = process.env.HISTORY_RECORDING !== 'off'
+
+// Finished jobs stay queryable for this long before they are forgotten
+const JOB_RETENTION_MS = 30 * 60 * 1000
+const CANCEL_GRACE_MS = 5000
+
+const globalForJobs = globalThis as unknown as {
+  analysisJobs: Map<string, AnalysisJob> | undefined
+}
+
+// Route handlers are bundled separately, so the registry lives on globalThis
+export const analysisJobs = globalForJobs.analysisJobs ?? new Map<string, AnalysisJob>()
+globalForJobs.analysisJobs = analysisJobs
+
+export interface AnalysisJobSpec {
+  pipeline: UsageReportPipeline
+  outputDir: string
+  targetUsersPath: string
+  filters: Record<string, any>
+  tempDir: string
+  filePaths: string[]
+  uploads: StreamedUpload[]
+  // Report estimated class sizes from a sample before the exact analysis
+  preview: boolean
+  trend: TrendOptions
+}
+
+// One analyzer run. Emits `progress` with a snapshot on every stage event and
+// `done` once it reaches a terminal status.
+export class AnalysisJob extends EventEmitter {
+  readonly sessionId: string
+  status: JobStatus = 'queued'
+  queuePosition: number | null = null
+  fromCache = false
+  preview: AnalysisPreview | null = null
+  previewRequested = false
+  error: string | null = null
+  readonly createdAt = new Date()
+  startedAt: Date | null = null
+  finishedAt: Date | null = null
+  progress: JobProgress = {
+    stage: 'uploading',
+    percent: 0,
+    filesParsed: 0,
+    filesTotal: 0,
+    usersProcessed: 0,
+    usersTotal: 0,
+    partitionsProcessed: 0,
+    partitionsTotal: 0,
+    artifactsWritten: 0,
+    artifactsTotal: 0
+  }
+  readonly completion: Promise<void>
+
+  private process: ChildProcess | null = null
+  private cancelRequested = false
+  private timedOut = false
+  private resolveCompletion!: () => void
+
+  constructor(readonly jobId: string) {
+    super()
+    this.sessionId = jobId
+    this.completion = new Promise<void>(resolve => {
+      this.resolveCompletion = resolve
+    })
+  }
+
+  get isFinished(): boolean {
+    return this.status === 'succeeded' || this.status === 'failed' || this.status === 'cancelled'
+  }
+
+  snapshot(): JobSnapshot {
+    return {
+      jobId: this.jobId,
+      sessionId: this.sessionId,
+      status: this.status,
+      queuePosition: this.queuePosition,
+      fromCache: this.fromCache,
+      progress: { ...this.progress },
+      preview: this.preview,
+      error: this.error,
+      createdAt: this.createdAt.toISOString(),
+      startedAt: this.startedAt?.toISOString() ?? null,
+      finishedAt: this.finishedAt?.toISOString() ?? null
+    }
+  }
+
+  updateProgress(stage: string, update: Partial<JobProgress>, fraction = 0) {
+    // Reports may still finish parsing after a cached result completed the job
+    if (this.isFinished) return
+    const [start, end] = STAGE_RANGES[stage] ?? [this.progress.percent, this.progress.percent]
+    const percent = start + (end - start) * Math.min(1, Math.max(0, fraction))
+    this.progress = {
+      ...this.progress,
+      ...update,
+      stage,
+      percent: Math.max(this.progress.percent, Math.round(percent))
+    }
+    this.emit('progress', this.snapshot())
+  }
+
+  // Resolves with the preview once the analyzer reports it, or with null if
+  // the job finishes first (for example when it was served from the cache)
+  waitForPreview(): Promise<AnalysisPreview | null> {
+    if (this.preview || this.isFinished) return Promise.resolve(this.preview)
+    return new Promise(resolve => {
+      this.once('preview', resolve)
+      this.completion.then(() => resolve(this.preview))
+    })
+  }
+
+  private setPreview(event: any) {
+    const estimate = (value: any): ClassEstimate => ({ estimate: value.estimate, low: value.low, high: value.high })
+    this.preview = {
+      method: event.method,
+      population: event.population,
+      sampleSize: event.sample_size,
+      confidence: event.confidence,
+      estimates: {
+        topUtilizers: estimate(event.estimates.top_utilizers),
+        underUtilized: estimate(event.estimates.under_utilized),
+        forReallocation: estimate(event.estimates.for_reallocation)
+      },
+      etaSeconds: event.eta_seconds,
+      elapsedSeconds: event.elapsed_seconds
+    }
+    this.emit('preview', this.preview)
+    this.emit('progress', this.snapshot())
+  }
+
+  // Translate `[PROGRESS] {...}` lines from the analyzer into job progress
+  private handleAnalyzerLine(line: string) {
+    if (!line.startsWith('[PROGRESS] ')) return
+    try {
+      const event = JSON.parse(line.slice('[PROGRESS] '.length))
+      switch (event.stage) {
+        case 'preview':
+          this.setPreview(event)
+          break
+        case 'loading_reports':
+          this.updateProgress(event.stage, {}, event.files_loaded / (event.files_total || 1))
+          break
+        case 'analyzing_users':
+          this.updateProgress(event.stage, {
+            usersProcessed: event.users_processed,
+            usersTotal: event.users_total
+          }, event.users_processed / (event.users_total || 1))
+          break
+        case 'analyzing_partitions':
+          this.updateProgress(event.stage, {
+            partitionsProcessed: event.partitions_processed,
+            partitionsTotal: event.partitions_total
+          }, event.partitions_processed / (event.partitions_total || 1))
+          break
+        case 'writing_artifacts':
+          this.updateProgress(event.stage, {
+            artifactsWritten: event.artifacts_written,
+            artifactsTotal: event.artifacts_total
+          }, event.artifacts_written / (event.artifacts_total || 1))
+          break
+        default:
+          this.updateProgress(event.stage, {})
+      }
+    } catch (error) {
+      console.error('Unparseable progress event:', line)
+    }
+  }
+
+  // Attach the final result to the session; it stays pinned until the caller
+  // is done with the output directory
+  private async attachResult(spec: AnalysisJobSpec, analysisResult: any) {
+    await analysisResults.set(this.sessionId, {
+      ...analysisResult,
+      tempDir: spec.tempDir,
+      filePaths: spec.filePaths,
+      uploads: spec.uploads,
+      sessionId: this.sessionId
+    })
+    await precompressSession(analysisResult).catch(error => {
+      console.error(`Failed to precompress results for ${this.sessionId}:`, error)
+    })
+  }
+
+  // Nothing reads or writes the session directory any more: hand it to the sweeper
+  private async releaseSession() {
+    await sessionManager.track(this.sessionId, { pinned: false })
+  }
+
+  // Serve an identical earlier run without queueing; false on a cache miss.
+  // The restored run is not recorded in the history store again: same
+  // uploads, filters and scoring give the snapshots of the run that filled
+  // the cache entry, which already recorded them.
+  private async restoreFromCache(spec: AnalysisJobSpec, cacheKey: string): Promise<boolean> {
+    this.updateProgress('restoring_cached_result', {}, 0)
+    const cachedResult = await restoreCachedResult(cacheKey, spec.outputDir)
+    if (!cachedResult) return false
+    this.status = 'running'
+    this.startedAt = new Date()
+    this.fromCache = true
+    await this.attachResult(spec, cachedResult)
+    await this.releaseSession()
+    this.finish('succeeded')
+    return true
+  }
+
+  async run(spec: AnalysisJobSpec) {
+    const cacheKey = await resultCacheKey(spec.uploads, spec.filters, spec.trend).catch(error => {
+      console.error('Result cache key unavailable:', error)
+      return null
+    })
+    if (cacheKey) {
+      const restored = await this.restoreFromCache(spec, cacheKey).catch(error => {
+        console.error(`Failed to restore cached result for ${this.sessionId}:`, error)
+        return false
+      })
+      if (restored) {
+        // Nobody reads the parsed reports now; free their worker slots
+        spec.pipeline.discard()
+        return
+      }
+    }
+
+    // Reserve what the analyzer's planner expects the run to peak at, falling
+    // back to the upload-size estimate if the reports cannot be profiled
+    const reportPaths = spec.uploads
+      .filter(upload => upload.fieldName.startsWith('usageReportFile_'))
+      .map(upload => upload.path)
+    const plan = await planExecution(this.jobId, reportPaths).catch(error => {
+      console.error(`Execution planning failed for ${this.sessionId}:`, error)
+      return null
+    })
+    const memoryPlan = planJobMemory(spec.uploads)
+
+    // Join the admission queue straight away; reports keep parsing meanwhile
+    const admission = jobScheduler.acquire(
+      this.jobId,
+      plan ? planReservationMb(plan) : memoryPlan.memoryMb,
+      position => {
+        this.queuePosition = position
+        this.emit('progress', this.snapshot())
+      }
+    ).then(() => {
+      this.status = 'running'
+      this.startedAt = new Date()
+      this.queuePosition = null
+      this.emit('progress', this.snapshot())
+    })
+    admission.catch(() => undefined)
+
+    let wallClockTimer: NodeJS.Timeout | null = null
+    try {
+      this.updateProgress('parsing_reports', { filesTotal: spec.pipeline.size }, 0)
+      const reports = await spec.pipeline.drain()
+      await admission
+      if (this.cancelRequested) {
+        throw new Error('Analysis cancelled')
+      }
+
+      // Only the pipeline's own cache files are passed as normalized (pickled)
+      // reports; uploads always go through the CSV/Excel readers
+      const rawReports = reports.filter(report => !report.normalized).map(report => report.path)
+      const normalizedReports = reports.filter(report => report.normalized).map(report => report.path)
+      const args = [
+        ...(rawReports.length > 0 ? ['--usage-reports', ...rawReports] : []),
+        ...(normalizedReports.length > 0 ? ['--normalized-reports', ...normalizedReports] : []),
+        '--output-dir', spec.outputDir,
+        '--run-id', this.sessionId,
+        '--cpu-seconds', String(schedulerConfig.cpuSecondsLimit)
+      ]
+      if (HISTORY_RECORDING) {
+        args.push('--record-history')
+      }
+      if (spec.targetUsersPath) {
+        args.push('--target-users', spec.targetUsersPath)
+      }
+      if (Object.keys(spec.filters).length > 0) {
+        args.push('--filters', JSON.stringify(spec.filters))
+      }
+      if (spec.preview) {
+        args.push('--preview')
+      }
+      if (spec.trend.model) {
+        args.push('--trend-model', spec.trend.model)
+      }
+      if (spec.trend.tolerance !== undefined) {
+        args.push('--trend-tolerance', String(spec.trend.tolerance))
+      }
+      // Run exactly the plan the reservation was made for
+      if (plan) {
+        args.push('--execution-plan', JSON.stringify(plan))
+      } else if (memoryPlan.outOfCore) {
+        args.push('--out-of-core', '--partitions', String(schedulerConfig.outOfCorePartitions))
+      } else if (schedulerConfig.workersPerJob > 1) {
+        args.push('--workers', String(schedulerConfig.workersPerJob))
+      }
+
+      const run = startAnalyzerScript(args, { onLine: line => this.handleAnalyzerLine(line) })
+      this.process = run.process
+      wallClockTimer = setTimeout(() => {
+        this.timedOut = true
+        this.terminate()
+      }, schedulerConfig.wallClockLimitMs)
+      const analysisResult = parseAnalyzerOutput(await run.result)
+      await this.attachResult(spec, analysisResult)
+      this.finish('succeeded')
+      if (cacheKey) {
+        // Off the response path; a failed store only costs a later cache miss.
+        // The session stays pinned until the output directory is copied.
+        storeCachedResult(cacheKey, spec.outputDir, analysisResult).finally(() => this.releaseSession())
+      } else {
+        await this.releaseSession()
+      }
+    } catch (error) {
+      if (this.timedOut) {
+        this.finish('failed', `Analysis exceeded the ${schedulerConfig.wallClockLimitMs / 1000}s time limit`)
+      } else if (this.cancelRequested) {
+        this.finish('cancelled', 'Analysis cancelled')
+      } else {
+        this.finish('failed', error instanceof Error ? error.message : 'Analysis failed')
+      }
+      // Nothing to keep from a run that produced no result
+      await sessionManager.remove(this.sessionId).catch(error => {
+        console.error(`Failed to clean up session ${this.sessionId}:`, error)
+      })
+    } finally {
+      if (wallClockTimer) clearTimeout(wallClockTimer)
+      this.process = null
+      this.queuePosition = null
+      jobScheduler.release(this.jobId)
+    }
+  }
+
+  cancel(): boolean {
+    if (this.isFinished) return false
+    this.cancelRequested = true
+    if (this.status === 'queued') {
+      // Rejects the pending admission, which unwinds run()
+      jobScheduler.withdraw(this.jobId)
+    }
+    this.terminate()
+    return true
+  }
+
+  // Ask the analyzer to stop; escalate to SIGKILL if it ignores SIGTERM
+  private terminate() {
+    const child = this.process
+    if (!child) return
+    child.kill('SIGTERM')
+    setTimeout(() => {
+      if (child.exitCode === null && child.signalCode === null) {
+        child.kill('SIGKILL')
+      }
+    }, CANCEL_GRACE_MS)
+  }
+
+  private finish(status: JobStatus, error: string | null = null) {
+    if (this.isFinished) return
+    this.status = status
+    this.error = error
+    this.finishedAt = new Date()
+    if (status === 'succeeded') {
+      this.progress = { ...this.progress, stage: 'complete', percent: 100 }
+    }
+    this.emit('done', this.snapshot())
+    this.resolveCompletion()
+    setTimeout(() => analysisJobs.delete(this.jobId), JOB_RETENTION_MS)
+  }
+}
+
+// Accept a multipart analysis request and start its job. Resolves once the
+// upload has been received; parsing and analysis continue in the background.
+export async function submitAnalysisUpload(request: Request): Promise<AnalysisJob> {
+  const job = new AnalysisJob(uuidv4())
+
+  // Create temporary directory
+  const tempDir = path.join(TEMP_ROOT, job.sessionId)
+  await mkdir(tempDir, { recursive: true })
+  // Pinned so the sweeper leaves it alone while the job is in flight
+  await sessionManager.track(job.sessionId, { pinned: true })
+
+  // Stream uploaded files straight to disk, hashing them as they arrive.
+  // Each usage report starts parsing as soon as it has landed.
+  const pipeline = new UsageReportPipeline((parsed) => {
+    job.updateProgress('parsing_reports', { filesParsed: parsed }, parsed / (pipeline.size || 1))
+  })
+  let usageReportCount = 0
+  let upload: MultipartUploadResult
+  let filters: Record<string, any>
+  let preview = false
+  const trend: TrendOptions = {}
+  try {
+    upload = await receiveMultipartUpload(request, {
+      destinationFor: (fieldName, filename) => {
+        if (fieldName === 'targetUsersFile') {
+          return path.join(tempDir, 'target_users.csv')
+        }
+        if (fieldName.startsWith('usageReportFile_')) {
+          // The stored extension picks the reader, so never take it verbatim
+          const extension = filename.split('.').pop()?.toLowerCase() || ''
+          const stored = USAGE_REPORT_EXTENSIONS.includes(extension) ? extension : 'csv'
+          return path.join(tempDir, `usage_report_${usageReportCount++}.${stored}`)
+        }
+        return null
+      },
+      onFile: (file) => {
+        if (file.fieldName.startsWith('usageReportFile_')) {
+          pipeline.add(file)
+        }
+      }
+    })
+    try {
+      filters = JSON.parse(upload.fields.filters || '{}')
+    } catch {
+      throw new MultipartError('Invalid filters JSON')
+    }
+    if (typeof filters !== 'object' || filters === null || Array.isArray(filters)) {
+      throw new MultipartError('Invalid filters JSON')
+    }
+    preview = upload.fields.preview === 'true'
+    if (upload.fields.trendModel) {
+      if (!TREND_MODELS.includes(upload.fields.trendModel)) {
+        throw new MultipartError(`Unknown trend model "${upload.fields.trendModel}"`)
+      }
+      trend.model = upload.fields.trendModel
+    }
+    if (upload.fields.trendTolerance) {
+      const tolerance = Number(upload.fields.trendTolerance)
+      if (!Number.isFinite(tolerance) || tolerance < 0) {
+        throw new MultipartError('trendTolerance must be a non-negative number')
+      }
+      trend.tolerance = tolerance
+    }
+  } catch (error) {
+    // A failed upload leaves nothing worth keeping
+    await sessionManager.remove(job.sessionId)
+    throw error
+  }
+
+  const filePaths: string[] = []
+
+  // Empty target users uploads are treated as not provided
+  let targetUsersPath = ''
+  for (const file of upload.files) {
+    if (file.fieldName === 'targetUsersFile' && file.size === 0) {
+      await unlink(file.path)
+      continue
+    }
+    if (file.fieldName === 'targetUsersFile') {
+      targetUsersPath = file.path
+    }
+    filePaths.push(file.path)
+  }
+  const uploads = upload.files.filter(file => filePaths.includes(file.path))
+
+  // Create output directory
+  const outputDir = path.join(tempDir, 'output')
+  await mkdir(outputDir, { recursive: true })
+
+  analysisJobs.set(job.jobId, job)
+  job.previewRequested = preview
+  job.run({ pipeline, outputDir, targetUsersPath, filters, tempDir, filePaths, uploads, preview, trend })
+  return job
+}
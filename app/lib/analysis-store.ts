@@ -1,13 +1,28 @@
 import { writeFile, readFile, mkdir, access } from 'fs/promises'
 import path from 'path'
+import { sessionManager } from '@/lib/session-manager'
+import { TEMP_ROOT } from '@/lib/temp-root'
+
+// Parsed results kept in memory; older sessions are re-read from disk
+const MEMORY_CACHE_SESSIONS = Number(process.env.SESSION_MEMORY_CACHE_SIZE || 8)
 
 // File-based persistent storage for analysis results
 class PersistentAnalysisStore {
   private storageDir: string
+  // Insertion-ordered, so the first key is the least recently used
   private memoryCache = new Map<string, any>()
 
   constructor() {
-    this.storageDir = path.join(process.cwd(), 'temp', 'sessions')
+    this.storageDir = path.join(TEMP_ROOT, 'sessions')
+    sessionManager.onEvict(sessionId => this.memoryCache.delete(sessionId))
+  }
+
+  private cache(sessionId: string, data: any) {
+    this.memoryCache.delete(sessionId)
+    this.memoryCache.set(sessionId, data)
+    while (this.memoryCache.size > MEMORY_CACHE_SESSIONS) {
+      this.memoryCache.delete(this.memoryCache.keys().next().value as string)
+    }
   }
 
   private async ensureStorageDir() {
@@ -18,7 +33,7 @@ class PersistentAnalysisStore {
     }
   }
 
-  private getSessionFilePath(sessionId: string): string {
+  getSessionFilePath(sessionId: string): string {
     return path.join(this.storageDir, `${sessionId}.json`)
   }
 
@@ -27,26 +42,31 @@ class PersistentAnalysisStore {
       await this.ensureStorageDir()
       
       // Store in memory cache for quick access
-      this.memoryCache.set(sessionId, data)
+      this.cache(sessionId, data)
       
       // Persist to file system
       const filePath = this.getSessionFilePath(sessionId)
       await writeFile(filePath, JSON.stringify(data, null, 2))
+      await sessionManager.track(sessionId)
       
       console.log(`Session ${sessionId} stored successfully`)
     } catch (error) {
       console.error(`Failed to store session ${sessionId}:`, error)
       // Still keep in memory cache as fallback
-      this.memoryCache.set(sessionId, data)
+      this.cache(sessionId, data)
     }
   }
 
   async get(sessionId: string): Promise<any | undefined> {
     try {
       // First check memory cache
+      await sessionManager.start()
       if (this.memoryCache.has(sessionId)) {
         console.log(`Session ${sessionId} found in memory cache`)
-        return this.memoryCache.get(sessionId)
+        const cached = this.memoryCache.get(sessionId)
+        this.cache(sessionId, cached)
+        sessionManager.touch(sessionId)
+        return cached
       }
 
       // Try to load from file system
@@ -55,7 +75,8 @@ class PersistentAnalysisStore {
       const data = JSON.parse(fileContent)
       
       // Cache in memory for future access
-      this.memoryCache.set(sessionId, data)
+      this.cache(sessionId, data)
+      sessionManager.touch(sessionId)
       
       console.log(`Session ${sessionId} loaded from file system`)
       return data
@@ -67,13 +88,8 @@ class PersistentAnalysisStore {
 
   async delete(sessionId: string): Promise<void> {
     try {
-      // Remove from memory cache
-      this.memoryCache.delete(sessionId)
-      
-      // Remove from file system
-      const filePath = this.getSessionFilePath(sessionId)
-      const { unlink } = await import('fs/promises')
-      await unlink(filePath)
+      // Removes the stored result, the session directory and the cached copy
+      await sessionManager.remove(sessionId)
       
       console.log(`Session ${sessionId} deleted successfully`)
     } catch (error) {
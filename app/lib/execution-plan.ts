@@ -0,0 +1,65 @@
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+import { jobScheduler, schedulerConfig, estimateJobMemoryMb } from '@/lib/job-scheduler'
+
+// Execution plan from python_backend/execution_planner.py. The web layer asks
+// for it once per job, reserves the chosen strategy's estimated peak with the
+// scheduler and hands the same plan to the analyzer, so admission and
+// execution agree on one memory estimate.
+
+export type ExecutionStrategy = 'in_memory' | 'chunked' | 'spill'
+
+export interface ExecutionPlan {
+  strategy: ExecutionStrategy
+  memoryBudgetMb: number
+  workers: number
+  partitions: number | null
+  estimatedPeakMb: Record<ExecutionStrategy, number>
+  estimatedRows: number
+  toolColumns: number
+}
+
+// The planner only reads report headers, but it is an interpreter of its own
+// started before the job is admitted: at most this many run at once, each
+// holding an interpreter's footprint of the memory budget
+const PLANNER_CONCURRENCY = Number(process.env.PLANNER_CONCURRENCY || 2)
+let activePlanners = 0
+const waitingPlanners: (() => void)[] = []
+
+async function withPlannerSlot<T>(task: () => Promise<T>): Promise<T> {
+  if (activePlanners >= PLANNER_CONCURRENCY) {
+    await new Promise<void>(resolve => waitingPlanners.push(resolve))
+  }
+  activePlanners++
+  try {
+    return await task()
+  } finally {
+    activePlanners--
+    waitingPlanners.shift()?.()
+  }
+}
+
+// Plan a run over the raw usage reports within the per-job budget
+export async function planExecution(jobId: string, reportPaths: string[]): Promise<ExecutionPlan> {
+  const output = await withPlannerSlot(() => jobScheduler.withHelperMemory(
+    `plan:${jobId}`,
+    estimateJobMemoryMb([]),
+    () => runAnalyzerScript([
+      '--plan-execution',
+      '--usage-reports', ...reportPaths,
+      '--memory-budget-mb', String(schedulerConfig.outOfCoreThresholdMb),
+      '--workers', String(schedulerConfig.workersPerJob),
+      '--partitions', String(schedulerConfig.outOfCorePartitions)
+    ])
+  ))
+  const result = parseAnalyzerOutput(output)
+  if (result.status !== 'success') {
+    throw new Error(result.message || 'Execution planning failed')
+  }
+  const { status, reports, ...plan } = result
+  return plan as ExecutionPlan
+}
+
+// Memory to reserve for a planned run: the estimated peak of its strategy
+export function planReservationMb(plan: ExecutionPlan): number {
+  return Math.ceil(plan.estimatedPeakMb[plan.strategy])
+}
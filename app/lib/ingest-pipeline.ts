@@ -0,0 +1,170 @@
+import { mkdir, readdir, stat, unlink, utimes } from 'fs/promises'
+import os from 'os'
+import path from 'path'
+import { StreamedUpload } from '@/lib/multipart'
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+import { TEMP_ROOT } from '@/lib/temp-root'
+import { jobScheduler, estimateJobMemoryMb } from '@/lib/job-scheduler'
+
+// Bump whenever the layout written by `copilot_analyzer.py --normalize-report` changes
+const PARSE_CACHE_VERSION = 2
+export const PARSE_CACHE_DIR = path.join(TEMP_ROOT, 'parse-cache')
+const PARSE_CACHE_MAX_ENTRIES = Number(process.env.PARSE_CACHE_MAX_ENTRIES || 64)
+
+// A usage report as handed to the analyzer: its parse-cache file
+// (`--normalized-reports`), or the raw upload when no parse is available
+export interface PipelinedReport {
+  path: string
+  normalized: boolean
+}
+
+// Parses shared across concurrent requests that upload identical content;
+// `waiters` counts the pipelines still wanting the result
+interface SharedParse {
+  promise: Promise<string>
+  waiters: number
+}
+const inFlight = new Map<string, SharedParse>()
+
+// A queued parse nobody wants any more, dropped before it started
+class ParseDiscarded extends Error {}
+
+// Parse workers are bounded across all uploads, not per request, so several
+// simultaneous uploads cannot fan out into one interpreter per file each. Each
+// worker also reserves its file's estimated footprint from the analyzer
+// memory budget (lib/job-scheduler.ts) while it runs.
+const PARSE_WORKER_CONCURRENCY = Number(
+  process.env.PARSE_WORKER_CONCURRENCY || Math.max(1, os.cpus().length - 1)
+)
+let activeParses = 0
+const waitingParses: (() => void)[] = []
+
+async function withParseSlot<T>(task: () => Promise<T>): Promise<T> {
+  if (activeParses >= PARSE_WORKER_CONCURRENCY) {
+    await new Promise<void>(resolve => waitingParses.push(resolve))
+  }
+  activeParses++
+  try {
+    return await task()
+  } finally {
+    activeParses--
+    waitingParses.shift()?.()
+  }
+}
+
+async function touch(filePath: string): Promise<boolean> {
+  try {
+    const now = new Date()
+    await utimes(filePath, now, now)
+    return true
+  } catch {
+    return false
+  }
+}
+
+// Keep the parse cache bounded, evicting the least recently used entries
+async function pruneParseCache() {
+  try {
+    const entries = await readdir(PARSE_CACHE_DIR)
+    const pickles = await Promise.all(
+      entries
+        .filter(entry => entry.endsWith('.pkl'))
+        .map(async entry => {
+          const fullPath = path.join(PARSE_CACHE_DIR, entry)
+          return { fullPath, mtime: (await stat(fullPath)).mtimeMs }
+        })
+    )
+    pickles.sort((a, b) => b.mtime - a.mtime)
+    for (const { fullPath } of pickles.slice(PARSE_CACHE_MAX_ENTRIES)) {
+      await unlink(fullPath).catch(() => undefined)
+    }
+  } catch (error) {
+    console.error('Parse cache pruning failed:', error)
+  }
+}
+
+async function normalizeInto(upload: StreamedUpload, cachePath: string): Promise<string> {
+  await mkdir(PARSE_CACHE_DIR, { recursive: true })
+  await jobScheduler.withHelperMemory(`parse:${cachePath}`, estimateJobMemoryMb([upload]), async () => {
+    parseAnalyzerOutput(
+      await runAnalyzerScript(['--normalize-report', upload.path, '--normalized-output', cachePath])
+    )
+  })
+  await pruneParseCache()
+  return cachePath
+}
+
+// Parses usage reports while the rest of the upload is still arriving. Each
+// report is normalized by its own worker as soon as it lands on disk, keyed
+// by content hash, so the analysis stage only waits for the last file.
+export class UsageReportPipeline {
+  private results: Promise<PipelinedReport>[] = []
+  private parsed = 0
+  private discarded = false
+  private joined: SharedParse[] = []
+
+  // `onParsed` reports how many files have finished parsing so far
+  constructor(private onParsed?: (parsed: number) => void) {}
+
+  get size(): number {
+    return this.results.length
+  }
+
+  add(upload: StreamedUpload) {
+    this.results.push(this.normalize(upload).then(result => {
+      this.onParsed?.(++this.parsed)
+      return result
+    }))
+  }
+
+  // Resolve with the files to hand to the analyzer, in upload order
+  drain(): Promise<PipelinedReport[]> {
+    return Promise.all(this.results)
+  }
+
+  // The parsed files will not be used (e.g. the result came from the cache):
+  // parses still waiting for a worker slot are skipped unless another upload
+  // of the same content wants them. Parses already running finish.
+  discard() {
+    this.discarded = true
+    for (const shared of this.joined) {
+      shared.waiters--
+    }
+    this.joined = []
+  }
+
+  private async normalize(upload: StreamedUpload): Promise<PipelinedReport> {
+    const raw = { path: upload.path, normalized: false }
+    if (this.discarded) return raw
+    const cachePath = path.join(PARSE_CACHE_DIR, `${upload.sha256}.v${PARSE_CACHE_VERSION}.pkl`)
+    if (await touch(cachePath)) {
+      return { path: cachePath, normalized: true }
+    }
+    if (this.discarded) return raw
+
+    let shared = inFlight.get(cachePath)
+    if (shared) {
+      shared.waiters++
+    } else {
+      // Counted before the parse is queued: a free slot starts it synchronously
+      const parse: SharedParse = { promise: Promise.resolve(''), waiters: 1 }
+      parse.promise = withParseSlot(() => parse.waiters > 0
+        ? normalizeInto(upload, cachePath)
+        : Promise.reject(new ParseDiscarded())
+      ).finally(() => inFlight.delete(cachePath))
+      inFlight.set(cachePath, parse)
+      shared = parse
+    }
+    this.joined.push(shared)
+
+    try {
+      return { path: await shared.promise, normalized: true }
+    } catch (error) {
+      // Fall back to the raw upload; the analyzer reports unreadable files itself
+      if (!(error instanceof ParseDiscarded)) {
+        console.error(`Pipelined parse failed for ${upload.filename}:`, error)
+      }
+      return raw
+    }
+  }
+}
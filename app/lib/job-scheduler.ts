@@ -0,0 +1,244 @@
+import os from 'os'
+
+// Admission control for analyzer runs. Each analysis loads every usage report
+// into pandas, so a handful of simultaneous uploads can exhaust the host. Jobs
+// wait in a FIFO queue until both a concurrency slot and enough of the memory
+// budget are free. Helper processes that run before a job is admitted (parse
+// workers, the execution planner) reserve memory from the same budget.
+
+export interface SchedulerConfig {
+  maxConcurrentJobs: number
+  memoryBudgetMb: number
+  cpuSecondsLimit: number
+  wallClockLimitMs: number
+  // Memory each analysis is planned to fit (lib/execution-plan.ts); the job
+  // then reserves the peak the planner estimates for the strategy it chose
+  outOfCoreThresholdMb: number
+  outOfCorePartitions: number
+  // Processes each in-memory analysis may fork for per-user metrics
+  workersPerJob: number
+}
+
+export interface SchedulerStats {
+  running: number
+  queued: number
+  maxConcurrentJobs: number
+  memoryBudgetMb: number
+  memoryReservedMb: number
+  // Helper processes holding (or waiting for) a memory reservation
+  helpersRunning: number
+  helpersQueued: number
+  admitted: number
+  withdrawn: number
+  averageWaitMs: number
+  p95WaitMs: number
+  maxWaitMs: number
+  oldestQueuedWaitMs: number
+}
+
+const envNumber = (name: string, fallback: number): number => {
+  const value = Number(process.env[name])
+  return Number.isFinite(value) && value > 0 ? value : fallback
+}
+
+const maxConcurrentJobs = envNumber('ANALYZER_MAX_CONCURRENT_JOBS', Math.max(1, Math.floor(os.cpus().length / 2)))
+const memoryBudgetMb = envNumber('ANALYZER_MEMORY_BUDGET_MB', Math.floor((os.totalmem() / 1024 / 1024) * 0.6))
+
+export const schedulerConfig: SchedulerConfig = {
+  maxConcurrentJobs,
+  memoryBudgetMb,
+  cpuSecondsLimit: envNumber('ANALYZER_CPU_SECONDS', 30 * 60),
+  wallClockLimitMs: envNumber('ANALYZER_WALL_CLOCK_SECONDS', 60 * 60) * 1000,
+  outOfCoreThresholdMb: envNumber('ANALYZER_OUT_OF_CORE_MB', memoryBudgetMb),
+  outOfCorePartitions: envNumber('ANALYZER_OUT_OF_CORE_PARTITIONS', 64),
+  workersPerJob: envNumber('ANALYZER_WORKERS_PER_JOB', Math.max(1, Math.floor(os.cpus().length / maxConcurrentJobs)))
+}
+
+// Baseline interpreter + pandas footprint, plus the in-memory expansion of the
+// uploaded bytes. Excel files are zipped XML and expand much more than CSV.
+const BASE_JOB_MEMORY_MB = 200
+const CSV_EXPANSION = 6
+const EXCEL_EXPANSION = 25
+// Number of recent queue waits kept for the wait-time statistics
+const WAIT_SAMPLE_SIZE = 200
+
+const expandedMb = (upload: { filename: string, size: number }) =>
+  upload.size * (/\.xlsx?$/i.test(upload.filename) ? EXCEL_EXPANSION : CSV_EXPANSION) / 1024 / 1024
+
+export function estimateJobMemoryMb(uploads: { filename: string, size: number }[]): number {
+  return Math.ceil(BASE_JOB_MEMORY_MB + uploads.reduce((total, upload) => total + expandedMb(upload), 0))
+}
+
+export interface JobMemoryPlan {
+  memoryMb: number
+  outOfCore: boolean
+}
+
+// Out of core, the analyzer holds one report while spilling it and then one
+// partition at a time, so the reservation no longer grows with the total.
+export function planJobMemory(uploads: { filename: string, size: number }[]): JobMemoryPlan {
+  const inMemoryMb = estimateJobMemoryMb(uploads)
+  if (inMemoryMb <= schedulerConfig.outOfCoreThresholdMb) {
+    return { memoryMb: inMemoryMb, outOfCore: false }
+  }
+  const largestReportMb = Math.max(0, ...uploads.map(expandedMb))
+  const partitionMb = (inMemoryMb - BASE_JOB_MEMORY_MB) / schedulerConfig.outOfCorePartitions
+  return {
+    memoryMb: Math.ceil(BASE_JOB_MEMORY_MB + largestReportMb + partitionMb),
+    outOfCore: true
+  }
+}
+
+interface Ticket {
+  jobId: string
+  memoryMb: number
+  enqueuedAt: number
+  admit: () => void
+  reject: (error: Error) => void
+  onPosition?: (position: number) => void
+}
+
+export class SchedulerCancelledError extends Error {}
+
+export class JobScheduler {
+  private queue: Ticket[] = []
+  private running = new Map<string, number>()
+  // Memory-only reservations of helper processes, served before jobs
+  private helperQueue: Ticket[] = []
+  private helpers = new Map<string, number>()
+  private memoryReservedMb = 0
+  private waits: number[] = []
+  private admitted = 0
+  private withdrawn = 0
+
+  constructor(private config: SchedulerConfig) {}
+
+  // Resolves once the job may start. `onPosition` receives the 1-based queue
+  // position whenever it changes while the job waits.
+  acquire(jobId: string, memoryMb: number, onPosition?: (position: number) => void): Promise<void> {
+    return new Promise<void>((resolve, reject) => {
+      this.queue.push({
+        jobId,
+        memoryMb,
+        enqueuedAt: Date.now(),
+        admit: resolve,
+        reject,
+        onPosition
+      })
+      this.dispatch()
+    })
+  }
+
+  release(jobId: string) {
+    const memoryMb = this.running.get(jobId)
+    if (memoryMb === undefined) return
+    this.running.delete(jobId)
+    this.memoryReservedMb -= memoryMb
+    this.dispatch()
+  }
+
+  // Resolves once a helper process (a parse worker or the planner) may start
+  // with `memoryMb` reserved. Helpers take no concurrency slot and do not
+  // queue behind jobs: an admitted job may be waiting on its own parses.
+  acquireHelper(helperId: string, memoryMb: number): Promise<void> {
+    return new Promise<void>((resolve, reject) => {
+      this.helperQueue.push({ jobId: helperId, memoryMb, enqueuedAt: Date.now(), admit: resolve, reject })
+      this.dispatch()
+    })
+  }
+
+  releaseHelper(helperId: string) {
+    const memoryMb = this.helpers.get(helperId)
+    if (memoryMb === undefined) return
+    this.helpers.delete(helperId)
+    this.memoryReservedMb -= memoryMb
+    this.dispatch()
+  }
+
+  // Run `task` as a helper process holding `memoryMb` of the budget
+  async withHelperMemory<T>(helperId: string, memoryMb: number, task: () => Promise<T>): Promise<T> {
+    await this.acquireHelper(helperId, memoryMb)
+    try {
+      return await task()
+    } finally {
+      this.releaseHelper(helperId)
+    }
+  }
+
+  // Drop a job that is still waiting; running jobs are released instead
+  withdraw(jobId: string): boolean {
+    const index = this.queue.findIndex(ticket => ticket.jobId === jobId)
+    if (index === -1) return false
+    const [ticket] = this.queue.splice(index, 1)
+    this.withdrawn++
+    ticket.reject(new SchedulerCancelledError('Analysis cancelled'))
+    this.dispatch()
+    return true
+  }
+
+  position(jobId: string): number | null {
+    const index = this.queue.findIndex(ticket => ticket.jobId === jobId)
+    return index === -1 ? null : index + 1
+  }
+
+  stats(): SchedulerStats {
+    const sorted = [...this.waits].sort((a, b) => a - b)
+    const now = Date.now()
+    return {
+      running: this.running.size,
+      queued: this.queue.length,
+      maxConcurrentJobs: this.config.maxConcurrentJobs,
+      memoryBudgetMb: this.config.memoryBudgetMb,
+      memoryReservedMb: this.memoryReservedMb,
+      helpersRunning: this.helpers.size,
+      helpersQueued: this.helperQueue.length,
+      admitted: this.admitted,
+      withdrawn: this.withdrawn,
+      averageWaitMs: sorted.length ? Math.round(sorted.reduce((a, b) => a + b, 0) / sorted.length) : 0,
+      p95WaitMs: sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * 0.95))] : 0,
+      maxWaitMs: sorted.length ? sorted[sorted.length - 1] : 0,
+      oldestQueuedWaitMs: this.queue.length ? now - this.queue[0].enqueuedAt : 0
+    }
+  }
+
+  // Admit from the head of the queue only, so a large job cannot be starved
+  // by a stream of small ones. A job bigger than the whole budget still runs,
+  // but only once nothing else is. Helpers go first; one that does not fit
+  // still runs once no other helper is, so parsing always makes progress even
+  // when admitted jobs hold the rest of the budget.
+  private dispatch() {
+    while (this.helperQueue.length > 0) {
+      const head = this.helperQueue[0]
+      const fits = this.memoryReservedMb + head.memoryMb <= this.config.memoryBudgetMb
+      if (!fits && this.helpers.size > 0) break
+
+      this.helperQueue.shift()
+      this.helpers.set(head.jobId, head.memoryMb)
+      this.memoryReservedMb += head.memoryMb
+      head.admit()
+    }
+    while (this.queue.length > 0) {
+      const head = this.queue[0]
+      if (this.running.size >= this.config.maxConcurrentJobs) break
+      const fits = this.memoryReservedMb + head.memoryMb <= this.config.memoryBudgetMb
+      if (!fits && this.running.size > 0) break
+
+      this.queue.shift()
+      this.running.set(head.jobId, head.memoryMb)
+      this.memoryReservedMb += head.memoryMb
+      this.admitted++
+      this.waits.push(Date.now() - head.enqueuedAt)
+      if (this.waits.length > WAIT_SAMPLE_SIZE) this.waits.shift()
+      head.admit()
+    }
+    this.queue.forEach((ticket, index) => ticket.onPosition?.(index + 1))
+  }
+}
+
+const globalForScheduler = globalThis as unknown as {
+  jobScheduler: JobScheduler | undefined
+}
+
+// Route handlers are bundled separately, so the scheduler lives on globalThis
+export const jobScheduler = globalForScheduler.jobScheduler ?? new JobScheduler(schedulerConfig)
+globalForScheduler.jobScheduler = jobScheduler
@@ -0,0 +1,254 @@
+import { createWriteStream, WriteStream } from 'fs'
+import { unlink } from 'fs/promises'
+import { once } from 'events'
+import { createHash, Hash } from 'crypto'
+
+// Streaming multipart/form-data receiver. File parts are piped straight to
+// disk (with backpressure) and hashed while they stream, so an upload is never
+// materialized in the Node heap.
+
+export interface StreamedUpload {
+  fieldName: string
+  filename: string
+  path: string
+  size: number
+  sha256: string
+}
+
+export interface MultipartUploadResult {
+  fields: Record<string, string>
+  files: StreamedUpload[]
+}
+
+export interface MultipartUploadOptions {
+  // Destination path for a file part, or null to discard the part
+  destinationFor: (fieldName: string, filename: string) => string | null
+  // Invoked as soon as a file part has been fully flushed to disk
+  onFile?: (file: StreamedUpload) => void
+  maxFieldBytes?: number
+  maxHeaderBytes?: number
+}
+
+const CRLF = Buffer.from('\r\n')
+const HEADER_END = Buffer.from('\r\n\r\n')
+const DEFAULT_MAX_FIELD_BYTES = 1024 * 1024
+const DEFAULT_MAX_HEADER_BYTES = 16 * 1024
+
+export class MultipartError extends Error {}
+
+export function getBoundary(contentType: string | null): string {
+  const match = /boundary=(?:"([^"]+)"|([^;]+))/i.exec(contentType || '')
+  if (!contentType?.toLowerCase().startsWith('multipart/form-data') || !match) {
+    throw new MultipartError('Expected a multipart/form-data request with a boundary')
+  }
+  return (match[1] || match[2]).trim()
+}
+
+interface PartHeaders {
+  name: string
+  filename?: string
+}
+
+function parsePartHeaders(raw: string): PartHeaders {
+  const disposition = raw
+    .split('\r\n')
+    .find(line => line.toLowerCase().startsWith('content-disposition:'))
+  if (!disposition) {
+    throw new MultipartError('Multipart part is missing Content-Disposition')
+  }
+  const name = /\bname="([^"]*)"/i.exec(disposition)
+  const filename = /\bfilename="([^"]*)"/i.exec(disposition)
+  return {
+    name: name ? name[1] : '',
+    filename: filename ? filename[1] : undefined
+  }
+}
+
+interface OpenFilePart {
+  kind: 'file'
+  upload: StreamedUpload
+  stream: WriteStream | null
+  hash: Hash
+  error: Error | null
+}
+
+interface OpenFieldPart {
+  kind: 'field'
+  name: string
+  chunks: Buffer[]
+  size: number
+}
+
+type OpenPart = OpenFilePart | OpenFieldPart
+
+export async function receiveMultipartUpload(
+  request: Request,
+  options: MultipartUploadOptions
+): Promise<MultipartUploadResult> {
+  if (!request.body) {
+    throw new MultipartError('Request has no body')
+  }
+
+  const delimiter = Buffer.from(`\r\n--${getBoundary(request.headers.get('content-type'))}`)
+  const maxFieldBytes = options.maxFieldBytes ?? DEFAULT_MAX_FIELD_BYTES
+  const maxHeaderBytes = options.maxHeaderBytes ?? DEFAULT_MAX_HEADER_BYTES
+
+  const result: MultipartUploadResult = { fields: {}, files: [] }
+  const written: string[] = []
+
+  // Prefixing CRLF lets the very first boundary match the same delimiter as
+  // every subsequent one.
+  let buffer: Buffer = Buffer.from(CRLF)
+  let state: 'preamble' | 'boundary' | 'headers' | 'body' | 'done' = 'preamble'
+  let part: OpenPart | null = null
+
+  const openPart = (headers: PartHeaders): OpenPart => {
+    if (headers.filename === undefined) {
+      return { kind: 'field', name: headers.name, chunks: [], size: 0 }
+    }
+    const destination = options.destinationFor(headers.name, headers.filename)
+    const filePart: OpenFilePart = {
+      kind: 'file',
+      upload: {
+        fieldName: headers.name,
+        filename: headers.filename,
+        path: destination || '',
+        size: 0,
+        sha256: ''
+      },
+      stream: destination ? createWriteStream(destination) : null,
+      hash: createHash('sha256'),
+      error: null
+    }
+    if (filePart.stream) {
+      written.push(destination as string)
+      filePart.stream.on('error', (error) => { filePart.error = error })
+    }
+    return filePart
+  }
+
+  const writeToPart = async (data: Buffer) => {
+    if (!part || data.length === 0) return
+    if (part.kind === 'field') {
+      part.size += data.length
+      if (part.size > maxFieldBytes) {
+        throw new MultipartError(`Form field "${part.name}" exceeds ${maxFieldBytes} bytes`)
+      }
+      part.chunks.push(Buffer.from(data))
+      return
+    }
+    part.hash.update(data)
+    part.upload.size += data.length
+    if (part.error) throw part.error
+    if (part.stream && !part.stream.write(data)) {
+      await once(part.stream, 'drain')
+    }
+  }
+
+  const closePart = async () => {
+    if (!part) return
+    if (part.kind === 'field') {
+      result.fields[part.name] = Buffer.concat(part.chunks).toString('utf-8')
+    } else {
+      part.upload.sha256 = part.hash.digest('hex')
+      if (part.stream) {
+        part.stream.end()
+        await once(part.stream, 'finish')
+        if (part.error) throw part.error
+        result.files.push(part.upload)
+        options.onFile?.(part.upload)
+      }
+    }
+    part = null
+  }
+
+  // Consume as much of the buffer as possible; returns false when more input
+  // is needed to make progress.
+  const step = async (): Promise<boolean> => {
+    switch (state) {
+      case 'preamble': {
+        const index = buffer.indexOf(delimiter)
+        if (index === -1) {
+          buffer = buffer.subarray(Math.max(0, buffer.length - delimiter.length + 1))
+          return false
+        }
+        buffer = buffer.subarray(index + delimiter.length)
+        state = 'boundary'
+        return true
+      }
+      case 'boundary': {
+        if (buffer.length < 2) return false
+        if (buffer[0] === 0x2d && buffer[1] === 0x2d) {
+          state = 'done'
+          return false
+        }
+        const lineEnd = buffer.indexOf(CRLF)
+        if (lineEnd === -1) return false
+        // Anything between the boundary and CRLF is transport padding
+        buffer = buffer.subarray(lineEnd + CRLF.length)
+        state = 'headers'
+        return true
+      }
+      case 'headers': {
+        const index = buffer.indexOf(HEADER_END)
+        if (index === -1) {
+          if (buffer.length > maxHeaderBytes) {
+            throw new MultipartError('Multipart part headers are too large')
+          }
+          return false
+        }
+        part = openPart(parsePartHeaders(buffer.subarray(0, index).toString('utf-8')))
+        buffer = buffer.subarray(index + HEADER_END.length)
+        state = 'body'
+        return true
+      }
+      case 'body': {
+        const index = buffer.indexOf(delimiter)
+        if (index === -1) {
+          // Hold back a possible partial delimiter at the end of the buffer
+          const safe = buffer.length - delimiter.length + 1
+          if (safe > 0) {
+            await writeToPart(buffer.subarray(0, safe))
+            buffer = buffer.subarray(safe)
+          }
+          return false
+        }
+        await writeToPart(buffer.subarray(0, index))
+        await closePart()
+        buffer = buffer.subarray(index + delimiter.length)
+        state = 'boundary'
+        return true
+      }
+      default:
+        return false
+    }
+  }
+
+  const reader = request.body.getReader()
+  try {
+    while (state !== 'done') {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer = buffer.length > 0 ? Buffer.concat([buffer, value]) : Buffer.from(value)
+      while (await step()) {
+        // keep consuming
+      }
+    }
+    if (state !== 'done') {
+      throw new MultipartError('Multipart body ended before the closing boundary')
+    }
+    return result
+  } catch (error) {
+    const pending = part as OpenPart | null
+    if (pending?.kind === 'file' && pending.stream && !pending.stream.closed) {
+      // Wait for the descriptor to close so the unlink below cannot race it
+      const closed = once(pending.stream, 'close')
+      pending.stream.destroy()
+      await closed
+    }
+    await Promise.all(written.map(filePath => unlink(filePath).catch(() => undefined)))
+    throw error
+  } finally {
+    reader.releaseLock()
+  }
+}
@@ -0,0 +1,57 @@
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+export interface OrgRollupNode {
+  manager: string
+  // Manager chain from the top, joined with ' -> '; empty for the root
+  path: string
+  depth: number
+  users: number
+  directUsers: number
+  topUtilizers: number
+  underUtilized: number
+  forReallocation: number
+  meanEngagement: number | null
+  medianEngagement: number | null
+  reclaimableLicenses: number
+}
+
+// Column headings written by python_backend/org_rollup.py
+const COLUMN_KEYS: Record<string, keyof OrgRollupNode> = {
+  'Manager': 'manager',
+  'Path': 'path',
+  'Depth': 'depth',
+  'Users': 'users',
+  'Direct Users': 'directUsers',
+  'Top Utilizers': 'topUtilizers',
+  'Under-Utilized': 'underUtilized',
+  'For Reallocation': 'forReallocation',
+  'Mean Engagement': 'meanEngagement',
+  'Median Engagement': 'medianEngagement',
+  'Reclaimable Licenses': 'reclaimableLicenses'
+}
+
+function decodeOrgRollup(raw: any): OrgRollupNode[] {
+  const keys = (raw.columns as string[]).map(column => COLUMN_KEYS[column] ?? column)
+  return (raw.rows as any[][]).map(values => {
+    const node: Record<string, any> = {}
+    keys.forEach((key, i) => { node[key] = values[i] })
+    return node as OrgRollupNode
+  })
+}
+
+export function getOrgRollup(sessionId: string, results: any): Promise<OrgRollupNode[] | null> {
+  return loadSessionDataset(sessionId, results, 'orgRollup', decodeOrgRollup)
+}
+
+// Nodes in `root`'s subtree (the whole tree when empty), at most `maxDepth`
+// levels below it. Rows stay in tree order.
+export function selectSubtree(nodes: OrgRollupNode[], root: string, maxDepth?: number): OrgRollupNode[] {
+  const rootNode = nodes.find(node => node.path === root)
+  if (!rootNode) return []
+  const prefix = root ? `${root} -> ` : ''
+  const depthLimit = maxDepth === undefined ? Infinity : rootNode.depth + maxDepth
+  return nodes.filter(node =>
+    (node === rootNode || (node.path.startsWith(prefix) && node.depth > rootNode.depth)) &&
+    node.depth <= depthLimit
+  )
+}
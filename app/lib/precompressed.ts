@@ -0,0 +1,177 @@
+import { createHash } from 'crypto'
+import { createReadStream, createWriteStream } from 'fs'
+import { access, rename, stat, unlink, writeFile } from 'fs/promises'
+import path from 'path'
+import { Readable } from 'stream'
+import { pipeline } from 'stream/promises'
+import zlib from 'zlib'
+import { NextRequest, NextResponse } from 'next/server'
+
+// Session artifacts never change once written, so compressed copies are made
+// once, when the session is stored, and every response carries a strong ETag
+// for `304 Not Modified` revalidation. Bodies are streamed from disk.
+
+const ENCODINGS = [
+  { name: 'br', extension: '.br' },
+  { name: 'gzip', extension: '.gz' }
+] as const
+
+// Text artifacts worth compressing; xlsx and docx are zip archives already
+const COMPRESSIBLE_EXTENSIONS = new Set(['.json', '.html', '.csv'])
+
+const DEEP_DIVE_PAYLOAD = 'deep_dive.json'
+
+const globalForPrecompressed = globalThis as unknown as {
+  fileDigests: Map<string, { size: number, mtimeMs: number, digest: string }> | undefined
+}
+// Content digests by path, dropped when a file's size or mtime changes
+const fileDigests = globalForPrecompressed.fileDigests ?? new Map<string, { size: number, mtimeMs: number, digest: string }>()
+globalForPrecompressed.fileDigests = fileDigests
+
+async function exists(filePath: string): Promise<boolean> {
+  try {
+    await access(filePath)
+    return true
+  } catch {
+    return false
+  }
+}
+
+function compressor(encoding: typeof ENCODINGS[number]['name'], size: number) {
+  if (encoding === 'br') {
+    return zlib.createBrotliCompress({
+      params: {
+        [zlib.constants.BROTLI_PARAM_QUALITY]: 6,
+        [zlib.constants.BROTLI_PARAM_SIZE_HINT]: size
+      }
+    })
+  }
+  return zlib.createGzip({ level: 6 })
+}
+
+// Write brotli and gzip siblings of `filePath` (`.br`, `.gz`) unless present
+export async function precompress(filePath: string) {
+  if (!COMPRESSIBLE_EXTENSIONS.has(path.extname(filePath))) return
+  const { size } = await stat(filePath)
+  for (const encoding of ENCODINGS) {
+    const target = filePath + encoding.extension
+    if (await exists(target)) continue
+    const staging = `${target}.${process.pid}.tmp`
+    try {
+      await pipeline(createReadStream(filePath), compressor(encoding.name, size), createWriteStream(staging))
+      await rename(staging, target)
+    } catch (error) {
+      await unlink(staging).catch(() => undefined)
+      throw error
+    }
+  }
+}
+
+async function fileDigest(filePath: string): Promise<{ size: number, digest: string }> {
+  const { size, mtimeMs } = await stat(filePath)
+  const known = fileDigests.get(filePath)
+  if (known && known.size === size && known.mtimeMs === mtimeMs) return known
+
+  const hash = createHash('sha256')
+  for await (const chunk of createReadStream(filePath)) {
+    hash.update(chunk)
+  }
+  const entry = { size, mtimeMs, digest: hash.digest('hex').slice(0, 32) }
+  fileDigests.set(filePath, entry)
+  return entry
+}
+
+function acceptedEncodings(request: NextRequest): Set<string> {
+  const accepted = new Set<string>()
+  for (const part of (request.headers.get('accept-encoding') || '').split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';')
+    const rejected = params.some(param => /^\s*q=0(\.0*)?\s*$/.test(param))
+    if (name && !rejected) accepted.add(name)
+  }
+  return accepted
+}
+
+function matchesEtag(request: NextRequest, etag: string): boolean {
+  const header = request.headers.get('if-none-match')
+  if (!header) return false
+  return header.trim() === '*' || header.split(',').some(candidate => candidate.trim() === etag)
+}
+
+// Respond with `filePath`, or its precompressed sibling when the client
+// accepts it; `304` when the client already holds this representation
+export async function sendPrecompressed(
+  request: NextRequest,
+  filePath: string,
+  headers: Record<string, string>
+): Promise<NextResponse> {
+  const { digest } = await fileDigest(filePath)
+  const accepted = acceptedEncodings(request)
+
+  let bodyPath = filePath
+  let encoding: string | null = null
+  for (const candidate of ENCODINGS) {
+    if (accepted.has(candidate.name) && await exists(filePath + candidate.extension)) {
+      bodyPath = filePath + candidate.extension
+      encoding = candidate.name
+      break
+    }
+  }
+
+  // Each encoding is its own representation, so it gets its own strong ETag
+  const etag = `"${digest}${encoding ? `-${encoding}` : ''}"`
+  const responseHeaders: Record<string, string> = {
+    ...headers,
+    'ETag': etag,
+    'Cache-Control': 'private, no-cache',
+    'Vary': 'Accept-Encoding'
+  }
+  if (matchesEtag(request, etag)) {
+    return new NextResponse(null, { status: 304, headers: responseHeaders })
+  }
+
+  if (encoding) responseHeaders['Content-Encoding'] = encoding
+  responseHeaders['Content-Length'] = String((await stat(bodyPath)).size)
+  const body = Readable.toWeb(createReadStream(bodyPath)) as ReadableStream<Uint8Array>
+  return new NextResponse(body, { headers: responseHeaders })
+}
+
+// The GET /api/deep-dive body, serialized once per session next to its reports
+export function deepDivePayloadPath(results: any): string | null {
+  return results.files?.excel ? path.join(path.dirname(results.files.excel), DEEP_DIVE_PAYLOAD) : null
+}
+
+// Payload writes shared across concurrent requests for the same session
+const inFlight = new Map<string, Promise<string>>()
+
+export async function ensureDeepDivePayload(results: any): Promise<string | null> {
+  const payloadPath = deepDivePayloadPath(results)
+  if (!payloadPath || !results.detailed_users?.length) return null
+  let pending = inFlight.get(payloadPath)
+  if (!pending) {
+    pending = writeDeepDivePayload(payloadPath, results).finally(() => inFlight.delete(payloadPath))
+    inFlight.set(payloadPath, pending)
+  }
+  return pending
+}
+
+async function writeDeepDivePayload(payloadPath: string, results: any): Promise<string> {
+  if (!(await exists(payloadPath))) {
+    const staging = `${payloadPath}.${process.pid}.tmp`
+    await writeFile(staging, JSON.stringify({
+      status: 'success',
+      users: results.detailed_users,
+      summary: results.summary
+    }))
+    await rename(staging, payloadPath)
+  }
+  await precompress(payloadPath)
+  return payloadPath
+}
+
+// Called once a session's results are stored
+export async function precompressSession(results: any) {
+  await ensureDeepDivePayload(results)
+  for (const filePath of [results.files?.html, results.files?.orgRollup]) {
+    if (filePath) await precompress(filePath)
+  }
+}
@@ -0,0 +1,128 @@
+import { spawn, ChildProcess } from 'child_process'
+import path from 'path'
+
+export const ANALYZER_SCRIPT = path.join(process.cwd(), 'python_backend', 'copilot_analyzer.py')
+
+// Helper function to validate and parse JSON safely
+const safeJsonParse = (text: string): any => {
+  try {
+    // Trim whitespace and check if the string looks like JSON
+    const trimmed = text.trim();
+    if (!trimmed) {
+      throw new Error('Empty string provided for JSON parsing');
+    }
+
+    // Basic validation - JSON should start with { or [
+    if (!trimmed.startsWith('{') && !trimmed.startsWith('[')) {
+      throw new Error(`Invalid JSON format. Text starts with: "${trimmed.substring(0, 20)}..."`);
+    }
+
+    return JSON.parse(trimmed);
+  } catch (error) {
+    throw new Error(`JSON parsing failed: ${error instanceof Error ? error.message : 'Unknown error'}. Input: "${text.substring(0, 100)}..."`);
+  }
+};
+
+export interface AnalyzerRun {
+  process: ChildProcess
+  result: Promise<string>
+}
+
+export interface AnalyzerRunOptions {
+  // Called with every complete stdout line as it is produced
+  onLine?: (line: string) => void
+}
+
+// Start the analyzer script and expose the child so callers can stream or cancel it
+export function startAnalyzerScript(args: string[], options: AnalyzerRunOptions = {}): AnalyzerRun {
+  const pythonProcess = spawn('python3', [ANALYZER_SCRIPT, ...args])
+
+  const result = new Promise<string>((resolve, reject) => {
+    let stdout = ''
+    let stderr = ''
+    let pendingLine = ''
+
+    pythonProcess.stdout.on('data', (data) => {
+      const text = data.toString()
+      stdout += text
+      if (options.onLine) {
+        const lines = (pendingLine + text).split('\n')
+        pendingLine = lines.pop() || ''
+        lines.forEach(line => options.onLine!(line))
+      }
+    })
+
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString()
+    })
+
+    pythonProcess.on('close', (code, signal) => {
+      if (pendingLine && options.onLine) {
+        options.onLine(pendingLine)
+      }
+      if (code === 0) {
+        resolve(stdout)
+      } else {
+        // Errors are reported as a JSON line on stdout when stderr is empty
+        const detail = stderr || stdout.trim().split('\n').pop() || ''
+        reject(new Error(`Python script failed with code ${code ?? signal}: ${detail}`))
+      }
+    })
+
+    pythonProcess.on('error', (error) => {
+      reject(error)
+    })
+  })
+
+  return { process: pythonProcess, result }
+}
+
+// Run the analyzer script with the given arguments and resolve with its stdout
+export function runAnalyzerScript(args: string[]): Promise<string> {
+  return startAnalyzerScript(args).result
+}
+
+// Find the JSON result line in the analyzer output (the last parseable one wins)
+export function parseAnalyzerOutput(result: string): any {
+  const lines = result.trim().split('\n')
+  const lastLine = lines[lines.length - 1]
+
+  let analysisResult: any = null
+  let jsonParseError: string | null = null
+
+  // Try parsing from the last line backwards to find valid JSON
+  for (let i = lines.length - 1; i >= 0; i--) {
+    const line = lines[i].trim()
+    if (line && (line.startsWith('{') || line.startsWith('['))) {
+      try {
+        analysisResult = safeJsonParse(line)
+        break
+      } catch (error) {
+        jsonParseError = error instanceof Error ? error.message : 'Unknown JSON parse error'
+        console.log(`Failed to parse line ${i + 1}:`, error)
+        continue
+      }
+    }
+  }
+
+  // If no valid JSON was found, throw an error with helpful information
+  if (!analysisResult) {
+    const errorMessage = jsonParseError
+      ? `No valid JSON found in Python output. Last parse error: ${jsonParseError}`
+      : 'No valid JSON found in Python output. Output may contain only non-JSON text.';
+
+    console.error('Python output analysis failed:', {
+      totalLines: lines.length,
+      lastLine,
+      fullOutput: result.substring(0, 500) + (result.length > 500 ? '...' : '')
+    })
+
+    throw new Error(`${errorMessage} Full output: ${result.substring(0, 200)}...`)
+  }
+
+  if (analysisResult.status === 'error') {
+    throw new Error(analysisResult.message)
+  }
+
+  return analysisResult
+}
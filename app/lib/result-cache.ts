@@ -0,0 +1,235 @@
+import { createHash } from 'crypto'
+import { cp, mkdir, readdir, readFile, rename, rm, stat, utimes, writeFile } from 'fs/promises'
+import path from 'path'
+import { StreamedUpload } from '@/lib/multipart'
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+import { TEMP_ROOT } from '@/lib/temp-root'
+
+// Whole-run memoization. A finished run's output directory and result are
+// stored under a digest of everything that determines them: the uploaded
+// files' content hashes, the normalized filters and the analyzer's scoring
+// version and classification thresholds. A rerun with the same key copies the
+// stored artifacts into its session instead of parsing and analyzing again.
+
+// Bump whenever the layout of a cache entry changes
+const RESULT_CACHE_VERSION = 1
+export const RESULT_CACHE_DIR = path.join(TEMP_ROOT, 'result-cache')
+const RESULT_CACHE_MAX_ENTRIES = Number(process.env.RESULT_CACHE_MAX_ENTRIES || 32)
+const RESULT_CACHE_MAX_BYTES = Number(process.env.RESULT_CACHE_MAX_MB || 1024) * 1024 * 1024
+
+interface ScoringConfig {
+  version: number
+  thresholds: Record<string, number>
+  // Usage trend models the analyzer offers and its defaults
+  trend: { models: string[], model: string, tolerance: number }
+}
+
+// Per-run choice of usage trend model; unset fields use the analyzer's defaults
+export interface TrendOptions {
+  model?: string
+  tolerance?: number
+}
+
+interface CacheEntryMeta {
+  key: string
+  scoringVersion: number
+  outputDir: string
+  bytes: number
+  createdAt: string
+}
+
+export interface ResultCacheStats {
+  entries: number
+  bytes: number
+  maxEntries: number
+  maxBytes: number
+  scoringVersion: number
+}
+
+const globalForResultCache = globalThis as unknown as {
+  scoringConfig: Promise<ScoringConfig> | undefined
+}
+
+// Asked once per process; the analyzer is the source of truth for scoring
+export function getScoringConfig(): Promise<ScoringConfig> {
+  if (!globalForResultCache.scoringConfig) {
+    globalForResultCache.scoringConfig = runAnalyzerScript(['--scoring-config'])
+      .then(output => {
+        const { version, thresholds, trend } = parseAnalyzerOutput(output)
+        return { version, thresholds, trend }
+      })
+      .catch(error => {
+        globalForResultCache.scoringConfig = undefined
+        throw error
+      })
+  }
+  return globalForResultCache.scoringConfig
+}
+
+// Key order and array order of filter values do not change the analysis
+function normalizeFilters(filters: Record<string, any>): Record<string, any> {
+  const normalized: Record<string, any> = {}
+  for (const name of Object.keys(filters).sort()) {
+    const value = filters[name]
+    if (Array.isArray(value)) {
+      if (value.length > 0) normalized[name] = Array.from(new Set(value.map(String))).sort()
+    } else if (value !== undefined && value !== null && value !== '') {
+      normalized[name] = value
+    }
+  }
+  return normalized
+}
+
+export async function resultCacheKey(
+  uploads: StreamedUpload[],
+  filters: Record<string, any>,
+  trend: TrendOptions = {}
+): Promise<string> {
+  const { trend: trendDefaults, ...scoring } = await getScoringConfig()
+  const target = uploads.find(upload => upload.fieldName === 'targetUsersFile')
+  const model = trend.model ?? trendDefaults.model
+  const material = {
+    cacheVersion: RESULT_CACHE_VERSION,
+    scoring,
+    // The tolerance only affects the slope model
+    trend: model === 'slope' ? { model, tolerance: trend.tolerance ?? trendDefaults.tolerance } : { model },
+    targetUsers: target?.sha256 ?? null,
+    // Report order is kept: the analyzer concatenates reports in upload order
+    usageReports: uploads
+      .filter(upload => upload.fieldName.startsWith('usageReportFile_'))
+      .map(upload => upload.sha256),
+    // Filters only apply to a target user list
+    filters: target ? normalizeFilters(filters) : {}
+  }
+  return createHash('sha256').update(JSON.stringify(material)).digest('hex')
+}
+
+// Rewrite artifact paths recorded under one output directory to another
+function relocate(value: any, from: string, to: string): any {
+  if (typeof value === 'string') {
+    return value === from || value.startsWith(from + path.sep) ? to + value.slice(from.length) : value
+  }
+  if (Array.isArray(value)) return value.map(item => relocate(item, from, to))
+  if (value && typeof value === 'object') {
+    return Object.fromEntries(Object.entries(value).map(([name, item]) => [name, relocate(item, from, to)]))
+  }
+  return value
+}
+
+async function readMeta(entryDir: string): Promise<CacheEntryMeta | null> {
+  try {
+    return JSON.parse(await readFile(path.join(entryDir, 'meta.json'), 'utf-8'))
+  } catch {
+    return null
+  }
+}
+
+async function directorySize(dirPath: string): Promise<number> {
+  let total = 0
+  for (const entry of await readdir(dirPath, { withFileTypes: true })) {
+    const entryPath = path.join(dirPath, entry.name)
+    total += entry.isDirectory() ? await directorySize(entryPath) : (await stat(entryPath)).size
+  }
+  return total
+}
+
+// Copy a stored run into `outputDir`; resolves with its result, or null on a miss
+export async function restoreCachedResult(key: string, outputDir: string): Promise<any | null> {
+  const entryDir = path.join(RESULT_CACHE_DIR, key)
+  const meta = await readMeta(entryDir)
+  if (!meta) return null
+  try {
+    const result = JSON.parse(await readFile(path.join(entryDir, 'result.json'), 'utf-8'))
+    await cp(path.join(entryDir, 'output'), outputDir, { recursive: true })
+    const now = new Date()
+    await utimes(path.join(entryDir, 'meta.json'), now, now)
+    return relocate(result, meta.outputDir, outputDir)
+  } catch (error) {
+    console.error(`Result cache entry ${key} is unusable:`, error)
+    await rm(entryDir, { recursive: true, force: true })
+    return null
+  }
+}
+
+// Store a finished run; failures only cost a future cache miss
+export async function storeCachedResult(key: string, outputDir: string, result: any) {
+  const entryDir = path.join(RESULT_CACHE_DIR, key)
+  const stagingDir = `${entryDir}.${process.pid}.tmp`
+  try {
+    const scoring = await getScoringConfig()
+    await rm(stagingDir, { recursive: true, force: true })
+    await mkdir(stagingDir, { recursive: true })
+    await cp(outputDir, path.join(stagingDir, 'output'), { recursive: true })
+    await writeFile(path.join(stagingDir, 'result.json'), JSON.stringify(result))
+    const meta: CacheEntryMeta = {
+      key,
+      scoringVersion: scoring.version,
+      outputDir,
+      bytes: await directorySize(stagingDir),
+      createdAt: new Date().toISOString()
+    }
+    // meta.json is written last: an entry without it is never served
+    await writeFile(path.join(stagingDir, 'meta.json'), JSON.stringify(meta))
+    await rm(entryDir, { recursive: true, force: true })
+    await rename(stagingDir, entryDir)
+    await pruneResultCache()
+  } catch (error) {
+    console.error('Failed to store result in cache:', error)
+    await rm(stagingDir, { recursive: true, force: true }).catch(() => undefined)
+  }
+}
+
+async function listEntries(): Promise<Array<CacheEntryMeta & { entryDir: string, lastAccess: number }>> {
+  let names: string[]
+  try {
+    names = await readdir(RESULT_CACHE_DIR)
+  } catch {
+    return []
+  }
+  const entries = []
+  for (const name of names) {
+    const entryDir = path.join(RESULT_CACHE_DIR, name)
+    const meta = await readMeta(entryDir)
+    if (!meta) continue
+    const lastAccess = (await stat(path.join(entryDir, 'meta.json'))).mtimeMs
+    entries.push({ ...meta, entryDir, lastAccess })
+  }
+  return entries
+}
+
+// Drop entries from other scoring versions, then the least recently used
+// ones until the cache fits its entry and size limits
+export async function pruneResultCache() {
+  const scoring = await getScoringConfig()
+  const entries = (await listEntries()).sort((a, b) => b.lastAccess - a.lastAccess)
+  let count = 0
+  let bytes = 0
+  for (const entry of entries) {
+    const fits = count < RESULT_CACHE_MAX_ENTRIES && bytes + entry.bytes <= RESULT_CACHE_MAX_BYTES
+    if (entry.scoringVersion === scoring.version && fits) {
+      count++
+      bytes += entry.bytes
+      continue
+    }
+    await rm(entry.entryDir, { recursive: true, force: true })
+  }
+}
+
+// Explicit invalidation, e.g. after adjusting scoring without a version bump
+export async function clearResultCache(): Promise<number> {
+  const entries = await listEntries()
+  await rm(RESULT_CACHE_DIR, { recursive: true, force: true })
+  return entries.length
+}
+
+export async function resultCacheStats(): Promise<ResultCacheStats> {
+  const scoring = await getScoringConfig()
+  const entries = await listEntries()
+  return {
+    entries: entries.length,
+    bytes: entries.reduce((total, entry) => total + entry.bytes, 0),
+    maxEntries: RESULT_CACHE_MAX_ENTRIES,
+    maxBytes: RESULT_CACHE_MAX_BYTES,
+    scoringVersion: scoring.version
+  }
+}
@@ -0,0 +1,125 @@
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+// Cohort retention written by python_backend/retention.py: cohort sizes and
+// active-user counts per (company, department, city) group. Counts are
+// additive, so a filter is answered by summing the matching groups and only
+// then dividing.
+
+export const RETENTION_DIMENSIONS = ['company', 'department', 'city'] as const
+export type RetentionDimension = typeof RETENTION_DIMENSIONS[number]
+
+// Python column headings -> API names
+const DIMENSION_COLUMNS: Record<string, RetentionDimension> = {
+  'Company': 'company',
+  'Department': 'department',
+  'City': 'city'
+}
+
+interface RetentionGroup {
+  values: string[]
+  // Cohort month -> users whose first appearance falls in it
+  sizes: Map<string, number>
+  // Cohort month -> active users by offset (months since the cohort month)
+  active: Map<string, number[]>
+}
+
+export interface RetentionData {
+  months: string[]
+  groups: RetentionGroup[]
+  dimensionValues: Record<RetentionDimension, string[]>
+}
+
+export interface CohortRetention {
+  cohort: string
+  users: number
+  // One entry per offset up to the last report month
+  activeUsers: number[]
+  retention: (number | null)[]
+}
+
+function decodeRetention(raw: any): RetentionData {
+  const months: string[] = raw.months
+  const groups = new Map<string, RetentionGroup>()
+  const distinct = RETENTION_DIMENSIONS.map(() => new Set<string>())
+
+  const groupFor = (columns: string[], row: any[]) => {
+    const values = RETENTION_DIMENSIONS.map(dimension =>
+      String(row[columns.findIndex(column => DIMENSION_COLUMNS[column] === dimension)])
+    )
+    const key = values.join('\u0001')
+    let group = groups.get(key)
+    if (!group) {
+      group = { values, sizes: new Map(), active: new Map() }
+      groups.set(key, group)
+      values.forEach((value, d) => distinct[d].add(value))
+    }
+    return group
+  }
+
+  const cohortColumns: string[] = raw.cohorts.columns
+  const cohortIndex = cohortColumns.indexOf('Cohort')
+  const usersIndex = cohortColumns.indexOf('Users')
+  for (const row of raw.cohorts.rows as any[][]) {
+    groupFor(cohortColumns, row).sizes.set(String(row[cohortIndex]), Number(row[usersIndex]))
+  }
+
+  const cellColumns: string[] = raw.cells.columns
+  const cellCohortIndex = cellColumns.indexOf('Cohort')
+  const offsetIndex = cellColumns.indexOf('Offset')
+  const activeIndex = cellColumns.indexOf('Active')
+  for (const row of raw.cells.rows as any[][]) {
+    const group = groupFor(cellColumns, row)
+    const cohort = String(row[cellCohortIndex])
+    const counts = group.active.get(cohort) ?? []
+    counts[Number(row[offsetIndex])] = Number(row[activeIndex])
+    group.active.set(cohort, counts)
+  }
+
+  const dimensionValues = {} as Record<RetentionDimension, string[]>
+  RETENTION_DIMENSIONS.forEach((dimension, d) => {
+    dimensionValues[dimension] = Array.from(distinct[d]).sort()
+  })
+  return { months, groups: Array.from(groups.values()), dimensionValues }
+}
+
+export function getRetention(sessionId: string, results: any): Promise<RetentionData | null> {
+  return loadSessionDataset(sessionId, results, 'retention', decodeRetention)
+}
+
+// The cohort triangle over the groups matching every filter (values within
+// one dimension are alternatives)
+export function queryRetention(
+  data: RetentionData,
+  filters: Partial<Record<RetentionDimension, string[]>>
+): CohortRetention[] {
+  const allowed = RETENTION_DIMENSIONS.map(dimension =>
+    filters[dimension]?.length ? new Set(filters[dimension]) : null
+  )
+  const sizes = new Map<string, number>()
+  const active = new Map<string, number[]>()
+  for (const group of data.groups) {
+    if (!group.values.every((value, d) => !allowed[d] || allowed[d]!.has(value))) continue
+    group.sizes.forEach((users, cohort) => sizes.set(cohort, (sizes.get(cohort) ?? 0) + users))
+    group.active.forEach((counts, cohort) => {
+      const totals = active.get(cohort) ?? []
+      counts.forEach((count, offset) => { totals[offset] = (totals[offset] ?? 0) + (count ?? 0) })
+      active.set(cohort, totals)
+    })
+  }
+
+  return data.months
+    .map((cohort, position) => ({ cohort, position, users: sizes.get(cohort) ?? 0 }))
+    .filter(({ users }) => users > 0)
+    .map(({ cohort, position, users }) => {
+      // Offsets past the last report month are not observed yet
+      const observed = data.months.length - position
+      const counts = active.get(cohort) ?? []
+      const activeUsers = Array.from({ length: observed }, (_, offset) => counts[offset] ?? 0)
+      return {
+        cohort,
+        users,
+        activeUsers,
+        retention: activeUsers.map(count => Math.round((count / users) * 10000) / 10000)
+      }
+    })
+}
@@ -0,0 +1,59 @@
+import { readFile } from 'fs/promises'
+import { sessionManager } from '@/lib/session-manager'
+
+// Heavy per-session data (indexes, aggregates) is written by the analyzer as
+// side files listed under `results.datasets` rather than inlined in the
+// session JSON. Decoded datasets are cached here, bounded and dropped when
+// their session is evicted.
+
+const DATASET_CACHE_ENTRIES = Number(process.env.SESSION_DATASET_CACHE_SIZE || 16)
+
+const globalForDatasets = globalThis as unknown as {
+  sessionDatasets: Map<string, Promise<any>> | undefined
+}
+
+const cache = globalForDatasets.sessionDatasets ?? new Map<string, Promise<any>>()
+if (!globalForDatasets.sessionDatasets) {
+  globalForDatasets.sessionDatasets = cache
+  sessionManager.onEvict(sessionId => {
+    for (const key of Array.from(cache.keys())) {
+      if (key.startsWith(`${sessionId}:`)) cache.delete(key)
+    }
+  })
+}
+
+// Load and decode `results.datasets[name]`, or fall back to `build` for
+// sessions produced before the dataset existed. Resolves with null when
+// neither is available.
+export function loadSessionDataset<T>(
+  sessionId: string,
+  results: any,
+  name: string,
+  decode: (raw: any) => T | Promise<T>,
+  build?: () => T | null
+): Promise<T | null> {
+  const key = `${sessionId}:${name}`
+  let pending = cache.get(key)
+  if (pending) {
+    // Refresh recency
+    cache.delete(key)
+  } else {
+    pending = (async () => {
+      const datasetPath = results?.datasets?.[name]
+      if (datasetPath) {
+        try {
+          return await decode(JSON.parse(await readFile(datasetPath, 'utf-8')))
+        } catch (error) {
+          console.error(`Failed to load dataset ${name} for session ${sessionId}:`, error)
+        }
+      }
+      return build ? build() : null
+    })()
+    pending.catch(() => cache.delete(key))
+  }
+  cache.set(key, pending)
+  while (cache.size > DATASET_CACHE_ENTRIES) {
+    cache.delete(cache.keys().next().value as string)
+  }
+  return pending
+}
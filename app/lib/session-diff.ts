@@ -0,0 +1,237 @@
+import { readFile } from 'fs/promises'
+import path from 'path'
+import { analysisResults } from '@/lib/analysis-store'
+import { sessionManager } from '@/lib/session-manager'
+import { TEMP_ROOT } from '@/lib/temp-root'
+
+// Classification changes between two analyses, joined on email. Each side is
+// loaded from the compact columnar `user_results.json` the analyzer writes,
+// so even 100k-user sessions never need their full result JSON parsed.
+
+export type ChangeKind = 'added' | 'removed' | 'changed' | 'unchanged'
+
+export interface UserChange {
+  email: string
+  change: ChangeKind
+  fromClassification: string | null
+  toClassification: string | null
+  engagementBefore: number | null
+  engagementAfter: number | null
+  engagementDelta: number | null
+  consistencyDelta: number | null
+  justificationBefore: string | null
+  justificationAfter: string | null
+  justificationChanged: boolean
+}
+
+export interface Transition {
+  from: string | null
+  to: string | null
+  count: number
+}
+
+export interface SessionDiff {
+  summary: {
+    baseUsers: number
+    compareUsers: number
+    added: number
+    removed: number
+    changed: number
+    unchanged: number
+    justificationChanged: number
+    transitions: Transition[]
+  }
+  rows: UserChange[]
+}
+
+export interface DiffQuery {
+  changes?: ChangeKind[]
+  from?: string
+  to?: string
+  sort?: 'email' | 'engagementDelta'
+  offset: number
+  limit: number
+}
+
+interface UserResults {
+  emails: string[]
+  classification: (string | null)[]
+  justification: (string | null)[]
+  engagementScore: number[]
+  consistencyPercent: number[]
+}
+
+const SESSION_ID_PATTERN = /^[A-Za-z0-9_-]+$/
+const DIFF_CACHE_ENTRIES = 4
+
+function decodeUserResults(raw: any): UserResults {
+  return {
+    emails: raw.emails,
+    classification: raw.classification.map((code: number) => raw.classifications[code]),
+    justification: raw.justification.map((code: number) => raw.justifications[code]),
+    engagementScore: raw.engagementScore,
+    consistencyPercent: raw.consistencyPercent
+  }
+}
+
+// Sessions analyzed before the compact file existed fall back to detailed_users
+async function loadUserResults(sessionId: string): Promise<UserResults | null> {
+  if (!SESSION_ID_PATTERN.test(sessionId)) return null
+  const compactPath = path.join(TEMP_ROOT, sessionId, 'output', 'user_results.json')
+  try {
+    const raw = JSON.parse(await readFile(compactPath, 'utf-8'))
+    await sessionManager.start()
+    sessionManager.touch(sessionId)
+    return decodeUserResults(raw)
+  } catch {
+    const results = await analysisResults.get(sessionId)
+    if (!results?.detailed_users) return null
+    const users: any[] = results.detailed_users
+    return {
+      emails: users.map(user => user.email),
+      classification: users.map(user => user.classification ?? null),
+      justification: users.map(user => user.justification ?? null),
+      engagementScore: users.map(user => user.engagementScore),
+      consistencyPercent: users.map(user => user.consistencyPercent)
+    }
+  }
+}
+
+const round = (value: number) => Math.round(value * 10000) / 10000
+
+export function diffUserResults(base: UserResults, compare: UserResults): SessionDiff {
+  // Hash-join: index the base side by email, then probe with the other side
+  const baseIndex = new Map<string, number>()
+  base.emails.forEach((email, i) => baseIndex.set(email, i))
+  const matched = new Uint8Array(base.emails.length)
+
+  const rows: UserChange[] = []
+  const transitions = new Map<string, Transition>()
+  const counts = { added: 0, removed: 0, changed: 0, unchanged: 0, justificationChanged: 0 }
+
+  const record = (row: UserChange) => {
+    rows.push(row)
+    counts[row.change]++
+    if (row.justificationChanged) counts.justificationChanged++
+    if (row.change !== 'unchanged') {
+      const key = `${row.fromClassification}\u0001${row.toClassification}`
+      const transition = transitions.get(key)
+      if (transition) transition.count++
+      else transitions.set(key, { from: row.fromClassification, to: row.toClassification, count: 1 })
+    }
+  }
+
+  compare.emails.forEach((email, j) => {
+    const i = baseIndex.get(email)
+    if (i === undefined) {
+      record({
+        email,
+        change: 'added',
+        fromClassification: null,
+        toClassification: compare.classification[j],
+        engagementBefore: null,
+        engagementAfter: compare.engagementScore[j],
+        engagementDelta: null,
+        consistencyDelta: null,
+        justificationBefore: null,
+        justificationAfter: compare.justification[j],
+        justificationChanged: false
+      })
+      return
+    }
+    matched[i] = 1
+    record({
+      email,
+      change: base.classification[i] === compare.classification[j] ? 'unchanged' : 'changed',
+      fromClassification: base.classification[i],
+      toClassification: compare.classification[j],
+      engagementBefore: base.engagementScore[i],
+      engagementAfter: compare.engagementScore[j],
+      engagementDelta: round(compare.engagementScore[j] - base.engagementScore[i]),
+      consistencyDelta: round(compare.consistencyPercent[j] - base.consistencyPercent[i]),
+      justificationBefore: base.justification[i],
+      justificationAfter: compare.justification[j],
+      justificationChanged: base.justification[i] !== compare.justification[j]
+    })
+  })
+
+  base.emails.forEach((email, i) => {
+    if (matched[i]) return
+    record({
+      email,
+      change: 'removed',
+      fromClassification: base.classification[i],
+      toClassification: null,
+      engagementBefore: base.engagementScore[i],
+      engagementAfter: null,
+      engagementDelta: null,
+      consistencyDelta: null,
+      justificationBefore: base.justification[i],
+      justificationAfter: null,
+      justificationChanged: false
+    })
+  })
+
+  rows.sort((a, b) => (a.email < b.email ? -1 : a.email > b.email ? 1 : 0))
+  return {
+    summary: {
+      baseUsers: base.emails.length,
+      compareUsers: compare.emails.length,
+      ...counts,
+      transitions: Array.from(transitions.values()).sort((a, b) => b.count - a.count)
+    },
+    rows
+  }
+}
+
+const globalForDiffs = globalThis as unknown as {
+  sessionDiffs: Map<string, Promise<SessionDiff | null>> | undefined
+}
+
+// Recent diffs are kept so paging through one does not redo the join
+const diffCache = globalForDiffs.sessionDiffs ?? new Map<string, Promise<SessionDiff | null>>()
+if (!globalForDiffs.sessionDiffs) {
+  globalForDiffs.sessionDiffs = diffCache
+  sessionManager.onEvict(sessionId => {
+    for (const key of Array.from(diffCache.keys())) {
+      if (key.split('\u0001').includes(sessionId)) diffCache.delete(key)
+    }
+  })
+}
+
+// Resolves with null when either session is unknown
+export function diffSessions(baseSessionId: string, compareSessionId: string): Promise<SessionDiff | null> {
+  const key = `${baseSessionId}\u0001${compareSessionId}`
+  let pending = diffCache.get(key)
+  if (pending) {
+    diffCache.delete(key)
+  } else {
+    pending = Promise.all([loadUserResults(baseSessionId), loadUserResults(compareSessionId)])
+      .then(([base, compare]) => (base && compare ? diffUserResults(base, compare) : null))
+    pending.then(diff => { if (!diff) diffCache.delete(key) }, () => diffCache.delete(key))
+  }
+  diffCache.set(key, pending)
+  while (diffCache.size > DIFF_CACHE_ENTRIES) {
+    diffCache.delete(diffCache.keys().next().value as string)
+  }
+  return pending
+}
+
+export function pageDiff(diff: SessionDiff, query: DiffQuery): { total: number, rows: UserChange[] } {
+  let rows = diff.rows
+  if (query.changes?.length || query.from || query.to) {
+    const changes = query.changes?.length ? new Set(query.changes) : null
+    rows = rows.filter(row =>
+      (!changes || changes.has(row.change)) &&
+      (!query.from || row.fromClassification === query.from) &&
+      (!query.to || row.toClassification === query.to)
+    )
+  }
+  if (query.sort === 'engagementDelta') {
+    rows = [...rows].sort((a, b) => Math.abs(b.engagementDelta ?? 0) - Math.abs(a.engagementDelta ?? 0))
+  }
+  return {
+    total: rows.length,
+    rows: rows.slice(query.offset, query.offset + query.limit)
+  }
+}
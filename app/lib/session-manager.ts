@@ -0,0 +1,213 @@
+import { mkdir, readdir, readFile, rename, rm, stat, unlink, writeFile } from 'fs/promises'
+import path from 'path'
+import { TEMP_ROOT } from '@/lib/temp-root'
+
+// Lifecycle of per-session state under temp/: the upload/output directory
+// temp/<sessionId> and the stored result temp/sessions/<sessionId>.json.
+// A persisted index records when each session was created, last read and how
+// much disk it holds, so one background sweeper can expire idle sessions and
+// keep temp/ under a disk quota without walking the tree on every request.
+
+export interface SessionRecord {
+  sessionId: string
+  createdAt: number
+  lastAccess: number
+  bytes: number
+}
+
+const SESSIONS_DIR = path.join(TEMP_ROOT, 'sessions')
+const INDEX_PATH = path.join(TEMP_ROOT, 'sessions-index.json')
+
+const SESSION_TTL_MS = Number(process.env.SESSION_TTL_MINUTES || 30) * 60 * 1000
+const SESSION_DISK_QUOTA_BYTES = Number(process.env.SESSION_DISK_QUOTA_MB || 2048) * 1024 * 1024
+const SWEEP_INTERVAL_MS = 60 * 1000
+// Access-time updates are batched rather than rewriting the index per read
+const INDEX_FLUSH_DELAY_MS = 5000
+
+// Shared caches living next to session directories in temp/
+const RESERVED_DIRS = new Set(['sessions', 'parse-cache', 'result-cache', 'target-cache', 'history'])
+
+async function directorySize(dirPath: string): Promise<number> {
+  let total = 0
+  let entries
+  try {
+    entries = await readdir(dirPath, { withFileTypes: true })
+  } catch {
+    return 0
+  }
+  for (const entry of entries) {
+    const entryPath = path.join(dirPath, entry.name)
+    if (entry.isDirectory()) {
+      total += await directorySize(entryPath)
+    } else {
+      total += await stat(entryPath).then(s => s.size, () => 0)
+    }
+  }
+  return total
+}
+
+async function fileSize(filePath: string): Promise<number> {
+  return stat(filePath).then(s => s.size, () => 0)
+}
+
+class SessionManager {
+  private records = new Map<string, SessionRecord>()
+  // Sessions with a job still writing to them; never evicted
+  private pinned = new Set<string>()
+  private evictListeners: ((sessionId: string) => void)[] = []
+  private started: Promise<void> | null = null
+  private flushTimer: NodeJS.Timeout | null = null
+  private pendingWrite: Promise<void> = Promise.resolve()
+
+  // Load the index, adopt orphans and start the sweeper. Safe to call often.
+  start(): Promise<void> {
+    if (!this.started) {
+      this.started = this.recover().then(() => {
+        const sweeper = setInterval(() => {
+          this.sweep().catch(error => console.error('Session sweep failed:', error))
+        }, SWEEP_INTERVAL_MS)
+        sweeper.unref()
+      })
+    }
+    return this.started
+  }
+
+  onEvict(listener: (sessionId: string) => void) {
+    this.evictListeners.push(listener)
+  }
+
+  // Create or refresh a session's record and re-measure its disk usage
+  async track(sessionId: string, options: { pinned?: boolean } = {}) {
+    await this.start()
+    const now = Date.now()
+    const existing = this.records.get(sessionId)
+    if (options.pinned !== undefined) {
+      options.pinned ? this.pinned.add(sessionId) : this.pinned.delete(sessionId)
+    }
+    this.records.set(sessionId, {
+      sessionId,
+      createdAt: existing?.createdAt ?? now,
+      lastAccess: now,
+      bytes: await this.measure(sessionId)
+    })
+    await this.persist()
+  }
+
+  touch(sessionId: string) {
+    const record = this.records.get(sessionId)
+    if (!record) return
+    record.lastAccess = Date.now()
+    this.scheduleFlush()
+  }
+
+  async remove(sessionId: string) {
+    this.records.delete(sessionId)
+    this.pinned.delete(sessionId)
+    await rm(path.join(TEMP_ROOT, sessionId), { recursive: true, force: true })
+    await unlink(path.join(SESSIONS_DIR, `${sessionId}.json`)).catch(() => undefined)
+    this.evictListeners.forEach(listener => listener(sessionId))
+    await this.persist()
+    console.log(`Session ${sessionId} removed`)
+  }
+
+  list(): SessionRecord[] {
+    return Array.from(this.records.values())
+  }
+
+  // Expire idle sessions, then evict least recently used ones until the
+  // total footprint fits the disk quota
+  async sweep() {
+    const now = Date.now()
+    const candidates = this.list()
+      .filter(record => !this.pinned.has(record.sessionId))
+      .sort((a, b) => a.lastAccess - b.lastAccess)
+
+    let totalBytes = this.list().reduce((total, record) => total + record.bytes, 0)
+    for (const record of candidates) {
+      const expired = now - record.lastAccess > SESSION_TTL_MS
+      if (!expired && totalBytes <= SESSION_DISK_QUOTA_BYTES) break
+      totalBytes -= record.bytes
+      await this.remove(record.sessionId).catch(error => {
+        console.error(`Failed to remove session ${record.sessionId}:`, error)
+      })
+    }
+  }
+
+  private async measure(sessionId: string): Promise<number> {
+    return (await directorySize(path.join(TEMP_ROOT, sessionId))) +
+      (await fileSize(path.join(SESSIONS_DIR, `${sessionId}.json`)))
+  }
+
+  // One-time start-up reconciliation: read the index, drop entries whose
+  // files are gone and adopt directories left behind by a previous process
+  private async recover() {
+    await mkdir(SESSIONS_DIR, { recursive: true })
+    try {
+      const saved: SessionRecord[] = JSON.parse(await readFile(INDEX_PATH, 'utf-8'))
+      saved.forEach(record => this.records.set(record.sessionId, record))
+    } catch {
+      // No index yet, or an unreadable one; rebuilt from disk below
+    }
+
+    const onDisk = new Map<string, number>()
+    for (const entry of await readdir(TEMP_ROOT, { withFileTypes: true })) {
+      if (entry.isDirectory() && !RESERVED_DIRS.has(entry.name)) {
+        onDisk.set(entry.name, (await stat(path.join(TEMP_ROOT, entry.name))).mtimeMs)
+      }
+    }
+    for (const file of await readdir(SESSIONS_DIR)) {
+      if (file.endsWith('.json')) {
+        const sessionId = file.slice(0, -'.json'.length)
+        const mtime = (await stat(path.join(SESSIONS_DIR, file))).mtimeMs
+        onDisk.set(sessionId, Math.max(onDisk.get(sessionId) ?? 0, mtime))
+      }
+    }
+
+    for (const sessionId of Array.from(this.records.keys())) {
+      if (!onDisk.has(sessionId)) this.records.delete(sessionId)
+    }
+    let adopted = 0
+    for (const [sessionId, mtime] of Array.from(onDisk)) {
+      if (this.records.has(sessionId)) continue
+      this.records.set(sessionId, {
+        sessionId,
+        createdAt: mtime,
+        lastAccess: mtime,
+        bytes: await this.measure(sessionId)
+      })
+      adopted++
+    }
+    if (adopted > 0) {
+      console.log(`Recovered ${adopted} orphaned session(s) from ${TEMP_ROOT}`)
+    }
+    await this.persist()
+  }
+
+  private scheduleFlush() {
+    if (this.flushTimer) return
+    this.flushTimer = setTimeout(() => {
+      this.flushTimer = null
+      this.persist().catch(error => console.error('Failed to write session index:', error))
+    }, INDEX_FLUSH_DELAY_MS)
+    this.flushTimer.unref()
+  }
+
+  // Writes are chained so concurrent callers never interleave on the temp file
+  private persist(): Promise<void> {
+    const write = async () => {
+      const tmpPath = `${INDEX_PATH}.${process.pid}.tmp`
+      await writeFile(tmpPath, JSON.stringify(this.list()))
+      await rename(tmpPath, INDEX_PATH)
+    }
+    this.pendingWrite = this.pendingWrite.then(write, write)
+    return this.pendingWrite
+  }
+}
+
+const globalForSessions = globalThis as unknown as {
+  sessionManager: SessionManager | undefined
+}
+
+// Route handlers are bundled separately, so the manager lives on globalThis
+export const sessionManager = globalForSessions.sessionManager ?? new SessionManager()
+globalForSessions.sessionManager = sessionManager
@@ -0,0 +1,98 @@
+import { mkdir, readdir, readFile, rename, stat, unlink, utimes, writeFile } from 'fs/promises'
+import path from 'path'
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+import { TEMP_ROOT } from '@/lib/temp-root'
+
+// Filter picker options for a target user file, computed once per file
+// content. The analyzer reads the file's dimension columns as categoricals and
+// counts users per company, department, city and manager; the result is kept
+// under the file's sha256 so uploading the same directory again never parses it.
+
+// Bump whenever the layout printed by `copilot_analyzer.py --filter-options` changes
+const TARGET_OPTIONS_VERSION = 1
+export const TARGET_CACHE_DIR = path.join(TEMP_ROOT, 'target-cache')
+const TARGET_CACHE_MAX_ENTRIES = Number(process.env.TARGET_CACHE_MAX_ENTRIES || 64)
+
+export interface FilterOption {
+  value: string
+  count: number
+}
+
+export interface TargetFilterOptions {
+  sha256: string
+  users: number
+  companies: FilterOption[]
+  departments: FilterOption[]
+  locations: FilterOption[]
+  managers: FilterOption[]
+}
+
+// Computations shared across concurrent uploads of the same file
+const inFlight = new Map<string, Promise<TargetFilterOptions>>()
+
+function cachePath(sha256: string): string {
+  return path.join(TARGET_CACHE_DIR, `${sha256}.v${TARGET_OPTIONS_VERSION}.json`)
+}
+
+export function isContentHash(value: string | null): value is string {
+  return !!value && /^[0-9a-f]{64}$/.test(value)
+}
+
+// Cached options for a file hash, or null when that file was never uploaded
+export async function cachedFilterOptions(sha256: string): Promise<TargetFilterOptions | null> {
+  const filePath = cachePath(sha256)
+  try {
+    const options = JSON.parse(await readFile(filePath, 'utf-8'))
+    const now = new Date()
+    await utimes(filePath, now, now).catch(() => undefined)
+    return options
+  } catch {
+    return null
+  }
+}
+
+// Keep the cache bounded, evicting the least recently used entries
+async function pruneTargetCache() {
+  try {
+    const entries = await Promise.all(
+      (await readdir(TARGET_CACHE_DIR))
+        .filter(entry => entry.endsWith('.json'))
+        .map(async entry => {
+          const fullPath = path.join(TARGET_CACHE_DIR, entry)
+          return { fullPath, mtime: (await stat(fullPath)).mtimeMs }
+        })
+    )
+    entries.sort((a, b) => b.mtime - a.mtime)
+    for (const { fullPath } of entries.slice(TARGET_CACHE_MAX_ENTRIES)) {
+      await unlink(fullPath).catch(() => undefined)
+    }
+  } catch (error) {
+    console.error('Target cache pruning failed:', error)
+  }
+}
+
+async function compute(sha256: string, targetPath: string): Promise<TargetFilterOptions> {
+  const { status, version, ...counts } = parseAnalyzerOutput(
+    await runAnalyzerScript(['--filter-options', targetPath])
+  )
+  const options: TargetFilterOptions = { sha256, ...counts }
+  await mkdir(TARGET_CACHE_DIR, { recursive: true })
+  const staging = `${cachePath(sha256)}.${process.pid}.tmp`
+  await writeFile(staging, JSON.stringify(options))
+  await rename(staging, cachePath(sha256))
+  await pruneTargetCache()
+  return options
+}
+
+// Options for an uploaded target file, from the cache when its content was seen before
+export async function filterOptionsFor(sha256: string, targetPath: string): Promise<TargetFilterOptions> {
+  const cached = await cachedFilterOptions(sha256)
+  if (cached) return cached
+
+  let pending = inFlight.get(sha256)
+  if (!pending) {
+    pending = compute(sha256, targetPath).finally(() => inFlight.delete(sha256))
+    inFlight.set(sha256, pending)
+  }
+  return pending
+}
@@ -0,0 +1,8 @@
+import path from 'path'
+
+// Root of the app's runtime state: session directories, stored results and
+// the shared caches. APP_TEMP_DIR moves it elsewhere (e.g. a throwaway
+// directory for load tests); the analyzer honours the same variable.
+export const TEMP_ROOT = process.env.APP_TEMP_DIR
+  ? path.resolve(process.env.APP_TEMP_DIR)
+  : path.join(process.cwd(), 'temp')
@@ -0,0 +1,129 @@
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+// Per-user tool bitmasks: bit `t` of a user's mask is set when the user ever
+// used tool `t`. Users are identified by dense ids (their position in
+// `detailed_users`), so cohort statistics reduce to hashed id lookups and
+// popcounts over a flat Uint32Array.
+
+export interface ToolIndex {
+  tools: string[]
+  // 32-bit words per user
+  words: number
+  masks: Uint32Array
+  idByEmail: Map<string, number>
+}
+
+export interface CohortComparison {
+  averageEngagement: number
+  totalToolsUsed: number
+  commonTools: string[]
+  trendAnalysis: { increasing: number, stable: number, decreasing: number }
+  riskDistribution: { low: number, medium: number, high: number }
+}
+
+function popcount32(value: number): number {
+  value = value - ((value >>> 1) & 0x55555555)
+  value = (value & 0x33333333) + ((value >>> 2) & 0x33333333)
+  return (((value + (value >>> 4)) & 0x0f0f0f0f) * 0x01010101) >>> 24
+}
+
+function indexEmails(emails: string[]): Map<string, number> {
+  const idByEmail = new Map<string, number>()
+  emails.forEach((email, id) => {
+    if (!idByEmail.has(email)) idByEmail.set(email, id)
+  })
+  return idByEmail
+}
+
+function decodeToolIndex(raw: any): ToolIndex {
+  return {
+    tools: raw.tools,
+    words: raw.words,
+    masks: Uint32Array.from(raw.masks),
+    idByEmail: indexEmails(raw.emails)
+  }
+}
+
+// Sessions analyzed before the index existed only carry toolsUsed arrays
+function buildToolIndex(users: any[]): ToolIndex {
+  const bitByTool = new Map<string, number>()
+  users.forEach(user => (user.toolsUsed || []).forEach((tool: string) => {
+    if (!bitByTool.has(tool)) bitByTool.set(tool, bitByTool.size)
+  }))
+  const words = Math.max(1, Math.ceil(bitByTool.size / 32))
+  const masks = new Uint32Array(users.length * words)
+  users.forEach((user, id) => (user.toolsUsed || []).forEach((tool: string) => {
+    const bit = bitByTool.get(tool) as number
+    masks[id * words + (bit >>> 5)] |= 1 << (bit & 31)
+  }))
+  return {
+    tools: Array.from(bitByTool.keys()),
+    words,
+    masks,
+    idByEmail: indexEmails(users.map(user => user.email))
+  }
+}
+
+export function getToolIndex(sessionId: string, results: any): Promise<ToolIndex | null> {
+  return loadSessionDataset(
+    sessionId,
+    results,
+    'toolIndex',
+    decodeToolIndex,
+    () => results?.detailed_users ? buildToolIndex(results.detailed_users) : null
+  )
+}
+
+export function compareCohort(index: ToolIndex, users: any[], selectedEmails: string[]): CohortComparison {
+  const comparison: CohortComparison = {
+    averageEngagement: 0,
+    totalToolsUsed: 0,
+    commonTools: [],
+    trendAnalysis: { increasing: 0, stable: 0, decreasing: 0 },
+    riskDistribution: { low: 0, medium: 0, high: 0 }
+  }
+
+  const ids = new Set<number>()
+  for (const email of selectedEmails) {
+    const id = index.idByEmail.get(email)
+    if (id !== undefined) ids.add(id)
+  }
+  if (ids.size === 0) return comparison
+
+  const { words, masks } = index
+  const union = new Uint32Array(words)
+  const toolCounts = new Uint32Array(index.tools.length)
+  let engagementTotal = 0
+
+  ids.forEach(id => {
+    const offset = id * words
+    for (let word = 0; word < words; word++) {
+      let bits = masks[offset + word]
+      union[word] |= bits
+      // Visit set bits only
+      while (bits !== 0) {
+        const lowest = bits & -bits
+        toolCounts[(word << 5) + 31 - Math.clz32(lowest)]++
+        bits ^= lowest
+      }
+    }
+
+    const user = users[id]
+    engagementTotal += user.engagementScore || 0
+    const trend = (user.trend || 'N/A').toLowerCase()
+    if (trend === 'increasing') comparison.trendAnalysis.increasing++
+    else if (trend === 'stable') comparison.trendAnalysis.stable++
+    else if (trend === 'decreasing') comparison.trendAnalysis.decreasing++
+    const risk = (user.riskLevel || 'low').toLowerCase()
+    if (risk === 'low') comparison.riskDistribution.low++
+    else if (risk === 'medium') comparison.riskDistribution.medium++
+    else if (risk === 'high') comparison.riskDistribution.high++
+  })
+
+  // Tools used by at least 50% of the selected users
+  const threshold = Math.max(1, Math.floor(ids.size * 0.5))
+  comparison.commonTools = index.tools.filter((_, bit) => toolCounts[bit] >= threshold)
+  comparison.totalToolsUsed = union.reduce((total, word) => total + popcount32(word), 0)
+  comparison.averageEngagement = Math.round((engagementTotal / ids.size) * 100) / 100
+  return comparison
+}
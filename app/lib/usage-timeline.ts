@@ -0,0 +1,106 @@
+import { createHash } from 'crypto'
+import { open, readFile } from 'fs/promises'
+import path from 'path'
+import { loadSessionDataset } from '@/lib/session-datasets'
+
+// Per-user report timeline served from the analyzer's usage index (see
+// python_backend/usage_index.py). The index table is cached per session;
+// each lookup binary-searches it and reads one contiguous block of the
+// data file, so the raw usage rows are never scanned.
+
+const ENTRY_BYTES = 24
+const HASH_BYTES = 8
+const NO_ACTIVITY = -1
+const DAY_MS = 24 * 60 * 60 * 1000
+
+export interface UsageTimelineIndex {
+  tools: string[]
+  dataPath: string
+  entries: Buffer
+}
+
+export interface TimelineReport {
+  reportDate: string
+  complexity: number
+  tools: Array<{ tool: string, lastActivity: string }>
+}
+
+export interface UserTimeline {
+  email: string
+  // Newest report first, as in the desktop deep dive
+  reports: TimelineReport[]
+  // Tools used per report date, oldest first, for charting
+  complexity: Array<{ reportDate: string, complexity: number }>
+}
+
+export function getUsageTimelineIndex(sessionId: string, results: any): Promise<UsageTimelineIndex | null> {
+  const datasetPath = results?.datasets?.usageTimeline
+  return loadSessionDataset(sessionId, results, 'usageTimeline', async raw => {
+    const directory = path.dirname(datasetPath)
+    return {
+      tools: raw.tools,
+      dataPath: path.join(directory, raw.data),
+      entries: await readFile(path.join(directory, raw.index))
+    }
+  })
+}
+
+const formatDay = (day: number) => new Date(day * DAY_MS).toISOString().slice(0, 10)
+
+function decodeBlock(index: UsageTimelineIndex, block: Buffer, rows: number): UserTimeline {
+  const emailLength = block.readUInt16LE(0)
+  const email = block.toString('utf-8', 2, 2 + emailLength)
+  const columns = 1 + index.tools.length
+  const reports: TimelineReport[] = []
+  const complexityByDate = new Map<string, number>()
+
+  for (let row = 0; row < rows; row++) {
+    const base = 2 + emailLength + row * columns * 4
+    const reportDate = formatDay(block.readInt32LE(base))
+    const tools: TimelineReport['tools'] = []
+    for (let column = 1; column < columns; column++) {
+      const day = block.readInt32LE(base + column * 4)
+      if (day !== NO_ACTIVITY) tools.push({ tool: index.tools[column - 1], lastActivity: formatDay(day) })
+    }
+    reports.push({ reportDate, complexity: tools.length, tools })
+    complexityByDate.set(reportDate, (complexityByDate.get(reportDate) || 0) + tools.length)
+  }
+
+  return {
+    email,
+    reports: reports.reverse(),
+    complexity: Array.from(complexityByDate, ([reportDate, complexity]) => ({ reportDate, complexity }))
+  }
+}
+
+// Resolves with null when the user has no rows in the index
+export async function readUserTimeline(index: UsageTimelineIndex, email: string): Promise<UserTimeline | null> {
+  const target = createHash('sha1').update(email).digest().subarray(0, HASH_BYTES)
+  const { entries } = index
+
+  // Lower bound of the target hash
+  let low = 0
+  let high = entries.length / ENTRY_BYTES
+  while (low < high) {
+    const middle = (low + high) >>> 1
+    const offset = middle * ENTRY_BYTES
+    if (entries.compare(target, 0, HASH_BYTES, offset, offset + HASH_BYTES) < 0) low = middle + 1
+    else high = middle
+  }
+
+  const file = await open(index.dataPath, 'r')
+  try {
+    // Entries sharing the hash are checked against the email in their block
+    for (let offset = low * ENTRY_BYTES; offset < entries.length; offset += ENTRY_BYTES) {
+      if (entries.compare(target, 0, HASH_BYTES, offset, offset + HASH_BYTES) !== 0) break
+      const length = entries.readUInt32LE(offset + 16)
+      const block = Buffer.alloc(length)
+      await file.read(block, 0, length, Number(entries.readBigUInt64LE(offset + 8)))
+      const timeline = decodeBlock(index, block, entries.readUInt32LE(offset + 20))
+      if (timeline.email === email) return timeline
+    }
+    return null
+  } finally {
+    await file.close()
+  }
+}
@@ -0,0 +1,38 @@
+import { access } from 'fs/promises'
+import path from 'path'
+import { analysisResults } from '@/lib/analysis-store'
+import { runAnalyzerScript, parseAnalyzerOutput } from '@/lib/python-runner'
+
+// The executive Word report is built on first download from the session's
+// stored results and kept next to its other reports, so later downloads are
+// served from disk
+const WORD_REPORT_FILENAME = 'executive_summary.docx'
+
+// Builds shared across concurrent downloads of the same session
+const inFlight = new Map<string, Promise<string>>()
+
+async function build(sessionId: string, outputPath: string): Promise<string> {
+  parseAnalyzerOutput(await runAnalyzerScript([
+    '--word-report', analysisResults.getSessionFilePath(sessionId),
+    '--word-output', outputPath
+  ]))
+  return outputPath
+}
+
+// Resolve with the session's Word report, generating it if needed
+export async function ensureWordReport(sessionId: string, result: any): Promise<string> {
+  const outputPath = path.join(path.dirname(result.files.excel), WORD_REPORT_FILENAME)
+  try {
+    await access(outputPath)
+    return outputPath
+  } catch {
+    // Not generated yet
+  }
+
+  let pending = inFlight.get(outputPath)
+  if (!pending) {
+    pending = build(sessionId, outputPath).finally(() => inFlight.delete(outputPath))
+    inFlight.set(outputPath, pending)
+  }
+  return pending
+}
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Materialized aggregate cube over the target-user dimensions.
+
+Cells are keyed by Company, Department, City, report month and
+classification, where ``'*'`` stands for "all values" of a dimension. Every
+combination of rolled-up dimensions is materialized, and cells carry
+additive sums and counts (plus the derived means), so any slice or further
+roll-up can be answered from the cube alone.
+
+Monthly cells measure each user's activity in that month (monthly_metrics,
+with the engagement score on the run's scale); whole-period cells (Month
+``'*'``) carry the run's per-user metrics. Classification is always the run's.
+"""
+from itertools import combinations
+
+import pandas as pd
+
+ALL = '*'
+UNKNOWN = '(Unknown)'
+DIMENSIONS = ['Company', 'Department', 'City', 'Month', 'Classification']
+# Dimensions that can be rolled up; Month is rolled up in the fact table itself
+ROLLUP_DIMENSIONS = ['Company', 'Department', 'City', 'Classification']
+
+# Additive measures. Per-user metrics (the month's own in monthly cells) are
+# summed over the users in a cell.
+SUM_MEASURES = [
+    'Users', 'Active Users', 'Tools Used',
+    'Engagement Score', 'Usage Consistency (%)', 'Usage Complexity', 'Avg Tools / Report'
+]
+# Mean name -> (numerator, denominator)
+MEAN_MEASURES = {
+    'Mean Engagement Score': ('Engagement Score', 'Users'),
+    'Mean Usage Consistency (%)': ('Usage Consistency (%)', 'Users'),
+    'Mean Usage Complexity': ('Usage Complexity', 'Users'),
+    'Mean Avg Tools / Report': ('Avg Tools / Report', 'Users'),
+    'Mean Tools per Active User': ('Tools Used', 'Active Users')
+}
+METRIC_COLUMNS = ['Engagement Score', 'Usage Consistency (%)', 'Usage Complexity', 'Avg Tools / Report']
+
+
+def _tool_activity(usage_df, tool_cols, months):
+    """One row per tool activity date inside ``months``: Email, Report, Tool and the activity Month"""
+    stacked = usage_df[tool_cols].stack().dropna()
+    rows = stacked.index.get_level_values(0)
+    activity = pd.DataFrame({
+        'Email': usage_df['User Principal Name'].to_numpy()[rows],
+        'Report': usage_df['Report Refresh Date'].to_numpy()[rows],
+        'Tool': stacked.index.get_level_values(1),
+        'Month': pd.to_datetime(stacked.to_numpy()).strftime('%Y-%m')
+    })
+    return activity[activity['Month'].isin(months)]
+
+
+def _monthly_rows(usage_df, activity):
+    reported = pd.DataFrame({
+        'Email': usage_df['User Principal Name'],
+        'Month': usage_df['Report Refresh Date'].dt.strftime('%Y-%m')
+    }).drop_duplicates()
+    tools = activity.groupby(['Email', 'Month'])['Tool'].nunique().rename('Tools Used').reset_index()
+
+    monthly = reported.merge(tools, on=['Email', 'Month'], how='outer')
+    monthly['Tools Used'] = monthly['Tools Used'].fillna(0).astype(int)
+    monthly['Active Users'] = (monthly['Tools Used'] > 0).astype(int)
+    return monthly
+
+
+def monthly_activity(usage_df, tool_cols, months):
+    """One row per (Email, Month) the user was reported or active in.
+
+    ``usage_df`` must have a default RangeIndex so stacked rows map back by position.
+    """
+    return _monthly_rows(usage_df, _tool_activity(usage_df, tool_cols, months))
+
+
+def monthly_metrics(usage_df, tool_cols, months):
+    """monthly_activity plus the per-user metrics computed from each month's own rows.
+
+    Each month is scored as a one-month period: consistency is 100 when the
+    user was active in it and 0 otherwise, complexity counts the distinct tools
+    used in it, and Avg Tools / Report averages the distinct tools over the
+    reports with activity in it.
+    """
+    activity = _tool_activity(usage_df, tool_cols, months)
+    monthly = _monthly_rows(usage_df, activity)
+    per_report = activity.groupby(['Email', 'Month', 'Report'])['Tool'].nunique()
+    avg_tools = per_report.groupby(level=['Email', 'Month']).mean().rename('Avg Tools / Report').reset_index()
+    monthly = monthly.merge(avg_tools, on=['Email', 'Month'], how='left')
+    monthly['Avg Tools / Report'] = monthly['Avg Tools / Report'].fillna(0.0)
+    monthly['Usage Consistency (%)'] = monthly['Active Users'] * 100.0
+    monthly['Usage Complexity'] = monthly['Tools Used']
+    return monthly
+
+
+def scaled_engagement(metrics, maxima):
+    """Engagement Score of ``metrics`` on the run's scale.
+
+    ``maxima`` holds the run's largest Usage Consistency (%), Usage Complexity
+    and Avg Tools / Report, which normalize the run-wide score; each part is
+    capped at 1 so a busy month cannot outscore the run's best user.
+    """
+    score = pd.Series(0.0, index=metrics.index)
+    for column in ['Usage Consistency (%)', 'Usage Complexity', 'Avg Tools / Report']:
+        if maxima[column] > 0:
+            score += (metrics[column] / maxima[column]).clip(upper=1)
+    return score
+
+
+def build_aggregate_cube(users, usage_parts, tool_cols, months):
+    """Build cube cells from per-user metrics and the raw usage rows.
+
+    ``users`` carries Email, Company, Department, City, Classification and the
+    run's per-user metric columns. ``usage_parts`` yields the usage rows of the
+    same users, with no user split across two parts, and ``months`` is the set
+    of 'YYYY-MM' report months.
+    """
+    users = users.copy()
+    for column in ['Company', 'Department', 'City', 'Classification']:
+        users[column] = users[column].fillna(UNKNOWN).astype(str)
+
+    overall_parts, monthly_parts = [], []
+    for usage_df in usage_parts:
+        usage_df = usage_df.reset_index(drop=True)
+        overall_parts.append(usage_df[tool_cols].notna().groupby(usage_df['User Principal Name']).any().sum(axis=1))
+        monthly_parts.append(monthly_metrics(usage_df, tool_cols, months))
+
+    # Whole-period facts: one row per user
+    overall_tools = pd.concat(overall_parts)
+    period_facts = users.assign(Month=ALL, Users=1)
+    period_facts['Tools Used'] = users['Email'].map(overall_tools).fillna(0).astype(int)
+    period_facts['Active Users'] = (period_facts['Tools Used'] > 0).astype(int)
+
+    # Monthly facts: one row per user and month, measured from that month alone
+    monthly = pd.concat(monthly_parts, ignore_index=True)
+    monthly['Engagement Score'] = scaled_engagement(monthly, users[METRIC_COLUMNS].max())
+    dimensions = users.drop(columns=METRIC_COLUMNS)
+    monthly_facts = monthly.merge(dimensions, on='Email', how='inner').assign(Users=1)
+
+    facts = pd.concat([period_facts, monthly_facts], ignore_index=True)
+    facts[METRIC_COLUMNS] = facts[METRIC_COLUMNS].fillna(0)
+
+    cells = []
+    for size in range(len(ROLLUP_DIMENSIONS) + 1):
+        for kept in combinations(ROLLUP_DIMENSIONS, size):
+            grouped = facts.groupby(list(kept) + ['Month'], sort=False)[SUM_MEASURES].sum().reset_index()
+            for column in ROLLUP_DIMENSIONS:
+                if column not in kept:
+                    grouped[column] = ALL
+            cells.append(grouped)
+
+    cube = pd.concat(cells, ignore_index=True)[DIMENSIONS + SUM_MEASURES]
+    for mean, (numerator, denominator) in MEAN_MEASURES.items():
+        cube[mean] = (cube[numerator] / cube[denominator].where(cube[denominator] > 0)).round(3)
+    return cube
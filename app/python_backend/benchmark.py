@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Benchmark the per-user metrics stage on synthetic usage reports.
+
+Times ``CopilotAnalyzer.analyze_users`` for each requested worker count (and
+optionally out of core) on the same generated data, checks that every mode
+classifies users identically, and reports the speedup over one worker:
+
+    python3 benchmark.py --users 200000 --months 12 --workers 1,2,4,8,16,32
+
+With ``--check-plan`` it instead writes the reports as CSV uploads and checks
+that the execution planner keeps a web run with the scheduler's default
+per-job budget (lib/job-scheduler.ts) in memory with several workers.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from copilot_analyzer import CopilotAnalyzer
+from execution_planner import plan_execution
+from out_of_core import PartitionedUsageStore
+
+TOOLS = ['Microsoft Teams Copilot', 'Word Copilot', 'Excel Copilot', 'PowerPoint Copilot',
+         'Outlook Copilot', 'OneNote Copilot', 'Loop Copilot', 'Copilot Chat']
+
+
+def synthetic_reports(users, months, activity_rate, seed):
+    """One normalized usage report per month, shaped like CopilotAnalyzer.normalize_usage_report output"""
+    rng = np.random.default_rng(seed)
+    emails = np.array([f"user{i}@bench.example" for i in range(users)], dtype=object)
+    # Per-user propensity, so the population spans all three classifications
+    propensity = rng.beta(0.8, 1.2, users) * activity_rate * 2
+    reports = []
+    for month in range(months):
+        report_date = pd.Timestamp('2024-01-28') + pd.DateOffset(months=month)
+        report = pd.DataFrame({'Report Refresh Date': report_date, 'User Principal Name': emails})
+        for tool in TOOLS:
+            active = rng.random(users) < propensity
+            days_ago = pd.to_timedelta(rng.integers(0, 30, users), unit='D')
+            report[f"Last activity date of {tool} (UTC)"] = (report_date - days_ago).where(active)
+        reports.append(report)
+    return reports
+
+
+def quiet_analyzer():
+    analyzer = CopilotAnalyzer()
+    analyzer.log = lambda message: None
+    analyzer.progress = lambda stage, **data: None
+    return analyzer
+
+
+def classifications(results):
+    return pd.concat(df[['Email', 'Classification']] for df in results).set_index('Email')['Classification'].sort_index()
+
+
+def run_mode(reports, workers=1, partitions=None):
+    analyzer = quiet_analyzer()
+    analyzer.workers = workers
+    if partitions:
+        spill_dir = tempfile.mkdtemp(prefix='benchmark-spill-')
+        analyzer.usage_store = PartitionedUsageStore(spill_dir, partitions)
+        for report in reports:
+            analyzer.usage_store.append(report)
+    else:
+        analyzer.full_usage_data = pd.concat(reports, ignore_index=True)
+    try:
+        started = time.perf_counter()
+        results = analyzer.analyze_users()
+        return time.perf_counter() - started, classifications(results)
+    finally:
+        if analyzer.usage_store is not None:
+            analyzer.usage_store.cleanup()
+
+
+def _env_number(name, fallback):
+    try:
+        value = float(os.environ.get(name, ''))
+    except ValueError:
+        return fallback
+    return value if math.isfinite(value) and value > 0 else fallback
+
+
+def web_defaults():
+    """Per-job memory budget (MB) and workers the web app plans with, as in lib/job-scheduler.ts"""
+    cpus = os.cpu_count() or 1
+    total_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 / 1024
+    max_jobs = _env_number('ANALYZER_MAX_CONCURRENT_JOBS', max(1, cpus // 2))
+    budget_mb = _env_number('ANALYZER_MEMORY_BUDGET_MB', math.floor(total_mb * 0.6))
+    workers = _env_number('ANALYZER_WORKERS_PER_JOB', max(1, math.floor(cpus / max_jobs)))
+    return _env_number('ANALYZER_OUT_OF_CORE_MB', budget_mb), int(workers)
+
+
+def check_plan(reports, worker_counts, partitions=64):
+    """Plan the reports as CSV uploads with the web defaults; returns the plans or raises SystemExit"""
+    budget_mb, default_workers = web_defaults()
+    upload_dir = tempfile.mkdtemp(prefix='benchmark-plan-')
+    try:
+        paths = []
+        for index, report in enumerate(reports):
+            path = os.path.join(upload_dir, f"usage_report_{index}.csv")
+            report.to_csv(path, index=False, date_format='%Y-%m-%d')
+            paths.append(path)
+        plans = []
+        # A single-worker default (small host) is checked with two workers instead
+        for workers in sorted({max(2, default_workers)} | {count for count in worker_counts if count > 1}):
+            plan = plan_execution(paths, budget_mb, workers, partitions)
+            if plan['strategy'] != 'in_memory' or plan['workers'] != workers:
+                raise SystemExit(f"workers={workers}: planned {plan['strategy']} with {plan['workers']} "
+                                 f"worker(s) within {budget_mb:g} MB")
+            # The scheduler reserves the estimated peak; the analyzer must fit it
+            reserved = math.ceil(plan['estimatedPeakMb'][plan['strategy']])
+            replanned = plan_execution(paths, reserved, workers, partitions)
+            if (replanned['strategy'], replanned['workers']) != (plan['strategy'], plan['workers']):
+                raise SystemExit(f"workers={workers}: {replanned['strategy']} within the {reserved} MB reserved")
+            plans.append({'workers': workers, 'budgetMb': budget_mb, 'strategy': plan['strategy'],
+                          'reservedMb': reserved, 'estimatedRows': plan['estimatedRows']})
+        return plans
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-user metrics computation')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--activity-rate', type=float, default=0.3, help='Mean chance a user used a tool in a report')
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}", help='Comma-separated worker counts')
+    parser.add_argument('--out-of-core', type=int, metavar='PARTITIONS', help='Also time an out-of-core run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per mode; the fastest is reported')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--check-plan', action='store_true',
+                        help='Check that a default web run keeps a parallel in-memory plan')
+    args = parser.parse_args()
+
+    reports = synthetic_reports(args.users, args.months, args.activity_rate, args.seed)
+    if args.check_plan:
+        plans = check_plan(reports, [int(w) for w in args.workers.split(',')])
+        if args.json:
+            print(json.dumps({'users': args.users, 'months': args.months, 'cpus': os.cpu_count(), 'plans': plans}))
+            return
+        for plan in plans:
+            print(f"  workers={plan['workers']:<4} {plan['strategy']} within {plan['budgetMb']:g} MB, "
+                  f"reserving {plan['reservedMb']} MB")
+        return
+    modes = [(f"workers={count}", {'workers': count}) for count in sorted({int(w) for w in args.workers.split(',')})]
+    if args.out_of_core:
+        modes.append((f"out-of-core partitions={args.out_of_core}", {'partitions': args.out_of_core}))
+
+    rows, reference = [], None
+    for label, options in modes:
+        timings = []
+        for _ in range(args.repeat):
+            seconds, labels = run_mode(reports, **options)
+            timings.append(seconds)
+        if reference is None:
+            reference = labels
+        elif not labels.equals(reference):
+            raise SystemExit(f"{label} classified users differently from {modes[0][0]}")
+        rows.append({'mode': label, 'seconds': round(min(timings), 3)})
+
+    baseline = rows[0]['seconds']
+    for row in rows:
+        row['speedup'] = round(baseline / row['seconds'], 2) if row['seconds'] else None
+
+    if args.json:
+        print(json.dumps({'users': args.users, 'months': args.months, 'cpus': os.cpu_count(), 'results': rows}))
+        return
+    print(f"{args.users} users x {args.months} reports, {os.cpu_count()} CPUs")
+    for row in rows:
+        print(f"  {row['mode']:<32} {row['seconds']:>8.3f}s  {row['speedup']:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
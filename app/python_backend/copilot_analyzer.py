@@ -2,27 +2,100 @@
 #!/usr/bin/env python3
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 import sys
 import json
 import argparse
+import signal
+import tempfile
+import time
 from datetime import datetime, timedelta
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill, Font, Alignment
 from openpyxl.formatting.rule import ColorScaleRule, DataBarRule
+from openpyxl.chart import BarChart, LineChart, Reference
+from org_rollup import build_org_rollup
+from aggregate_cube import build_aggregate_cube, monthly_metrics, scaled_engagement
+from history_store import HistoryStore, SNAPSHOT_COLUMNS, TEMP_ROOT, history_query_main, quarter_of
+from usage_index import write_usage_timeline
+from out_of_core import PartitionedUsageStore, compute_user_metrics, to_long, TREND_MODELS, DEFAULT_TREND_TOLERANCE
+from parallel_metrics import parallel_user_metrics
+from preview import stratified_sample, stratified_estimate, cluster_estimate
+from execution_planner import plan_execution, plan_execution_main
+from retention import DIMENSIONS as RETENTION_DIMENSIONS, build_activity_matrix, cohort_retention, retention_triangle
+from filter_options import build_filter_options, filter_options_main
+from report_schema import TOOL_PREFIX, match_columns, merge_tool_columns, sniff_report, tool_name
 import warnings
 warnings.filterwarnings('ignore')
+
+# Bump whenever metrics, engagement scoring or classification rules change;
+# the web layer's result cache keys on it, so older cached runs stop matching
+SCORING_VERSION = 1
+CLASSIFICATION_THRESHOLDS = {
+    'grace_period_days': 90,
+    'reallocation_inactive_days': 90,
+    'under_utilized_inactive_days': 60,
+    'reallocation_consistency_pct': 25,
+    'under_utilized_consistency_pct': 50
+}
+
+# Where the web layer's parse workers write normalized reports
+# (lib/ingest-pipeline.ts); only files under it are ever unpickled
+PARSE_CACHE_DIR = os.path.join(TEMP_ROOT, 'parse-cache')
+
+def normalized_report_path(filepath):
+    """Resolve a parse-cache file, refusing any path outside PARSE_CACHE_DIR"""
+    path = os.path.realpath(filepath)
+    if os.path.dirname(path) != os.path.realpath(PARSE_CACHE_DIR):
+        raise ValueError(f"Normalized report outside the parse cache: {filepath}")
+    return path
+
+class AnalysisCancelled(BaseException):
+    """Raised when the web layer cancels a run (SIGTERM) or a resource limit hits.
+
+    Derives from BaseException so the broad ``except Exception`` handlers in
+    the pipeline do not swallow it.
+    """
+
+def _raise_cancelled(signum, frame):
+    if signum == getattr(signal, 'SIGXCPU', None):
+        raise AnalysisCancelled('CPU time limit exceeded')
+    raise AnalysisCancelled('Analysis cancelled')
+
+def apply_cpu_limit(cpu_seconds):
+    """Cap this process' CPU time; SIGXCPU is delivered when the soft limit hits"""
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    signal.signal(signal.SIGXCPU, _raise_cancelled)
+
 class CopilotAnalyzer:
     def __init__(self):
         self.target_user_data = None
         self.full_usage_data = None
+        # Set instead of full_usage_data when running out of core
+        self.usage_store = None
+        self.usage_tool_cols = None
+        # Parse-cache files (normalized_report_path) among the usage reports
+        self.normalized_reports = set()
+        # Read CSVs in chunks even when holding everything in memory (execution_planner 'chunked')
+        self.stream_reports = False
+        # Processes used for the per-user metrics of in-memory runs
+        self.workers = 1
+        self.trend_model = 'halves'
+        self.trend_tolerance = DEFAULT_TREND_TOLERANCE
         self.utilized_metrics_df = None
         self.output_folder_path = None
         
     def log(self, message):
         print(f"[LOG] {message}")
         
+    def progress(self, stage, **data):
+        """Emit a machine-readable stage event for the web job tracker"""
+        print(f"[PROGRESS] {json.dumps({'stage': stage, **data})}", flush=True)
+        
     def load_target_users(self, filepath):
         """Load target users file"""
         try:
@@ -39,40 +112,145 @@ class CopilotAnalyzer:
             self.log(f"Error loading target users: {e}")
             return False
             
-    def load_usage_reports(self, filepaths):
-        """Load usage report files"""
+    def normalize_usage_report(self, filepath, schema=None):
+        """Read a single usage report and normalize its key columns"""
+        if filepath in self.normalized_reports:
+            # Already normalized by a pipelined parse worker
+            return pd.read_pickle(filepath)
+        schema = schema or sniff_report(filepath)
+        if filepath.lower().endswith('.csv'):
+            df = pd.read_csv(filepath, usecols=schema.usecols, dtype=schema.dtypes)
+        else:
+            df = pd.read_excel(filepath, usecols=schema.usecols, dtype=schema.dtypes)
+        return self.normalize_usage_frame(schema.apply(df))
+        
+    def normalize_usage_frame(self, df):
+        """Lower-case UPNs and parse every date column"""
+        df['User Principal Name'] = df['User Principal Name'].str.lower()
+        
+        # Handle date columns
+        date_cols = [col for col in df.columns if 'date' in col.lower()]
+        for col in date_cols:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
+        return df
+        
+    def iter_usage_report(self, filepath, schema=None, chunksize=500000):
+        """Yield a usage report as normalized chunks; CSVs are streamed, other formats load whole"""
+        if filepath not in self.normalized_reports and filepath.lower().endswith('.csv'):
+            schema = schema or sniff_report(filepath)
+            for chunk in pd.read_csv(filepath, usecols=schema.usecols, dtype=schema.dtypes, chunksize=chunksize):
+                yield self.normalize_usage_frame(schema.apply(chunk))
+        else:
+            yield self.normalize_usage_report(filepath, schema)
+            
+    def sniff_usage_reports(self, filepaths):
+        """Match every report's header against the known layouts; unrecognized files are rejected before any parsing"""
+        schemas = {}
+        for file in filepaths:
+            if file in self.normalized_reports:
+                # Canonical columns already; resolved from the frame once loaded
+                schemas[file] = None
+                continue
+            try:
+                schemas[file] = sniff_report(file)
+            except Exception as e:
+                self.log(f"Rejected usage report: {os.path.basename(file)}. {e}")
+        return schemas
+        
+    def load_usage_reports(self, filepaths, spill_dir=None, partitions=64):
+        """Load usage report files, or spill them to partitions under spill_dir to run out of core"""
         try:
             all_reports = []
-            for file in filepaths:
+            resolved = []
+            schemas = self.sniff_usage_reports(filepaths)
+            if spill_dir:
+                self.usage_store = PartitionedUsageStore(spill_dir, partitions)
+            for index, file in enumerate(filepaths, 1):
                 try:
-                    if file.lower().endswith('.csv'):
-                        df = pd.read_csv(file)
+                    if file not in schemas:
+                        continue
+                    schema = schemas[file]
+                    if self.usage_store is not None:
+                        for chunk in self.iter_usage_report(file, schema):
+                            schema = schema or match_columns(chunk.columns)
+                            self.usage_store.append(chunk, schema.tool_cols)
+                    elif self.stream_reports:
+                        chunks = list(self.iter_usage_report(file, schema))
+                        schema = schema or match_columns(chunks[0].columns)
+                        all_reports.extend(chunks)
                     else:
-                        df = pd.read_excel(file)
-                    all_reports.append(df)
+                        report = self.normalize_usage_report(file, schema)
+                        schema = schema or match_columns(report.columns)
+                        all_reports.append(report)
+                    resolved.append(schema)
                     self.log(f"Loaded usage report: {os.path.basename(file)}")
                 except Exception as e:
                     self.log(f"Could not read file: {os.path.basename(file)}. Error: {e}")
                     continue
+                finally:
+                    self.progress('loading_reports', files_loaded=index, files_total=len(filepaths))
                     
+            # Resolved once for the whole run, in first-seen order
+            self.usage_tool_cols = merge_tool_columns(resolved)
+            if self.usage_store is not None:
+                if self.usage_store.rows == 0:
+                    raise ValueError("No usage reports could be read")
+                self.log(f"Spilled {self.usage_store.rows} usage records to {partitions} partitions")
+                return True
             if not all_reports:
                 raise ValueError("No usage reports could be read")
                 
             usage_df = pd.concat(all_reports, ignore_index=True)
-            usage_df['User Principal Name'] = usage_df['User Principal Name'].str.lower()
-            
-            # Handle date columns
-            date_cols = [col for col in usage_df.columns if 'date' in col.lower()]
-            for col in date_cols:
-                usage_df[col] = pd.to_datetime(usage_df[col], errors='coerce', format='mixed')
-                
-            self.full_usage_data = usage_df.copy()
+            self.full_usage_data = usage_df if self.stream_reports else usage_df.copy()
             self.log(f"Loaded {len(usage_df)} usage records")
             return True
         except Exception as e:
             self.log(f"Error loading usage reports: {e}")
             return False
             
+    def has_usage_data(self):
+        return self.full_usage_data is not None or self.usage_store is not None
+        
+    def tool_columns(self):
+        """Canonical 'Last activity date of' columns of the loaded reports"""
+        if self.usage_tool_cols is not None:
+            return list(self.usage_tool_cols)
+        if self.usage_store is not None:
+            return list(self.usage_store.tool_cols)
+        # Usage data assigned directly rather than loaded from report files
+        return [col for col in self.full_usage_data.columns if col.startswith(TOOL_PREFIX)]
+        
+    def report_period(self):
+        """(first, last) Report Refresh Date across all loaded reports"""
+        if self.usage_store is not None:
+            return self.usage_store.min_report_date, self.usage_store.max_report_date
+        return self.full_usage_data['Report Refresh Date'].min(), self.full_usage_data['Report Refresh Date'].max()
+        
+    def report_months(self):
+        """Every 'YYYY-MM' month from the first to the last report"""
+        first, last = self.report_period()
+        return set(pd.period_range(first.to_period('M'), last.to_period('M'), freq='M').strftime('%Y-%m'))
+        
+    def usage_partitions(self, emails=None):
+        """Yield usage rows in pieces that never split a user: everything at once in memory, one partition at a time out of core"""
+        if self.usage_store is not None:
+            yield from self.usage_store.wide_partitions(emails)
+        elif emails is None:
+            yield self.full_usage_data
+        else:
+            yield self.full_usage_data[self.full_usage_data['User Principal Name'].isin(emails)]
+            
+    def long_usage_parts(self, emails):
+        """Long-format usage rows of ``emails``: converted once in memory, read partition by partition out of core"""
+        if self.usage_store is None:
+            usage_df = self.full_usage_data
+            yield to_long(usage_df[usage_df['User Principal Name'].isin(emails)], self.tool_columns())
+            return
+        for bucket in range(self.usage_store.partitions):
+            long_df = self.usage_store.partition(bucket)
+            if long_df is not None:
+                yield long_df[long_df['User Principal Name'].isin(emails)]
+                
     def apply_filters(self, filters):
         """Apply filters to target user data"""
         if self.target_user_data is None:
@@ -107,9 +285,42 @@ class CopilotAnalyzer:
         
     def analyze_users(self, filtered_target_df=None):
         """Perform user analysis"""
-        if self.full_usage_data is None:
+        if not self.has_usage_data():
             raise ValueError("No usage data loaded")
             
+        # Calculate analysis period
+        min_report_date, max_report_date = self.report_period()
+        total_months_in_period = (max_report_date.year - min_report_date.year) * 12 + max_report_date.month - min_report_date.month + 1
+        
+        if self.usage_store is not None:
+            self.utilized_metrics_df = self.analyze_partitions(filtered_target_df, total_months_in_period)
+        else:
+            self.utilized_metrics_df = self.analyze_in_memory(filtered_target_df, total_months_in_period)
+            
+        # Calculate engagement scores
+        if not self.utilized_metrics_df.empty:
+            max_consistency = self.utilized_metrics_df['Usage Consistency (%)'].max()
+            max_complexity = self.utilized_metrics_df['Usage Complexity'].max()
+            max_avg_complexity = self.utilized_metrics_df['Avg Tools / Report'].max()
+            
+            self.utilized_metrics_df['consistency_norm'] = self.utilized_metrics_df['Usage Consistency (%)'] / max_consistency if max_consistency > 0 else 0
+            self.utilized_metrics_df['complexity_norm'] = self.utilized_metrics_df['Usage Complexity'] / max_complexity if max_complexity > 0 else 0
+            self.utilized_metrics_df['avg_complexity_norm'] = self.utilized_metrics_df['Avg Tools / Report'] / max_avg_complexity if max_avg_complexity > 0 else 0
+            
+            self.utilized_metrics_df['Engagement Score'] = (
+                self.utilized_metrics_df['consistency_norm'] + 
+                self.utilized_metrics_df['complexity_norm'] + 
+                self.utilized_metrics_df['avg_complexity_norm']
+            )
+            
+        return self.classify_users(max_report_date, total_months_in_period)
+        
+    def user_metrics(self, long_df, total_months_in_period):
+        """Per-user metrics for long-format rows, with this run's trend model"""
+        return compute_user_metrics(long_df, total_months_in_period, self.trend_model, self.trend_tolerance)
+        
+    def analyze_in_memory(self, filtered_target_df, total_months_in_period):
+        """Per-user metrics over the in-memory usage data"""
         usage_df = self.full_usage_data
         
         # Determine users to analyze
@@ -125,151 +336,186 @@ class CopilotAnalyzer:
         if not utilized_emails:
             raise ValueError("No matching users found to analyze")
             
-        matched_users_df = usage_df[usage_df['User Principal Name'].isin(utilized_emails)].copy()
-        copilot_tool_cols = [col for col in matched_users_df.columns if 'Last activity date of' in col]
+        matched_users_df = usage_df[usage_df['User Principal Name'].isin(utilized_emails)]
+        long_df = to_long(matched_users_df, self.tool_columns())
         
-        # Calculate analysis period
-        min_report_date = usage_df['Report Refresh Date'].min()
-        max_report_date = usage_df['Report Refresh Date'].max()
-        total_months_in_period = (max_report_date.year - min_report_date.year) * 12 + max_report_date.month - min_report_date.month + 1
+        users_total = len(utilized_emails)
+        self.progress('analyzing_users', users_processed=0, users_total=users_total)
+        if self.workers > 1:
+            return parallel_user_metrics(
+                long_df, total_months_in_period, self.workers,
+                lambda users_processed, users_total: self.progress('analyzing_users', users_processed=users_processed, users_total=users_total),
+                self.trend_model, self.trend_tolerance
+            )
+        metrics_df = self.user_metrics(long_df, total_months_in_period)
+        self.progress('analyzing_users', users_processed=users_total, users_total=users_total)
+        return metrics_df
         
-        # Analyze each user
-        user_metrics = []
-        for email in utilized_emails:
-            user_data = matched_users_df[matched_users_df['User Principal Name'] == email]
-            
-            activity_dates = user_data[copilot_tool_cols].stack().dropna().unique()
-            activity_dates = pd.to_datetime(activity_dates)
+    def analyze_partitions(self, filtered_target_df, total_months_in_period):
+        """Per-user metrics computed one spilled partition at a time; only the results stay in memory"""
+        target_emails = None
+        if filtered_target_df is not None:
+            target_emails = set(filtered_target_df['UserPrincipalName'].str.lower())
+        else:
+            self.log("No target user file provided. Analyzing all users from reports")
             
-            if len(activity_dates) == 0:
-                first_activity, last_activity = pd.NaT, pd.NaT
-                active_months, complexity, avg_tools_per_month, trend = 0, 0, 0, "N/A"
-                report_dates = sorted(user_data['Report Refresh Date'].unique())
-                first_activity = report_dates[0] if report_dates else pd.NaT
-            else:
-                first_activity, last_activity = activity_dates.min(), activity_dates.max()
-                active_months = len(pd.to_datetime(activity_dates).to_period('M').unique())
-                complexity = user_data[copilot_tool_cols].notna().any().sum()
-                
-                monthly_activity = user_data[copilot_tool_cols].stack().dropna().reset_index().rename(columns={'level_1': 'Tool', 0: 'Date'})
-                monthly_activity['Month'] = pd.to_datetime(monthly_activity['Date']).dt.to_period('M')
-                avg_tools_per_month = monthly_activity.groupby('Month')['Tool'].nunique().mean() if not monthly_activity.empty else 0
-                
-                trend = "N/A"
-                if len(activity_dates) > 1:
-                    trend = "Stable"
-                    timeline_midpoint = first_activity + (last_activity - first_activity) / 2
-                    first_half_activity = monthly_activity[monthly_activity['Date'] <= timeline_midpoint]
-                    second_half_activity = monthly_activity[monthly_activity['Date'] > timeline_midpoint]
-                    if second_half_activity['Tool'].nunique() > first_half_activity['Tool'].nunique():
-                        trend = "Increasing"
-                    elif second_half_activity['Tool'].nunique() < first_half_activity['Tool'].nunique():
-                        trend = "Decreasing"
-                        
-            consistency = (active_months / total_months_in_period) * 100 if total_months_in_period > 0 else 0
-            
-            user_metrics.append({
-                'Email': email,
-                'Usage Consistency (%)': consistency,
-                'Overall Recency': last_activity,
-                'Usage Complexity': complexity,
-                'Avg Tools / Report': avg_tools_per_month,
-                'Usage Trend': trend,
-                'Appearances': user_data['Report Refresh Date'].nunique(),
-                'First Appearance': first_activity
-            })
+        partition_metrics = []
+        partitions_total = self.usage_store.partitions
+        self.progress('analyzing_partitions', partitions_processed=0, partitions_total=partitions_total)
+        for bucket in range(partitions_total):
+            long_df = self.usage_store.partition(bucket)
+            if long_df is not None and target_emails is not None:
+                long_df = long_df[long_df['User Principal Name'].isin(target_emails)]
+            if long_df is not None and not long_df.empty:
+                partition_metrics.append(self.user_metrics(long_df, total_months_in_period))
+            self.progress('analyzing_partitions', partitions_processed=bucket + 1, partitions_total=partitions_total)
             
-        self.utilized_metrics_df = pd.DataFrame(user_metrics)
+        if not partition_metrics:
+            raise ValueError("No matching users found to analyze")
+        metrics_df = pd.concat(partition_metrics, ignore_index=True)
+        if target_emails is not None:
+            self.log(f"Analyzing {len(metrics_df)} of {len(target_emails)} target users found in reports")
+        return metrics_df
         
-        # Calculate engagement scores
-        if not self.utilized_metrics_df.empty:
-            max_consistency = self.utilized_metrics_df['Usage Consistency (%)'].max()
-            max_complexity = self.utilized_metrics_df['Usage Complexity'].max()
-            max_avg_complexity = self.utilized_metrics_df['Avg Tools / Report'].max()
+    def preview_strata(self, emails):
+        """Company / Department of each email from the target list; a single stratum without one"""
+        if self.target_user_data is None:
+            return pd.Series('All users', index=emails)
+        targets = self.target_user_data.assign(Email=self.target_user_data['UserPrincipalName'].str.lower())
+        targets = targets.drop_duplicates('Email').set_index('Email')
+        labels = targets['Company'].fillna('Unknown').astype(str) + ' / ' + targets['Department'].fillna('Unknown').astype(str)
+        return labels.reindex(emails).fillna('Unassigned')
+        
+    def sample_classes(self, metrics, reference_date):
+        """Classification of each user in ``metrics``, without justifications or scores"""
+        rules = self.classification_rules(metrics, reference_date)
+        labels = np.select([rules['reallocation'], rules['under_utilized']], ['For Reallocation', 'Under-Utilized'], 'Top Utilizer')
+        return pd.Series(labels, index=metrics['Email'].to_numpy())
+        
+    def preview_users(self, filtered_target_df=None, sample_size=2000, seed=0):
+        """Class sizes estimated from a sample of users, with 95% intervals and an ETA for the full per-user analysis"""
+        started = time.perf_counter()
+        _, reference_date = self.report_period()
+        total_months_in_period = len(self.report_months())
+        target_emails = None
+        if filtered_target_df is not None:
+            target_emails = set(filtered_target_df['UserPrincipalName'].str.lower())
             
-            self.utilized_metrics_df['consistency_norm'] = self.utilized_metrics_df['Usage Consistency (%)'] / max_consistency if max_consistency > 0 else 0
-            self.utilized_metrics_df['complexity_norm'] = self.utilized_metrics_df['Usage Complexity'] / max_complexity if max_complexity > 0 else 0
-            self.utilized_metrics_df['avg_complexity_norm'] = self.utilized_metrics_df['Avg Tools / Report'] / max_avg_complexity if max_avg_complexity > 0 else 0
+        if self.usage_store is not None:
+            # Partitions are random clusters of users: analyze whole ones until the sample is large enough
+            cluster_classes = []
+            sampled_users = 0
+            for bucket in range(self.usage_store.partitions):
+                if sampled_users >= sample_size and len(cluster_classes) >= 2:
+                    break
+                long_df = self.usage_store.partition(bucket)
+                if long_df is not None and target_emails is not None:
+                    long_df = long_df[long_df['User Principal Name'].isin(target_emails)]
+                if long_df is None or long_df.empty:
+                    classes = pd.Series(dtype=object)
+                else:
+                    classes = self.sample_classes(self.user_metrics(long_df, total_months_in_period), reference_date)
+                cluster_classes.append(classes)
+                sampled_users += len(classes)
+            population, estimates = cluster_estimate(cluster_classes, self.usage_store.partitions)
+            elapsed = time.perf_counter() - started
+            eta_seconds = elapsed * self.usage_store.partitions / len(cluster_classes)
+            design = {'method': 'cluster', 'partitions_sampled': len(cluster_classes), 'partitions_total': self.usage_store.partitions}
+        else:
+            usage_df = self.full_usage_data
+            emails = pd.Index(usage_df['User Principal Name'].unique())
+            if target_emails is not None:
+                emails = emails[emails.isin(target_emails)]
+            if emails.empty:
+                raise ValueError("No matching users found to analyze")
+            strata = self.preview_strata(emails)
+            sample = stratified_sample(strata, sample_size, seed)
+            sample_rows = usage_df[usage_df['User Principal Name'].isin(sample)]
+            scanned = time.perf_counter()
             
-            self.utilized_metrics_df['Engagement Score'] = (
-                self.utilized_metrics_df['consistency_norm'] + 
-                self.utilized_metrics_df['complexity_norm'] + 
-                self.utilized_metrics_df['avg_complexity_norm']
-            )
+            metrics = self.user_metrics(to_long(sample_rows, self.tool_columns()), total_months_in_period)
+            population, estimates = stratified_estimate(strata, self.sample_classes(metrics, reference_date))
+            sampled_users = len(metrics)
+            elapsed = time.perf_counter() - started
+            # The full run repeats the scan once and the per-user work for everyone
+            eta_seconds = (scanned - started) + (elapsed - (scanned - started)) * population / max(sampled_users, 1)
+            design = {'method': 'stratified', 'strata': int(strata.nunique())}
             
-        return self.classify_users(usage_df, total_months_in_period)
+        self.log(f"Preview from {sampled_users} of {population} users in {elapsed:.2f}s")
+        return {
+            **design,
+            'population': population,
+            'sample_size': sampled_users,
+            'confidence': 0.95,
+            'estimates': estimates,
+            'eta_seconds': round(eta_seconds, 1),
+            'elapsed_seconds': round(elapsed, 2)
+        }
+        
+    def classification_rules(self, metrics, reference_date):
+        """Boolean array per classification rule for every row of ``metrics``, plus the resulting class masks"""
+        thresholds = CLASSIFICATION_THRESHOLDS
+        grace_start = reference_date - timedelta(days=thresholds['grace_period_days'])
+        reallocation_inactive = reference_date - timedelta(days=thresholds['reallocation_inactive_days'])
+        under_utilized_inactive = reference_date - timedelta(days=thresholds['under_utilized_inactive_days'])
         
-    def classify_users(self, usage_df, total_months_in_period):
+        recency = metrics['Overall Recency']
+        consistency = metrics['Usage Consistency (%)']
+        rules = {
+            'new_user': (metrics['First Appearance'] > grace_start).to_numpy(),
+            'inactive_long': (recency < reallocation_inactive).to_numpy(),
+            'inactive_short': ((recency >= reallocation_inactive) & (recency < under_utilized_inactive)).to_numpy(),
+            'no_usage': (metrics['Usage Complexity'] == 0).to_numpy(),
+            'decreasing': (metrics['Usage Trend'] == 'Decreasing').to_numpy(),
+            'single_report': (metrics['Appearances'] == 1).to_numpy(),
+            'very_low_consistency': (consistency < thresholds['reallocation_consistency_pct']).to_numpy(),
+            'low_consistency': (consistency < thresholds['under_utilized_consistency_pct']).to_numpy()
+        }
+        # New users are only ever Under-Utilized; Reallocation wins over Under-Utilized
+        rules['reallocation'] = ~rules['new_user'] & (rules['no_usage'] | rules['inactive_long'] | rules['very_low_consistency'])
+        rules['under_utilized'] = ~rules['reallocation'] & (
+            rules['new_user'] | rules['inactive_short'] | rules['decreasing'] | rules['single_report'] | rules['low_consistency'])
+        return rules
+        
+    def classify_users(self, reference_date, total_months_in_period):
         """Classify users into categories"""
-        reference_date = usage_df['Report Refresh Date'].max()
-        ninety_days_grace = reference_date - timedelta(days=90)
-        sixty_days_ago = reference_date - timedelta(days=60)
-        ninety_days_ago = reference_date - timedelta(days=90)
+        thresholds = CLASSIFICATION_THRESHOLDS
+        metrics = self.utilized_metrics_df
+        rules = self.classification_rules(metrics, reference_date)
+        is_new_user = rules['new_user']
+        reallocation, under_utilized = rules['reallocation'], rules['under_utilized']
         
-        reallocation_emails, under_utilized_emails = set(), set()
+        # Justifications in the same order the rules are listed above
+        active_months = (metrics['Usage Consistency (%)'] * total_months_in_period / 100).astype(int).to_numpy()
+        recency_reason = np.select([rules['no_usage'], rules['inactive_long'], rules['inactive_short']],
+                                   ["No tool usage recorded",
+                                    f"No activity in {thresholds['reallocation_inactive_days']}+ days",
+                                    f"No activity in {thresholds['under_utilized_inactive_days']}-{thresholds['reallocation_inactive_days'] - 1} days"], '')
+        consistency_reason = [
+            "Single report appearance" if single and not new
+            else f"Low consistency (active in {months} of {total_months_in_period} months)" if low and not new
+            else ''
+            for single, low, new, months in zip(rules['single_report'], rules['low_consistency'], is_new_user, active_months)
+        ]
+        justifications = np.array([
+            "; ".join(reason for reason in reasons if reason) or "High Engagement"
+            for reasons in zip(np.where(is_new_user, f"New user (in {thresholds['grace_period_days']}-day grace period)", ''), recency_reason,
+                               np.where(rules['decreasing'], "Downward usage trend", ''), consistency_reason)
+        ], dtype=object)
         
-        for _, row in self.utilized_metrics_df.iterrows():
-            email = row['Email']
-            is_new_user = pd.notna(row['First Appearance']) and row['First Appearance'] > ninety_days_grace
-            
-            if is_new_user:
-                under_utilized_emails.add(email)
-                continue
-                
-            if (row['Usage Complexity'] == 0) or \
-               (pd.notna(row['Overall Recency']) and row['Overall Recency'] < ninety_days_ago) or \
-               ((row['Usage Consistency (%)'] < 25) and not is_new_user):
-                reallocation_emails.add(email)
-                
-            if (pd.notna(row['Overall Recency']) and (ninety_days_ago <= row['Overall Recency'] < sixty_days_ago)) or \
-               (row['Usage Trend'] == 'Decreasing') or \
-               (row['Appearances'] == 1) or \
-               ((row['Usage Consistency (%)'] < 50) and not is_new_user):
-                under_utilized_emails.add(email)
-                
         # Create classification dataframes
-        reallocation_df = self.utilized_metrics_df[self.utilized_metrics_df['Email'].isin(reallocation_emails)].copy()
+        reallocation_df = metrics[reallocation].copy()
         reallocation_df['Classification'] = 'For Reallocation'
+        reallocation_df['Justification'] = justifications[reallocation]
         
-        under_utilized_df = self.utilized_metrics_df[
-            self.utilized_metrics_df['Email'].isin(under_utilized_emails) & 
-            ~self.utilized_metrics_df['Email'].isin(reallocation_emails)
-        ].copy()
+        under_utilized_df = metrics[under_utilized].copy()
         under_utilized_df['Classification'] = 'Under-Utilized'
+        under_utilized_df['Justification'] = justifications[under_utilized]
         
-        top_utilizer_emails = set(self.utilized_metrics_df['Email']) - reallocation_emails - under_utilized_emails
-        top_utilizers_df = self.utilized_metrics_df[self.utilized_metrics_df['Email'].isin(top_utilizer_emails)].copy()
+        top_utilizers_df = metrics[~reallocation & ~under_utilized].copy()
         top_utilizers_df['Classification'] = 'Top Utilizer'
-        
-        # Add justifications
-        def get_justification(row, total_months):
-            reasons = []
-            is_new_user = pd.notna(row['First Appearance']) and row['First Appearance'] > ninety_days_grace
-            if is_new_user:
-                reasons.append("New user (in 90-day grace period)")
-                
-            if row['Usage Complexity'] == 0:
-                reasons.append("No tool usage recorded")
-            elif pd.notna(row['Overall Recency']) and row['Overall Recency'] < ninety_days_ago:
-                reasons.append("No activity in 90+ days")
-            elif pd.notna(row['Overall Recency']) and (ninety_days_ago <= row['Overall Recency'] < sixty_days_ago):
-                reasons.append("No activity in 60-89 days")
-                
-            if row['Usage Trend'] == 'Decreasing':
-                reasons.append("Downward usage trend")
-                
-            active_months = int(row['Usage Consistency (%)'] * total_months / 100)
-            if row['Appearances'] == 1 and not is_new_user:
-                reasons.append("Single report appearance")
-            elif row['Usage Consistency (%)'] < 50 and not is_new_user:
-                reasons.append(f"Low consistency (active in {active_months} of {total_months} months)")
-                
-            return "; ".join(reasons) if reasons else "High Engagement"
-            
         top_utilizers_df['Justification'] = "High Engagement"
-        under_utilized_df['Justification'] = [get_justification(row, total_months_in_period) for _, row in under_utilized_df.iterrows()]
-        reallocation_df['Justification'] = [get_justification(row, total_months_in_period) for _, row in reallocation_df.iterrows()]
-        
+            
         # Sort dataframes
         top_utilizers_df.sort_values(by=['Engagement Score', 'Overall Recency'], ascending=[False, False], inplace=True)
         under_utilized_df.sort_values(by=['Engagement Score', 'Overall Recency'], ascending=[True, True], inplace=True)
@@ -330,80 +576,182 @@ class CopilotAnalyzer:
             worksheet.conditional_formatting.add(consistency_range,
                 DataBarRule(start_type='min', end_type='max', color=green_color))
 
-    def create_visualizations(self, utilized_df, top_df, under_df, matched_df, output_folder):
-        """Create visualizations for the Excel report"""
+    def create_chart_data(self, utilized_df, top_df, usage_parts, bins=20):
+        """Chart series as compact JSON aggregates: score histogram, top-utilizer tool counts, mean score per report date"""
+        chart_data = {'version': 1, 'engagementHistogram': None, 'topUtilizerTools': [], 'engagementTrend': []}
+        has_scores = 'Engagement Score' in utilized_df.columns and not utilized_df.empty
+        if has_scores:
+            counts, edges = np.histogram(utilized_df['Engagement Score'].dropna(), bins=bins)
+            chart_data['engagementHistogram'] = {'edges': [round(float(edge), 4) for edge in edges], 'counts': counts.tolist()}
+            
+        # Tool usage by top utilizers and per-report means of the per-user
+        # scores are accumulated over user-disjoint usage partitions
+        tool_usage_counts = None
+        engagement_by_report = None
+        scores = utilized_df.set_index('Email')['Engagement Score'] if has_scores else None
+        top_emails = set(top_df['Email'])
+        tool_cols = self.tool_columns()
+        for usage_df in usage_parts:
+            top_user_activity = usage_df[usage_df['User Principal Name'].isin(top_emails)]
+            if not top_user_activity.empty and tool_cols:
+                counts = top_user_activity[tool_cols].notna().sum()
+                tool_usage_counts = counts if tool_usage_counts is None else tool_usage_counts.add(counts, fill_value=0)
+            if scores is not None:
+                report_scores = usage_df['User Principal Name'].map(scores)
+                sums = report_scores.groupby(pd.to_datetime(usage_df['Report Refresh Date'])).agg(['sum', 'count'])
+                engagement_by_report = sums if engagement_by_report is None else engagement_by_report.add(sums, fill_value=0)
+                
+        if tool_usage_counts is not None:
+            tool_usage_counts = tool_usage_counts.sort_values(ascending=False)
+            chart_data['topUtilizerTools'] = [
+                {'tool': tool_name(col), 'count': int(count)}
+                for col, count in tool_usage_counts.items()
+            ]
+        if engagement_by_report is not None:
+            engagement_by_report = engagement_by_report[engagement_by_report['count'] > 0].sort_index()
+            chart_data['engagementTrend'] = [
+                {'reportDate': date.strftime('%Y-%m-%d'), 'averageScore': round(float(row['sum'] / row['count']), 4), 'rows': int(row['count'])}
+                for date, row in engagement_by_report.iterrows()
+            ]
+        return chart_data
+        
+    def render_chart_images(self, chart_data, output_folder):
+        """PNG renderings of the chart aggregates, for exports that embed images"""
+        # Imported here so runs that export no images never load matplotlib
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        
         charts = {}
         plt.style.use('default')
-        
         try:
-            # Engagement Score Distribution
-            if 'Engagement Score' in utilized_df.columns and not utilized_df.empty:
+            histogram = chart_data.get('engagementHistogram')
+            if histogram:
+                edges = np.array(histogram['edges'])
                 plt.figure(figsize=(10, 6))
-                utilized_df['Engagement Score'].plot(kind='hist', bins=20, title='Distribution of User Engagement Score')
+                plt.bar(edges[:-1], histogram['counts'], width=np.diff(edges), align='edge')
+                plt.title('Distribution of User Engagement Score')
                 plt.xlabel('Engagement Score (Consistency + Complexity + Avg Tools/Rpt)')
                 plt.ylabel('Number of Users')
                 plt.tight_layout()
                 charts['engagement_score_hist'] = os.path.join(output_folder, 'engagement_score_hist.png')
                 plt.savefig(charts['engagement_score_hist'], dpi=150, bbox_inches='tight')
                 plt.close()
-            
-            # Tool Usage by Top Utilizers
-            if not matched_df.empty and not top_df.empty:
-                tool_cols = [col for col in matched_df.columns if 'Last activity date of' in col]
-                top_user_activity = matched_df[matched_df['User Principal Name'].isin(top_df['Email'])]
-                if not top_user_activity.empty and tool_cols:
-                    tool_usage_counts = top_user_activity[tool_cols].notna().sum().sort_values(ascending=False)
-                    if not tool_usage_counts.empty:
-                        tool_usage_counts.index = tool_usage_counts.index.str.replace('Last activity date of ', '').str.replace(r' \(UTC\)', '')
-                        plt.figure(figsize=(12, 7))
-                        tool_usage_counts.plot(kind='bar', title='Most Commonly Used Tools by Top Utilizers')
-                        plt.ylabel('Number of Top Users Using Tool')
-                        plt.xticks(rotation=45, ha='right')
-                        plt.tight_layout()
-                        charts['top_utilizer_tools'] = os.path.join(output_folder, 'top_utilizer_tools.png')
-                        plt.savefig(charts['top_utilizer_tools'], dpi=150, bbox_inches='tight')
-                        plt.close()
-            
-            # Average Engagement Score Over Time
-            if not matched_df.empty and 'Engagement Score' in utilized_df.columns:
-                plot_data = pd.merge(
-                    matched_df,
-                    utilized_df[['Email', 'Engagement Score']],
-                    left_on='User Principal Name',
-                    right_on='Email',
-                    how='left'
-                )
-                if not plot_data.empty and 'Engagement Score' in plot_data.columns:
-                    trend_data = plot_data.groupby(pd.to_datetime(plot_data['Report Refresh Date']))['Engagement Score'].mean()
-                    
-                    if not trend_data.empty:
-                        plt.figure(figsize=(12, 6))
-                        trend_data.plot(kind='line', marker='o', linestyle='-', title='Average Engagement Score Over Time')
-                        plt.ylabel('Average Engagement Score')
-                        plt.xlabel('Report Date')
-                        plt.grid(True)
-                        plt.tight_layout()
-                        charts['avg_engagement_trend'] = os.path.join(output_folder, 'avg_engagement_trend.png')
-                        plt.savefig(charts['avg_engagement_trend'], dpi=150, bbox_inches='tight')
-                        plt.close()
-                        
+                
+            tools = chart_data.get('topUtilizerTools') or []
+            if tools:
+                plt.figure(figsize=(12, 7))
+                plt.bar([item['tool'] for item in tools], [item['count'] for item in tools])
+                plt.title('Most Commonly Used Tools by Top Utilizers')
+                plt.ylabel('Number of Top Users Using Tool')
+                plt.xticks(rotation=45, ha='right')
+                plt.tight_layout()
+                charts['top_utilizer_tools'] = os.path.join(output_folder, 'top_utilizer_tools.png')
+                plt.savefig(charts['top_utilizer_tools'], dpi=150, bbox_inches='tight')
+                plt.close()
+                
+            trend = chart_data.get('engagementTrend') or []
+            if trend:
+                plt.figure(figsize=(12, 6))
+                plt.plot(pd.to_datetime([point['reportDate'] for point in trend]), [point['averageScore'] for point in trend],
+                         marker='o', linestyle='-')
+                plt.title('Average Engagement Score Over Time')
+                plt.ylabel('Average Engagement Score')
+                plt.xlabel('Report Date')
+                plt.grid(True)
+                plt.tight_layout()
+                charts['avg_engagement_trend'] = os.path.join(output_folder, 'avg_engagement_trend.png')
+                plt.savefig(charts['avg_engagement_trend'], dpi=150, bbox_inches='tight')
+                plt.close()
+                
             self.log("Visualizations created.")
             return charts
         except Exception as e:
             self.log(f"Error creating visualizations: {e}")
-            return {}
-
-    def create_excel_report(self, filename, top_utilizers_df, under_utilized_df, reallocation_df):
+            return charts
+            
+    def add_summary_charts(self, workbook, summary_ws, chart_data):
+        """Native Excel charts on the summary sheet, reading the chart aggregates from a hidden 'Chart Data' sheet"""
+        data_ws = workbook.create_sheet('Chart Data')
+        data_ws.sheet_state = 'hidden'
+        
+        def write_table(column, headers, rows):
+            """Write a header row plus ``rows`` starting at ``column``; return the last row number"""
+            for offset, header in enumerate(headers):
+                data_ws.cell(row=1, column=column + offset, value=header).font = Font(bold=True)
+            for row_number, values in enumerate(rows, 2):
+                for offset, value in enumerate(values):
+                    data_ws.cell(row=row_number, column=column + offset, value=value)
+            return len(rows) + 1
+            
+        def place(chart, anchor, width, height, column, last_row):
+            data = Reference(data_ws, min_col=column + 1, min_row=1, max_row=last_row)
+            categories = Reference(data_ws, min_col=column, min_row=2, max_row=last_row)
+            chart.add_data(data, titles_from_data=True)
+            chart.set_categories(categories)
+            chart.width, chart.height = width, height
+            chart.legend = None
+            # Excel hides axes whose delete flag is left unset
+            chart.x_axis.delete = False
+            chart.y_axis.delete = False
+            summary_ws.add_chart(chart, anchor)
+            
+        histogram = chart_data.get('engagementHistogram')
+        if histogram:
+            edges = histogram['edges']
+            rows = [(f"{edges[i]:.2f}-{edges[i + 1]:.2f}", count) for i, count in enumerate(histogram['counts'])]
+            chart = BarChart()
+            chart.title = 'Distribution of User Engagement Score'
+            chart.x_axis.title = 'Engagement Score (Consistency + Complexity + Avg Tools/Rpt)'
+            chart.y_axis.title = 'Number of Users'
+            chart.gapWidth = 0
+            place(chart, 'A10', 16, 9.5, 1, write_table(1, ['Engagement Score', 'Users'], rows))
+            
+        tools = chart_data.get('topUtilizerTools') or []
+        if tools:
+            chart = BarChart()
+            chart.title = 'Most Commonly Used Tools by Top Utilizers'
+            chart.y_axis.title = 'Number of Top Users Using Tool'
+            place(chart, 'A35', 18.5, 11, 4, write_table(4, ['Tool', 'Top Utilizer Activity'], [(item['tool'], item['count']) for item in tools]))
+            
+        trend = chart_data.get('engagementTrend') or []
+        if trend:
+            chart = LineChart()
+            chart.title = 'Average Engagement Score Over Time'
+            chart.x_axis.title = 'Report Date'
+            chart.y_axis.title = 'Average Engagement Score'
+            rows = [(point['reportDate'], point['averageScore']) for point in trend]
+            place(chart, 'L10', 18.5, 9.5, 7, write_table(7, ['Report Date', 'Average Engagement Score'], rows))
+            chart.series[0].marker.symbol = 'circle'
+            
+    def write_retention_sheet(self, writer, retention):
+        """Cohort triangle (share of each first-appearance cohort active N months later) as its own sheet"""
+        months, cohorts, cells = retention
+        triangle = retention_triangle(cohorts, cells, months)
+        if triangle.empty:
+            return
+        triangle.index.name = 'Cohort'
+        triangle.to_excel(writer, sheet_name='Retention')
+        worksheet = writer.sheets['Retention']
+        self.style_excel_sheet(worksheet, triangle.reset_index())
+        last_row, last_col = len(triangle) + 1, len(triangle.columns) + 1
+        for row in worksheet.iter_rows(min_row=2, max_row=last_row, min_col=3, max_col=last_col):
+            for cell in row:
+                cell.number_format = '0.0%'
+        worksheet.conditional_formatting.add(f"C2:{get_column_letter(last_col)}{last_row}",
+            ColorScaleRule(start_type='num', start_value=0, start_color="F8696B",
+                           mid_type='num', mid_value=0.5, mid_color="FFEB84",
+                           end_type='num', end_value=1, end_color="63BE7B"))
+        
+    def create_excel_report(self, filename, top_utilizers_df, under_utilized_df, reallocation_df, chart_data=None, retention=None):
         """Create Excel report with full formatting"""
         try:
-            # Create visualizations
-            charts = self.create_visualizations(
-                self.utilized_metrics_df, 
-                top_utilizers_df, 
-                under_utilized_df, 
-                self.full_usage_data, 
-                self.output_folder_path
-            )
+            if chart_data is None:
+                chart_data = self.create_chart_data(
+                    self.utilized_metrics_df,
+                    top_utilizers_df,
+                    self.usage_partitions(set(self.utilized_metrics_df['Email']))
+                )
             
             with pd.ExcelWriter(filename, engine='openpyxl') as writer:
                 # Define columns to include in sheets
@@ -431,41 +779,25 @@ class CopilotAnalyzer:
                         # Apply styling
                         self.style_excel_sheet(writer.sheets[sheet_name], df_to_write)
 
-                # Create Summary & Visualizations sheet with embedded charts
+                # Create Summary & Visualizations sheet with native charts
                 summary_ws = writer.book.create_sheet('Summary & Visualizations')
+                
+                # Add summary statistics as text
+                summary_ws['A1'] = 'Copilot License Evaluation Summary'
+                summary_ws['A1'].font = Font(bold=True, size=16)
+                summary_ws['A3'] = f'Total Users Analyzed: {len(self.utilized_metrics_df)}'
+                summary_ws['A4'] = f'Top Utilizers: {len(top_utilizers_df)}'
+                summary_ws['A5'] = f'Under-Utilized: {len(under_utilized_df)}'
+                summary_ws['A6'] = f'For Reallocation: {len(reallocation_df)}'
+                summary_ws['A7'] = f'Report Generated: {datetime.now().strftime("%B %d, %Y at %I:%M %p")}'
+                
                 try:
-                    from openpyxl.drawing.image import Image as OpenpyxlImage
-                    
-                    # Add summary statistics as text
-                    summary_ws['A1'] = 'Copilot License Evaluation Summary'
-                    summary_ws['A1'].font = Font(bold=True, size=16)
-                    summary_ws['A3'] = f'Total Users Analyzed: {len(self.utilized_metrics_df)}'
-                    summary_ws['A4'] = f'Top Utilizers: {len(top_utilizers_df)}'
-                    summary_ws['A5'] = f'Under-Utilized: {len(under_utilized_df)}'
-                    summary_ws['A6'] = f'For Reallocation: {len(reallocation_df)}'
-                    summary_ws['A7'] = f'Report Generated: {datetime.now().strftime("%B %d, %Y at %I:%M %p")}'
-                    
-                    # Embed charts if they exist
-                    if 'engagement_score_hist' in charts and os.path.exists(charts['engagement_score_hist']):
-                        img1 = OpenpyxlImage(charts['engagement_score_hist'])
-                        img1.width = 600
-                        img1.height = 360
-                        summary_ws.add_image(img1, 'A10')
-                    
-                    if 'top_utilizer_tools' in charts and os.path.exists(charts['top_utilizer_tools']):
-                        img2 = OpenpyxlImage(charts['top_utilizer_tools'])
-                        img2.width = 700
-                        img2.height = 420
-                        summary_ws.add_image(img2, 'A35')
-                    
-                    if 'avg_engagement_trend' in charts and os.path.exists(charts['avg_engagement_trend']):
-                        img3 = OpenpyxlImage(charts['avg_engagement_trend'])
-                        img3.width = 700
-                        img3.height = 360
-                        summary_ws.add_image(img3, 'L10')
-                        
+                    self.add_summary_charts(writer.book, summary_ws, chart_data)
                 except Exception as e:
-                    self.log(f"Error adding images to Excel: {e}")
+                    self.log(f"Error adding charts to Excel: {e}")
+                    
+                if retention is not None:
+                    self.write_retention_sheet(writer, retention)
                     
             self.log(f"Excel report created: {filename}")
             return True
@@ -629,37 +961,299 @@ class CopilotAnalyzer:
             return {}
             
         try:
-            options = {
-                'companies': sorted(self.target_user_data['Company'].dropna().unique().tolist()),
-                'departments': sorted(self.target_user_data['Department'].dropna().unique().tolist()),
-                'locations': sorted(self.target_user_data['City'].dropna().unique().tolist()),
-                'managers': []
-            }
-            
-            # Extract managers from manager lines
-            all_managers = set()
-            for chain in self.target_user_data['ManagerLine'].dropna():
-                managers_in_chain = [m.strip() for m in chain.split('->')]
-                all_managers.update(managers_in_chain)
-            options['managers'] = sorted(list(all_managers))
-            
-            return options
+            dimensions = self.target_user_data[['Company', 'Department', 'City', 'ManagerLine']].astype('category')
+            options = build_filter_options(dimensions)
+            return {key: [entry['value'] for entry in options[key]] for key in ['companies', 'departments', 'locations', 'managers']}
         except Exception as e:
             self.log(f"Error getting filter options: {e}")
             return {}
             
+    def create_org_rollup(self, filename, top_utilizers_df, under_utilized_df, reallocation_df):
+        """Aggregate the analyzed users for every manager subtree and write it as CSV"""
+        if self.target_user_data is None or self.utilized_metrics_df is None or self.utilized_metrics_df.empty:
+            return None
+        classifications = pd.concat([
+            df[['Email', 'Classification']] for df in (top_utilizers_df, under_utilized_df, reallocation_df)
+        ])
+        target = self.target_user_data.assign(Email=self.target_user_data['UserPrincipalName'].str.lower())
+        manager_lines = target.drop_duplicates('Email').set_index('Email')['ManagerLine']
+        
+        users = self.utilized_metrics_df[['Email', 'Engagement Score']].merge(classifications, on='Email', how='left')
+        users['ManagerLine'] = users['Email'].map(manager_lines)
+        rollup_df = build_org_rollup(users)
+        rollup_df.to_csv(filename, index=False)
+        self.log(f"Org rollup created: {filename} ({len(rollup_df)} manager nodes)")
+        return rollup_df
+        
+    def create_aggregate_cube(self, top_utilizers_df, under_utilized_df, reallocation_df):
+        """Aggregate the analyzed users by Company, Department, City, month and classification"""
+        if self.target_user_data is None or self.utilized_metrics_df is None or self.utilized_metrics_df.empty:
+            return None
+        classified = pd.concat([top_utilizers_df, under_utilized_df, reallocation_df])
+        target = self.target_user_data.assign(Email=self.target_user_data['UserPrincipalName'].str.lower())
+        dimensions = target.drop_duplicates('Email')[['Email', 'Company', 'Department', 'City']]
+        users = classified[['Email', 'Classification', 'Engagement Score', 'Usage Consistency (%)',
+                            'Usage Complexity', 'Avg Tools / Report']].merge(dimensions, on='Email', how='left')
+        
+        cube_df = build_aggregate_cube(users, self.usage_partitions(set(users['Email'])), self.tool_columns(), self.report_months())
+        self.log(f"Aggregate cube created: {len(cube_df)} cells")
+        return cube_df
+        
+    def create_retention(self):
+        """Months, cohort sizes and active counts of the analyzed users by first-appearance month (see retention.py)"""
+        metrics = self.utilized_metrics_df
+        if metrics is None or metrics.empty:
+            return None
+        first_report, last_report = self.report_period()
+        first_month = min(metrics['First Appearance'].min(), first_report).to_period('M')
+        emails = metrics['Email'].to_numpy()
+        matrix = build_activity_matrix(self.long_usage_parts(set(emails)), emails, first_month, last_report.to_period('M'))
+        
+        dimensions = None
+        if self.target_user_data is not None:
+            target = self.target_user_data.assign(Email=self.target_user_data['UserPrincipalName'].str.lower())
+            dimensions = metrics[['Email']].merge(target.drop_duplicates('Email')[['Email'] + RETENTION_DIMENSIONS],
+                                                  on='Email', how='left')
+        cohorts, cells = cohort_retention(matrix, metrics['First Appearance'], dimensions)
+        self.log(f"Retention computed: {len(cohorts)} cohort groups from {matrix.nnz} active user-months")
+        return matrix.months, cohorts, cells
+        
+    def record_history(self, run_id, top_utilizers_df, under_utilized_df, reallocation_df, filters=None):
+        """Persist per-user, per-month snapshots of this run to the history store.
+
+        Metrics and the engagement score come from each month's own rows;
+        classification and trend are the run's verdict on the user.
+        """
+        classified = pd.concat([top_utilizers_df, under_utilized_df, reallocation_df])
+        users = classified[['Email', 'Classification', 'Usage Trend']]
+        if self.target_user_data is not None:
+            target = self.target_user_data.assign(Email=self.target_user_data['UserPrincipalName'].str.lower())
+            users = users.merge(target.drop_duplicates('Email')[['Email', 'Company', 'Department', 'City']], on='Email', how='left')
+        else:
+            users = users.assign(Company=None, Department=None, City=None)
+            
+        tool_cols, months = self.tool_columns(), self.report_months()
+        monthly = pd.concat([
+            monthly_metrics(usage_df.reset_index(drop=True), tool_cols, months)
+            for usage_df in self.usage_partitions(set(users['Email']))
+        ], ignore_index=True).merge(users, on='Email', how='inner')
+        maxima = classified[['Usage Consistency (%)', 'Usage Complexity', 'Avg Tools / Report']].max()
+        monthly['Engagement Score'] = scaled_engagement(monthly, maxima)
+        
+        monthly = monthly.rename(columns={
+            'Month': 'period', 'Email': 'user_email', 'Company': 'company', 'Department': 'department',
+            'City': 'city', 'Classification': 'classification', 'Engagement Score': 'engagement_score',
+            'Usage Consistency (%)': 'consistency_percent', 'Usage Complexity': 'complexity_score',
+            'Avg Tools / Report': 'avg_tools_per_report', 'Usage Trend': 'trend', 'Tools Used': 'tools_used'
+        })
+        monthly['quarter'] = monthly['period'].map(quarter_of)
+        monthly['year'] = monthly['period'].str[:4].astype(int)
+        monthly['run_id'] = run_id
+        monthly['active'] = monthly['Active Users'].astype(bool)
+        # Plain Python values with None for missing ones, as the DB drivers expect
+        snapshots = json.loads(monthly[SNAPSHOT_COLUMNS].to_json(orient='records'))
+        
+        store = HistoryStore()
+        try:
+            written = store.record_run(run_id, snapshots, filters)
+        finally:
+            store.close()
+        self.log(f"Recorded {written} history snapshots for run {run_id}")
+        return written
+        
+    def build_tool_masks(self, emails):
+        """Per-user bitmask of tools ever used, one bit per 'Last activity date of' column"""
+        tool_cols = self.tool_columns()
+        tools = [tool_name(col) for col in tool_cols]
+        words = max(1, (len(tool_cols) + 31) // 32)
+        masks = np.zeros((len(emails), words), dtype=np.uint32)
+        if tool_cols:
+            used = pd.concat([
+                usage_df[tool_cols].notna().groupby(usage_df['User Principal Name']).any()
+                for usage_df in self.usage_partitions(set(emails))
+            ])
+            used = used.reindex(emails, fill_value=False).to_numpy(dtype=bool)
+            for bit in range(len(tool_cols)):
+                masks[:, bit // 32] |= used[:, bit].astype(np.uint32) << np.uint32(bit % 32)
+        return tools, masks
+        
+    def create_usage_timeline(self, emails):
+        """Index the raw usage rows by user for per-user timeline lookups"""
+        tool_cols = self.tool_columns()
+        data_path = os.path.join(self.output_folder_path, 'usage_timeline.dat')
+        index_path = os.path.join(self.output_folder_path, 'usage_timeline.idx')
+        rows = write_usage_timeline(self.usage_partitions(set(emails)), tool_cols, data_path, index_path)
+        self.log(f"Usage timeline index created: {rows} rows for {len(emails)} users")
+        return {
+            'version': 1,
+            'tools': [tool_name(col) for col in tool_cols],
+            'data': os.path.basename(data_path),
+            'index': os.path.basename(index_path)
+        }
+        
+    def write_dataset(self, name, payload):
+        """Write a JSON side file next to the reports for the web layer to load on demand"""
+        path = os.path.join(self.output_folder_path, f"{name}.json")
+        with open(path, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        return path
+            
+def compact_user_results(detailed_users):
+    """Columnar per-user results, with repeated strings dictionary-encoded, for cross-session diffs"""
+    def encode(values):
+        table = {}
+        codes = [table.setdefault(value, len(table)) for value in values]
+        return list(table), codes
+        
+    classifications, classification_codes = encode(u['classification'] for u in detailed_users)
+    justifications, justification_codes = encode(u['justification'] for u in detailed_users)
+    trends, trend_codes = encode(u['trend'] for u in detailed_users)
+    return {
+        'version': 1,
+        'emails': [u['email'] for u in detailed_users],
+        'classifications': classifications,
+        'classification': classification_codes,
+        'justifications': justifications,
+        'justification': justification_codes,
+        'trends': trends,
+        'trend': trend_codes,
+        'engagementScore': [round(u['engagementScore'], 4) for u in detailed_users],
+        'consistencyPercent': [round(u['consistencyPercent'], 2) for u in detailed_users]
+    }
+    
+def normalize_report_main(source_path, output_path):
+    """Parse one usage report into a normalized pickle for a later analysis run"""
+    analyzer = CopilotAnalyzer()
+    try:
+        df = analyzer.normalize_usage_report(source_path)
+        # Write under a temporary name so readers never see a partial file
+        tmp_path = f"{output_path}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, output_path)
+        print(json.dumps({'status': 'success', 'rows': len(df), 'output': output_path}))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'message': str(e)}))
+        sys.exit(1)
+        
+def word_report_main(results_path, output_path):
+    """Build the executive Word report from a session's stored results"""
+    # Imported here so analysis runs never load python-docx
+    from word_report import create_word_report
+    analyzer = CopilotAnalyzer()
+    try:
+        with open(results_path) as f:
+            results = json.load(f)
+        users = pd.DataFrame(results.get('detailed_users') or [],
+                             columns=['email', 'engagementScore', 'consistencyPercent', 'lastActivity', 'classification', 'justification'])
+        reallocation = users[users['classification'] == 'For Reallocation'].copy()
+        reallocation['lastActivity'] = pd.to_datetime(reallocation['lastActivity'], errors='coerce')
+        reallocation.sort_values(by=['engagementScore', 'lastActivity'], ascending=[True, True], inplace=True)
+        rows = list(zip(
+            reallocation['email'],
+            reallocation['consistencyPercent'].map('{:.1f}'.format),
+            reallocation['lastActivity'].dt.strftime('%Y-%m-%d').fillna('N/A'),
+            reallocation['justification'].fillna('')
+        ))
+        
+        tools_chart = None
+        charts_path = (results.get('datasets') or {}).get('charts')
+        if charts_path and os.path.exists(charts_path):
+            with open(charts_path) as f:
+                chart_data = json.load(f)
+            images = analyzer.render_chart_images({'topUtilizerTools': chart_data.get('topUtilizerTools')}, os.path.dirname(output_path))
+            tools_chart = images.get('top_utilizer_tools')
+        
+        # Write under a temporary name so readers never see a partial file
+        tmp_path = f"{output_path}.tmp"
+        create_word_report(tmp_path, results['summary'], rows, tools_chart)
+        os.replace(tmp_path, output_path)
+        print(json.dumps({'status': 'success', 'rows': len(rows), 'output': output_path}))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'message': str(e)}))
+        sys.exit(1)
+        
 def main():
     parser = argparse.ArgumentParser(description='Copilot Usage Analyzer')
     parser.add_argument('--target-users', help='Path to target users CSV file')
-    parser.add_argument('--usage-reports', nargs='+', required=True, help='Paths to usage report files')
-    parser.add_argument('--output-dir', required=True, help='Output directory for reports')
+    parser.add_argument('--usage-reports', nargs='+', help='Paths to usage report files')
+    parser.add_argument('--normalized-reports', nargs='+', default=[],
+                        help='Usage reports already normalized by --normalize-report; must lie in the parse cache')
+    parser.add_argument('--output-dir', help='Output directory for reports')
     parser.add_argument('--filters', help='JSON string with filter options')
+    parser.add_argument('--cpu-seconds', type=int, help='CPU time limit for this run')
+    parser.add_argument('--run-id', help='Identifier recorded with this run in the history store')
+    parser.add_argument('--record-history', action='store_true',
+                        help='Store per-user monthly snapshots of this run in the history store (needs --run-id)')
+    parser.add_argument('--history-query', help='JSON history query; prints the result and exits')
+    parser.add_argument('--normalize-report', help='Normalize a single usage report and exit')
+    parser.add_argument('--normalized-output', help='Pickle path written by --normalize-report')
+    parser.add_argument('--out-of-core', action='store_true', help='Spill usage data to disk partitions instead of holding it in memory')
+    parser.add_argument('--spill-dir', help='Directory for out-of-core partitions (default: a temporary directory in --output-dir)')
+    parser.add_argument('--partitions', type=int, default=64, help='Number of out-of-core partitions')
+    parser.add_argument('--workers', type=int, default=1, help='Processes computing per-user metrics in parallel')
+    parser.add_argument('--memory-budget-mb', type=float,
+                        help='Choose in-memory, chunked or out-of-core execution to fit this budget (--workers and --partitions become upper and lower bounds)')
+    parser.add_argument('--plan-execution', action='store_true',
+                        help='Print the execution plan for --usage-reports within --memory-budget-mb and exit')
+    parser.add_argument('--execution-plan', help='Run with this plan (JSON from --plan-execution) instead of planning again')
+    parser.add_argument('--preview', action='store_true', help='Report estimated class sizes from a sample of users before the full analysis')
+    parser.add_argument('--preview-sample', type=int, default=2000, help='Users sampled for --preview')
+    parser.add_argument('--trend-model', choices=TREND_MODELS, default='halves',
+                        help="Usage trend: 'halves' compares distinct tools before and after the midpoint of each user's activity, 'slope' fits distinct tools per month")
+    parser.add_argument('--trend-tolerance', type=float, default=DEFAULT_TREND_TOLERANCE,
+                        help='Tools per month a fitted slope must exceed to count as Increasing or Decreasing (--trend-model slope)')
+    parser.add_argument('--filter-options', help='Print filter options with user counts for a target users CSV and exit')
+    parser.add_argument('--scoring-config', action='store_true', help='Print the scoring version and classification thresholds and exit')
+    parser.add_argument('--word-report', help="Build the executive Word report from a session's results JSON and exit")
+    parser.add_argument('--word-output', help='.docx path written by --word-report')
     
     args = parser.parse_args()
     
+    if args.scoring_config:
+        print(json.dumps({'status': 'success', 'version': SCORING_VERSION, 'thresholds': CLASSIFICATION_THRESHOLDS,
+                          'trend': {'models': list(TREND_MODELS), 'model': 'halves', 'tolerance': DEFAULT_TREND_TOLERANCE}}))
+        return
+    if args.filter_options:
+        filter_options_main(args.filter_options)
+        return
+    if args.history_query:
+        history_query_main(json.loads(args.history_query))
+        return
+    if args.normalize_report:
+        if not args.normalized_output:
+            parser.error('--normalize-report requires --normalized-output')
+        normalize_report_main(args.normalize_report, args.normalized_output)
+        return
+    if args.word_report:
+        if not args.word_output:
+            parser.error('--word-report requires --word-output')
+        word_report_main(args.word_report, args.word_output)
+        return
+    if args.plan_execution:
+        if not args.usage_reports or not args.memory_budget_mb:
+            parser.error('--plan-execution requires --usage-reports and --memory-budget-mb')
+        plan_execution_main(args.usage_reports, args.memory_budget_mb, max(1, args.workers), args.partitions)
+        return
+    if not (args.usage_reports or args.normalized_reports) or not args.output_dir:
+        parser.error('--usage-reports (or --normalized-reports) and --output-dir are required')
+    if args.record_history and not args.run_id:
+        parser.error('--record-history requires --run-id')
+    
+    # The web layer cancels jobs with SIGTERM; unwind cleanly instead of dying mid-write
+    signal.signal(signal.SIGTERM, _raise_cancelled)
+    if args.cpu_seconds:
+        apply_cpu_limit(args.cpu_seconds)
+    
+    analyzer = None
     try:
         analyzer = CopilotAnalyzer()
         analyzer.output_folder_path = args.output_dir
+        analyzer.workers = max(1, args.workers)
+        analyzer.trend_model = args.trend_model
+        analyzer.trend_tolerance = args.trend_tolerance
+        normalized_reports = [normalized_report_path(path) for path in args.normalized_reports]
+        analyzer.normalized_reports = set(normalized_reports)
+        usage_reports = (args.usage_reports or []) + normalized_reports
         
         # Ensure output directory exists
         os.makedirs(args.output_dir, exist_ok=True)
@@ -675,10 +1269,38 @@ def main():
                 filters = json.loads(args.filters)
                 filtered_target_df = analyzer.apply_filters(filters)
                 
+        # Choose how to execute before reading any report body
+        plan = None
+        out_of_core, partitions = args.out_of_core, args.partitions
+        if args.execution_plan or args.memory_budget_mb:
+            if args.execution_plan:
+                plan = json.loads(args.execution_plan)
+            else:
+                plan = plan_execution(usage_reports, args.memory_budget_mb, analyzer.workers, args.partitions,
+                                      analyzer.normalized_reports)
+            if args.out_of_core:
+                plan.update({'strategy': 'spill', 'workers': 1, 'partitions': args.partitions, 'forced': True})
+            analyzer.log(f"Execution plan: {plan['strategy']} (~{plan['estimatedRows']} rows, "
+                         f"estimated peak {plan['estimatedPeakMb'][plan['strategy']]} MB of {plan['memoryBudgetMb']:g} MB)")
+            out_of_core = plan['strategy'] == 'spill'
+            partitions = plan['partitions'] or args.partitions
+            analyzer.workers = plan['workers']
+            analyzer.stream_reports = plan['strategy'] == 'chunked'
+
         # Load usage reports
-        if not analyzer.load_usage_reports(args.usage_reports):
+        spill_dir = None
+        if out_of_core:
+            spill_dir = args.spill_dir or tempfile.mkdtemp(prefix='usage-spill-', dir=args.output_dir)
+        if not analyzer.load_usage_reports(usage_reports, spill_dir, partitions):
             sys.exit(1)
             
+        if args.preview:
+            try:
+                analyzer.progress('preview', **analyzer.preview_users(filtered_target_df, args.preview_sample))
+            except Exception as e:
+                # The exact analysis below still runs (and reports its own errors)
+                analyzer.log(f"Error computing preview: {e}")
+                
         # Perform analysis
         analyzer.log("Starting analysis...")
         top_utilizers_df, under_utilized_df, reallocation_df = analyzer.analyze_users(filtered_target_df)
@@ -688,8 +1310,33 @@ def main():
         excel_filename = os.path.join(args.output_dir, f"{today_str}_Copilot_License_Evaluation.xlsx")
         html_filename = os.path.join(args.output_dir, "leaderboard.html")
         
-        analyzer.create_excel_report(excel_filename, top_utilizers_df, under_utilized_df, reallocation_df)
+        # Chart series are aggregated once: served to the web UI and rendered for the Excel export
+        chart_data = analyzer.create_chart_data(
+            analyzer.utilized_metrics_df, top_utilizers_df, analyzer.usage_partitions(set(analyzer.utilized_metrics_df['Email'])))
+        
+        try:
+            retention = analyzer.create_retention()
+        except Exception as e:
+            # The workbook and the rest of the results do not depend on it
+            analyzer.log(f"Error computing retention: {e}")
+            retention = None
+        
+        analyzer.progress('writing_artifacts', artifacts_written=0, artifacts_total=2)
+        analyzer.create_excel_report(excel_filename, top_utilizers_df, under_utilized_df, reallocation_df, chart_data, retention)
+        analyzer.progress('writing_artifacts', artifacts_written=1, artifacts_total=2)
         analyzer.create_leaderboard_html(html_filename)
+        analyzer.progress('writing_artifacts', artifacts_written=2, artifacts_total=2)
+        
+        org_rollup_filename = os.path.join(args.output_dir, "org_rollup.csv")
+        org_rollup_df = analyzer.create_org_rollup(org_rollup_filename, top_utilizers_df, under_utilized_df, reallocation_df)
+        aggregate_cube_df = analyzer.create_aggregate_cube(top_utilizers_df, under_utilized_df, reallocation_df)
+        if args.record_history:
+            try:
+                analyzer.record_history(args.run_id, top_utilizers_df, under_utilized_df,
+                                        reallocation_df, json.loads(args.filters) if args.filters else None)
+            except Exception as e:
+                # History is best effort; the run's own reports are already written
+                analyzer.log(f"Error recording history: {e}")
         
         # Prepare detailed user data for web interface
         detailed_users = []
@@ -732,18 +1379,46 @@ def main():
                 user_data['justification'] = row['Justification']
                 user_data['riskLevel'] = 'High'
         
-        # Generate tool usage data from usage reports
+        # Generate tool usage data from usage reports. The bitmask index is
+        # written for cohort queries; a user's dense id is their position in
+        # detailed_users.
         tool_usage_data = {}
-        if analyzer.full_usage_data is not None:
-            tool_cols = [col for col in analyzer.full_usage_data.columns if 'Last activity date of' in col]
-            for email in [u['email'] for u in detailed_users]:
-                user_usage = analyzer.full_usage_data[analyzer.full_usage_data['User Principal Name'] == email]
-                tools_used = []
-                for col in tool_cols:
-                    if user_usage[col].notna().any():
-                        tool_name = col.replace('Last activity date of ', '').replace(' (UTC)', '')
-                        tools_used.append(tool_name)
-                tool_usage_data[email] = tools_used
+        datasets = {}
+        if analyzer.has_usage_data():
+            emails = [u['email'] for u in detailed_users]
+            tools, masks = analyzer.build_tool_masks(emails)
+            for email, words in zip(emails, masks):
+                tool_usage_data[email] = [tool for bit, tool in enumerate(tools) if (int(words[bit // 32]) >> (bit % 32)) & 1]
+            datasets['toolIndex'] = analyzer.write_dataset('tool_index', {
+                'version': 1,
+                'tools': tools,
+                'words': int(masks.shape[1]),
+                'emails': emails,
+                'masks': masks.ravel().tolist()
+            })
+            datasets['usageTimeline'] = analyzer.write_dataset('usage_timeline', analyzer.create_usage_timeline(emails))
+        datasets['userResults'] = analyzer.write_dataset('user_results', compact_user_results(detailed_users))
+        datasets['charts'] = analyzer.write_dataset('charts', chart_data)
+        if org_rollup_df is not None:
+            datasets['orgRollup'] = analyzer.write_dataset('org_rollup', {
+                'version': 1,
+                'columns': list(org_rollup_df.columns),
+                'rows': json.loads(org_rollup_df.to_json(orient='values'))
+            })
+        if retention is not None:
+            months, cohorts, cells = retention
+            datasets['retention'] = analyzer.write_dataset('retention', {
+                'version': 1,
+                'months': list(months.strftime('%Y-%m')),
+                'cohorts': {'columns': list(cohorts.columns), 'rows': cohorts.to_numpy().tolist()},
+                'cells': {'columns': list(cells.columns), 'rows': cells.to_numpy().tolist()}
+            })
+        if aggregate_cube_df is not None:
+            datasets['aggregateCube'] = analyzer.write_dataset('aggregate_cube', {
+                'version': 1,
+                'columns': list(aggregate_cube_df.columns),
+                'rows': json.loads(aggregate_cube_df.to_json(orient='values'))
+            })
         
         # Add tool usage to detailed users
         for user_data in detailed_users:
@@ -777,13 +1452,21 @@ def main():
             },
             'files': {
                 'excel': excel_filename,
-                'html': html_filename
+                'html': html_filename,
+                **({'orgRollup': org_rollup_filename} if org_rollup_df is not None else {})
             },
-            'detailed_users': detailed_users
+            'detailed_users': detailed_users,
+            'datasets': datasets,
+            **({'execution_plan': plan} if plan else {})
         }
         
         print(json.dumps(results))
         
+    except AnalysisCancelled as e:
+        message = str(e) or 'Analysis cancelled'
+        status = 'cancelled' if message == 'Analysis cancelled' else 'error'
+        print(json.dumps({'status': status, 'message': message}))
+        sys.exit(128 + signal.SIGTERM)
     except Exception as e:
         error_result = {
             'status': 'error',
@@ -791,6 +1474,9 @@ def main():
         }
         print(json.dumps(error_result))
         sys.exit(1)
+    finally:
+        if analyzer is not None and analyzer.usage_store is not None:
+            analyzer.usage_store.cleanup()
         
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Pick how a run executes from an estimate of its working set.
+
+Each usage report is sized from its header (report_schema) and file size
+alone: the number of mapped columns gives the in-memory width of a row, and
+the average line length of the first block of a CSV (or the sheet dimension of
+a workbook) gives the row count. Peak memory is then estimated for each
+strategy and the first one that fits the budget is chosen:
+
+- ``in_memory``: whole reports are read, concatenated and analyzed by
+  ``workers`` processes (shared-memory copy of the long-format rows included);
+- ``chunked``: CSVs are streamed in chunks into a single in-memory frame
+  (no parse of a whole file at once, no second copy) and analyzed by one
+  process, trading parallelism for a lower peak;
+- ``spill``: rows are spilled to hash partitions on disk and analyzed one
+  partition at a time, with enough partitions for one to fit the budget.
+"""
+import json
+import math
+import os
+import sys
+
+from openpyxl import load_workbook
+
+from report_schema import read_header, match_columns
+
+STRATEGIES = ('in_memory', 'chunked', 'spill')
+MB = 1024 * 1024
+# Interpreter, pandas and report-writing footprint independent of the data
+BASE_MB = 200
+# Wide row: User Principal Name object + string, report date, one datetime per tool
+UPN_BYTES = 88
+DATE_BYTES = 8
+# Long row (out_of_core.to_long): Row, UPN pointer, report date, Tool, activity date
+LONG_ROW_BYTES = 34
+# Share of tool cells holding an activity date, assumed when sizing long rows
+ACTIVITY_SHARE = 0.5
+# Grouped intermediates of compute_user_metrics relative to the long rows
+METRICS_EXPANSION = 3
+# Bytes read from the start of a CSV to estimate its average line length
+SAMPLE_BYTES = 1 * MB
+# Rows per chunk when streaming a CSV (CopilotAnalyzer.iter_usage_report)
+CHUNK_ROWS = 500000
+MAX_PARTITIONS = 4096
+# Tool columns assumed for pre-parsed pickles, whose header is not sniffed
+DEFAULT_TOOLS = 8
+
+
+def estimate_rows(filepath, size):
+    """Data rows in a report, from a sample of its lines or its sheet dimension"""
+    lower = filepath.lower()
+    if lower.endswith('.csv'):
+        with open(filepath, 'rb') as f:
+            sample = f.read(SAMPLE_BYTES)
+        lines = sample.count(b'\n')
+        if len(sample) >= size:
+            # Whole file read: count exactly (a last line without newline counts too)
+            return max(0, lines - 1 + (0 if sample.endswith(b'\n') else 1))
+        header = sample.find(b'\n') + 1
+        return int((size - header) / max(1, (len(sample) - header) / max(1, lines - 1)))
+    if lower.endswith(('.xlsx', '.xlsm')):
+        workbook = load_workbook(filepath, read_only=True)
+        try:
+            return max(0, (workbook.active.max_row or 1) - 1)
+        finally:
+            workbook.close()
+    return None
+
+
+def profile_report(filepath, normalized=False):
+    """Size, row estimate and width of one usage report (``normalized``: a parse-cache pickle)"""
+    size = os.path.getsize(filepath)
+    profile = {'file': os.path.basename(filepath), 'bytes': size}
+    if normalized:
+        # Pickled frames are already in memory layout
+        profile.update({'layout': 'normalized', 'tools': DEFAULT_TOOLS,
+                        'rows': int(size / (UPN_BYTES + DATE_BYTES * (DEFAULT_TOOLS + 1)))})
+        return profile
+    try:
+        schema = match_columns(read_header(filepath))
+        profile.update({'layout': schema.layout, 'tools': len(schema.tool_cols), 'rows': estimate_rows(filepath, size)})
+    except Exception as e:
+        # The loader rejects it again, with the same reason, and skips it
+        profile.update({'layout': None, 'tools': 0, 'rows': 0, 'error': str(e)})
+    if profile['rows'] is None:
+        profile['rows'] = int(size / (UPN_BYTES + DATE_BYTES * (profile['tools'] + 1)))
+    return profile
+
+
+def _mb(value):
+    # Rounded up, so a budget of the reported peak always admits the same plan
+    return math.ceil(value / MB * 10) / 10
+
+
+def plan_execution(filepaths, memory_budget_mb, workers=1, partitions=64, normalized=()):
+    """The execution plan for a run over ``filepaths``: strategy, its settings and the estimates behind it"""
+    reports = [profile_report(filepath, filepath in normalized) for filepath in filepaths]
+    rows = sum(report['rows'] for report in reports)
+    tools = max([report['tools'] for report in reports] + [0])
+    wide_row = UPN_BYTES + DATE_BYTES * (tools + 1)
+    wide = rows * wide_row
+    long_rows = rows * max(1.0, tools * ACTIVITY_SHARE)
+    metrics = long_rows * LONG_ROW_BYTES * METRICS_EXPANSION
+    largest_chunk = max([min(report['rows'], CHUNK_ROWS) for report in reports] + [0]) * wide_row
+    base = BASE_MB * MB
+    budget = memory_budget_mb * MB
+
+    # Loading peaks while the per-report frames, their concatenation and (in
+    # memory) the analyzer's copy of it are all alive; analysis peaks with the
+    # wide rows plus the metrics intermediates, and with several workers the
+    # long rows are also copied to shared memory and out to each shard
+    shared = 2 * long_rows * LONG_ROW_BYTES if workers > 1 else 0
+    in_memory = base + max(3 * wide, wide + metrics + shared)
+    chunked = base + max(2 * wide + largest_chunk, wide + metrics)
+    headroom = budget - base - 2 * largest_chunk
+    if headroom > 0:
+        spill_partitions = min(MAX_PARTITIONS, max(partitions, math.ceil(metrics / headroom)))
+    else:
+        spill_partitions = MAX_PARTITIONS
+    spill = base + 2 * largest_chunk + metrics / spill_partitions
+
+    estimates = {'in_memory': in_memory, 'chunked': chunked, 'spill': spill}
+    strategy = next((name for name in STRATEGIES if estimates[name] <= budget), 'spill')
+    return {
+        'strategy': strategy,
+        'memoryBudgetMb': memory_budget_mb,
+        'workers': workers if strategy == 'in_memory' else 1,
+        'partitions': spill_partitions if strategy == 'spill' else None,
+        'estimatedPeakMb': {name: _mb(value) for name, value in estimates.items()},
+        'estimatedRows': int(rows),
+        'toolColumns': tools,
+        'reports': reports
+    }
+
+
+def plan_execution_main(filepaths, memory_budget_mb, workers=1, partitions=64):
+    """Print the execution plan for the web layer, which reserves its estimated peak before the run"""
+    try:
+        print(json.dumps({'status': 'success', **plan_execution(filepaths, memory_budget_mb, workers, partitions)}))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'message': str(e)}))
+        sys.exit(1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Filter picker options (with user counts) for a target user file.
+
+The dimension columns are read as categoricals, so every count is a reduction
+over category codes. Manager chains repeat across everyone reporting into the
+same line, so each distinct chain is split once and its managers are credited
+with the number of users on that chain.
+"""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+TARGET_COLUMNS = ['UserPrincipalName', 'Company', 'Department', 'City', 'ManagerLine']
+DIMENSIONS = {'companies': 'Company', 'departments': 'Department', 'locations': 'City'}
+
+
+def read_target_dimensions(filepath):
+    """The target file's filterable columns, as categoricals"""
+    header = pd.read_csv(filepath, nrows=0).columns
+    missing = [col for col in TARGET_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"Target user file missing required columns: {missing}")
+    return pd.read_csv(filepath, usecols=TARGET_COLUMNS[1:], dtype='category')
+
+
+def _entries(counts):
+    counts = counts[counts > 0].sort_index()
+    return [{'value': str(value), 'count': int(count)} for value, count in counts.items()]
+
+
+def manager_counts(manager_lines):
+    """Users under each manager named anywhere in their 'A -> B -> C' chain"""
+    chains = manager_lines.value_counts()
+    chains = chains[chains > 0]
+    if chains.empty:
+        return pd.Series(dtype='int64')
+    parts = pd.Series(chains.index.astype(str)).str.split('->').explode()
+    # Names are stripped once per distinct spelling, not once per occurrence
+    codes, spellings = pd.factorize(parts.to_numpy())
+    stripped, managers = pd.factorize(pd.Index(spellings).str.strip())
+    codes = stripped[codes]
+    # A manager listed twice in one chain still counts its users once
+    pairs = np.unique(parts.index.to_numpy(dtype=np.int64) * len(managers) + codes)
+    chain, codes = np.divmod(pairs, len(managers))
+    users = np.bincount(codes, weights=chains.to_numpy()[chain], minlength=len(managers)).astype(np.int64)
+    counts = pd.Series(users, index=managers)
+    return counts[counts.index != '']
+
+
+def build_filter_options(dimensions):
+    """Sorted option lists with user counts for each filter picker"""
+    options = {'version': 1, 'users': len(dimensions)}
+    for key, column in DIMENSIONS.items():
+        options[key] = _entries(dimensions[column].value_counts())
+    options['managers'] = _entries(manager_counts(dimensions['ManagerLine']))
+    return options
+
+
+def filter_options_main(filepath):
+    """Print the filter options of a target user file for the web layer"""
+    try:
+        print(json.dumps({'status': 'success', **build_filter_options(read_target_dimensions(filepath))}))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'message': str(e)}))
+        sys.exit(1)
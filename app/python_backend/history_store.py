@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Longitudinal store of per-user, per-month metric snapshots.
+
+Every recorded analysis run (``--record-history``) stores one row per
+analyzed user and report month, so trend questions ("how did Sales engagement
+move quarter over quarter?") are answered from the store instead of
+re-parsing every report. A row's metrics and engagement score come from that
+month's activity alone; its classification and trend are the run's verdict on
+the user as of the run's last report month. Snapshots are kept per run and
+never overwritten: each (month, user) is read from the earliest-ending run
+that covers it (the most recent such run on a tie). A later run over a
+longer window therefore does not restate earlier quarters, and a filtered run
+only adds the users it analyzed. The layout
+matches the ``AnalysisRun`` / ``UserPeriodMetric`` models in
+``prisma/schema.prisma``: PostgreSQL when ``HISTORY_DATABASE_URL`` (or
+``DATABASE_URL``) points at one, otherwise a local SQLite file.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+# Runtime state lives under temp/ (APP_TEMP_DIR) with the web layer's caches and sessions
+TEMP_ROOT = os.environ.get('APP_TEMP_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp')
+DEFAULT_SQLITE_PATH = os.path.join(TEMP_ROOT, 'history', 'history.sqlite3')
+
+GRANULARITIES = {'month': 'period', 'quarter': 'quarter', 'year': 'year'}
+GROUP_COLUMNS = {'company': 'company', 'department': 'department', 'city': 'city', 'classification': 'classification'}
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS analysis_runs (
+        id TEXT PRIMARY KEY,
+        created_at TIMESTAMP NOT NULL,
+        period_start TEXT NOT NULL,
+        period_end TEXT NOT NULL,
+        user_count INTEGER NOT NULL,
+        filters TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_period_metrics (
+        period TEXT NOT NULL,
+        quarter TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        user_email TEXT NOT NULL,
+        run_id TEXT NOT NULL REFERENCES analysis_runs(id) ON DELETE CASCADE,
+        company TEXT,
+        department TEXT,
+        city TEXT,
+        classification TEXT NOT NULL,
+        engagement_score DOUBLE PRECISION NOT NULL,
+        consistency_percent DOUBLE PRECISION NOT NULL,
+        complexity_score DOUBLE PRECISION NOT NULL,
+        avg_tools_per_report DOUBLE PRECISION NOT NULL,
+        trend TEXT NOT NULL,
+        tools_used INTEGER NOT NULL,
+        active BOOLEAN NOT NULL,
+        PRIMARY KEY (run_id, period, user_email)
+    )""",
+    "CREATE INDEX IF NOT EXISTS user_period_metrics_period_department_idx ON user_period_metrics (period, department)",
+    "CREATE INDEX IF NOT EXISTS user_period_metrics_period_user_email_idx ON user_period_metrics (period, user_email)",
+    "CREATE INDEX IF NOT EXISTS user_period_metrics_run_id_idx ON user_period_metrics (run_id)"
+]
+
+SNAPSHOT_COLUMNS = [
+    'period', 'quarter', 'year', 'user_email', 'run_id', 'company', 'department', 'city',
+    'classification', 'engagement_score', 'consistency_percent', 'complexity_score',
+    'avg_tools_per_report', 'trend', 'tools_used', 'active'
+]
+
+
+def quarter_of(period):
+    """'2024-05' -> '2024-Q2'"""
+    year, month = period.split('-')
+    return f"{year}-Q{(int(month) - 1) // 3 + 1}"
+
+
+class HistoryStore:
+    def __init__(self, url=None):
+        url = url or os.environ.get('HISTORY_DATABASE_URL') or os.environ.get('DATABASE_URL') or ''
+        if url.startswith(('postgres://', 'postgresql://')):
+            import psycopg2  # optional; only needed for the PostgreSQL backend
+            self.connection = psycopg2.connect(url)
+            self.placeholder = '%s'
+        else:
+            path = url[len('file:'):] if url.startswith('file:') else DEFAULT_SQLITE_PATH
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path)
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            self.placeholder = '?'
+        self.ensure_schema()
+
+    def close(self):
+        self.connection.close()
+
+    def _sql(self, statement):
+        return statement.replace('?', self.placeholder)
+
+    def ensure_schema(self):
+        cursor = self.connection.cursor()
+        if self.placeholder == '?':
+            self._migrate_sqlite(cursor)
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        self.connection.commit()
+
+    def _migrate_sqlite(self, cursor):
+        """Rekey stores created when snapshots were keyed by (period, user) alone; their rows are kept"""
+        cursor.execute("PRAGMA table_info(user_period_metrics)")
+        key = [row[1] for row in sorted(cursor.fetchall(), key=lambda row: row[5]) if row[5]]
+        if not key or 'run_id' in key:
+            return
+        cursor.execute("ALTER TABLE user_period_metrics RENAME TO user_period_metrics_v1")
+        cursor.execute("DROP INDEX IF EXISTS user_period_metrics_period_department_idx")
+        cursor.execute("DROP INDEX IF EXISTS user_period_metrics_run_id_idx")
+        cursor.execute(SCHEMA[1])
+        cursor.execute(f"INSERT INTO user_period_metrics ({', '.join(SNAPSHOT_COLUMNS)}) "
+                       f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM user_period_metrics_v1")
+        cursor.execute("DROP TABLE user_period_metrics_v1")
+
+    def record_run(self, run_id, snapshots, filters=None):
+        """Store a run's snapshot rows in one transaction, alongside those of earlier runs"""
+        if not snapshots:
+            return 0
+        periods = sorted({row['period'] for row in snapshots})
+        users = {row['user_email'] for row in snapshots}
+        placeholders = ', '.join('?' for _ in SNAPSHOT_COLUMNS)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(self._sql(
+                "INSERT INTO analysis_runs (id, created_at, period_start, period_end, user_count, filters) VALUES (?, ?, ?, ?, ?, ?)"
+            ), (run_id, datetime.now().isoformat(), periods[0], periods[-1], len(users), json.dumps(filters or {})))
+            cursor.executemany(self._sql(
+                f"INSERT INTO user_period_metrics ({', '.join(SNAPSHOT_COLUMNS)}) VALUES ({placeholders})"
+            ), [tuple(row[column] for column in SNAPSHOT_COLUMNS) for row in snapshots])
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return len(snapshots)
+
+    def query_trends(self, granularity='month', group_by=None, filters=None, period_from=None, period_to=None):
+        """Aggregate snapshots per period bucket (month/quarter/year), optionally per dimension"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}'")
+        if group_by and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Unknown group '{group_by}'")
+        bucket = GRANULARITIES[granularity]
+        group_column = GROUP_COLUMNS.get(group_by) if group_by else None
+
+        where, params = self._filters(filters, period_from, period_to)
+        select = [f"{bucket} AS bucket"] + ([f"{group_column} AS grp"] if group_column else [])
+        group = ['bucket'] + (['grp'] if group_column else [])
+        statement = f"""
+            {self._snapshots(where)}
+            SELECT {', '.join(select)},
+                COUNT(DISTINCT user_email) AS users,
+                COUNT(DISTINCT CASE WHEN active THEN user_email END) AS active_users,
+                AVG(engagement_score) AS mean_engagement,
+                AVG(consistency_percent) AS mean_consistency,
+                AVG(CASE WHEN active THEN tools_used END) AS mean_tools_per_active_user,
+                COUNT(DISTINCT CASE WHEN classification = 'Top Utilizer' THEN user_email END) AS top_utilizers,
+                COUNT(DISTINCT CASE WHEN classification = 'Under-Utilized' THEN user_email END) AS under_utilized,
+                COUNT(DISTINCT CASE WHEN classification = 'For Reallocation' THEN user_email END) AS for_reallocation
+            FROM snapshots
+            GROUP BY {', '.join(group)}
+            ORDER BY {', '.join(group)}
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(self._sql(statement), params)
+        columns = [description[0] for description in cursor.description]
+        rows = []
+        for values in cursor.fetchall():
+            row = dict(zip(columns, values))
+            # GROUP is reserved in SQL, hence the short aliases
+            row['period'] = row.pop('bucket')
+            if group_column:
+                row[group_by] = row.pop('grp')
+            for key in ('mean_engagement', 'mean_consistency', 'mean_tools_per_active_user'):
+                if row[key] is not None:
+                    row[key] = round(float(row[key]), 3)
+            rows.append(row)
+        return rows
+
+    def user_timeline(self, user_email, period_from=None, period_to=None):
+        """Every stored snapshot for one user, oldest first"""
+        where, params = self._filters({}, period_from, period_to)
+        where = f"{where} AND m.user_email = ?" if where else "WHERE m.user_email = ?"
+        cursor = self.connection.cursor()
+        cursor.execute(self._sql(
+            f"{self._snapshots(where)} SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM snapshots ORDER BY period"
+        ), params + [user_email.lower()])
+        return [dict(zip(SNAPSHOT_COLUMNS, values)) for values in cursor.fetchall()]
+
+    def _snapshots(self, where):
+        """``snapshots`` CTE: the snapshot each (period, user) is read from, among the rows matching ``where``"""
+        columns = ', '.join(f"m.{column}" for column in SNAPSHOT_COLUMNS)
+        return f"""WITH ranked AS (
+                SELECT {columns}, ROW_NUMBER() OVER (
+                    PARTITION BY m.period, m.user_email ORDER BY r.period_end, r.created_at DESC
+                ) AS pick
+                FROM user_period_metrics m JOIN analysis_runs r ON r.id = m.run_id
+                {where}
+            ),
+            snapshots AS (SELECT * FROM ranked WHERE pick = 1)"""
+
+    def _filters(self, filters, period_from, period_to):
+        clauses, params = [], []
+        if period_from:
+            clauses.append("m.period >= ?")
+            params.append(period_from)
+        if period_to:
+            clauses.append("m.period <= ?")
+            params.append(period_to)
+        for key, values in (filters or {}).items():
+            if key not in GROUP_COLUMNS or not values:
+                continue
+            clauses.append(f"m.{GROUP_COLUMNS[key]} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def history_query_main(query):
+    """Answer a JSON history query from the web layer and print the result"""
+    store = None
+    try:
+        store = HistoryStore()
+        if query.get('user'):
+            rows = store.user_timeline(query['user'], query.get('from'), query.get('to'))
+        else:
+            rows = store.query_trends(
+                granularity=query.get('granularity', 'month'),
+                group_by=query.get('groupBy'),
+                filters=query.get('filters'),
+                period_from=query.get('from'),
+                period_to=query.get('to')
+            )
+        print(json.dumps({'status': 'success', 'rows': rows}))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'message': str(e)}))
+        raise SystemExit(1)
+    finally:
+        if store is not None:
+            store.close()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Engagement rollups for every manager subtree in the ManagerLine hierarchy.
+
+Users are sorted by their manager chain once, which makes every subtree a
+contiguous range of rows. A single scan over the sorted chains opens and
+closes those ranges, and per-node counts and means then come from prefix
+sums in O(1); only the median needs to look at the range itself.
+"""
+import numpy as np
+import pandas as pd
+
+CLASSIFICATIONS = ['Top Utilizer', 'Under-Utilized', 'For Reallocation']
+# Licenses that can be taken back from a subtree without further review
+RECLAIMABLE_CLASSIFICATION = 'For Reallocation'
+ROOT_LABEL = '(All users)'
+PATH_SEPARATOR = ' -> '
+
+ROLLUP_COLUMNS = [
+    'Manager', 'Path', 'Depth', 'Users', 'Direct Users',
+    'Top Utilizers', 'Under-Utilized', 'For Reallocation',
+    'Mean Engagement', 'Median Engagement', 'Reclaimable Licenses'
+]
+
+
+def parse_manager_line(value):
+    """Split 'A -> B -> C' into ('A', 'B', 'C'); missing chains become ()"""
+    if not isinstance(value, str):
+        return ()
+    return tuple(part.strip() for part in value.split('->') if part.strip())
+
+
+def _subtree_ranges(paths):
+    """Return [(path, start, end, direct_users)] for every node, in DFS order.
+
+    ``paths`` must be sorted. A node's users are rows ``start:end``; the stack
+    holds the currently open chain, so each row only touches the levels where
+    its chain differs from the previous one.
+    """
+    nodes = []
+    stack = []
+    for row, path in enumerate(paths):
+        shared = 0
+        while shared < len(stack) and shared < len(path) and nodes[stack[shared]][0][shared] == path[shared]:
+            shared += 1
+        for node in stack[shared:]:
+            nodes[node][2] = row
+        del stack[shared:]
+        for depth in range(shared, len(path)):
+            nodes.append([path[:depth + 1], row, None, 0])
+            stack.append(len(nodes) - 1)
+        if path:
+            nodes[stack[-1]][3] += 1
+    for node in stack:
+        nodes[node][2] = len(paths)
+    return nodes
+
+
+def build_org_rollup(users):
+    """Aggregate users (Email, ManagerLine, Classification, Engagement Score) per subtree"""
+    paths = [parse_manager_line(value) for value in users['ManagerLine']]
+    order = sorted(range(len(paths)), key=paths.__getitem__)
+    paths = [paths[i] for i in order]
+    engagement = users['Engagement Score'].to_numpy(dtype=float)[order]
+    classification = users['Classification'].to_numpy()[order]
+
+    def prefix(values):
+        return np.concatenate(([0], np.cumsum(values)))
+
+    class_sums = {label: prefix(classification == label) for label in CLASSIFICATIONS}
+    engagement_sums = prefix(np.nan_to_num(engagement))
+    engagement_counts = prefix(~np.isnan(engagement))
+
+    def summarize(manager, path, start, end, direct):
+        scores = engagement[start:end]
+        scored = engagement_counts[end] - engagement_counts[start]
+        return {
+            'Manager': manager,
+            'Path': PATH_SEPARATOR.join(path),
+            'Depth': len(path),
+            'Users': end - start,
+            'Direct Users': direct,
+            'Top Utilizers': int(class_sums['Top Utilizer'][end] - class_sums['Top Utilizer'][start]),
+            'Under-Utilized': int(class_sums['Under-Utilized'][end] - class_sums['Under-Utilized'][start]),
+            'For Reallocation': int(class_sums['For Reallocation'][end] - class_sums['For Reallocation'][start]),
+            'Mean Engagement': round((engagement_sums[end] - engagement_sums[start]) / scored, 3) if scored else None,
+            'Median Engagement': round(float(np.nanmedian(scores)), 3) if scored else None,
+            'Reclaimable Licenses': int(class_sums[RECLAIMABLE_CLASSIFICATION][end] - class_sums[RECLAIMABLE_CLASSIFICATION][start])
+        }
+
+    rows = [summarize(ROOT_LABEL, (), 0, len(paths), sum(1 for path in paths if not path))]
+    for path, start, end, direct in _subtree_ranges(paths):
+        rows.append(summarize(path[-1], path, start, end, direct))
+    return pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
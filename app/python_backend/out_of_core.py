@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Out-of-core storage and per-user metrics for usage data larger than memory.
+
+Normalized usage rows are spilled in long format, one row per (report row,
+tool with activity) plus one row for report rows without any activity,
+into ``partitions`` files bucketed by a hash of the User Principal Name.
+Every user lands in exactly one partition, so per-user metrics are computed
+one partition at a time and only the per-user results are kept in memory.
+"""
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+UPN = 'User Principal Name'
+REPORT_DATE = 'Report Refresh Date'
+NO_TOOL = -1
+# 'halves' compares distinct tools before and after the midpoint of a user's
+# activity span; 'slope' fits a least-squares line to distinct tools per month
+TREND_MODELS = ('halves', 'slope')
+# Distinct tools per month a fitted slope must exceed to count as a change
+DEFAULT_TREND_TOLERANCE = 0.1
+
+
+class PartitionedUsageStore:
+    def __init__(self, directory, partitions=64):
+        self.directory = directory
+        self.partitions = partitions
+        self.tool_cols = []
+        self.rows = 0
+        self.min_report_date = None
+        self.max_report_date = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, bucket):
+        return os.path.join(self.directory, f"part-{bucket:04d}.pkl")
+
+    def append(self, df, tool_cols=None):
+        """Spill one normalized (wide) usage frame; each bucket's rows are appended as a pickle frame"""
+        if tool_cols is None:
+            tool_cols = [col for col in df.columns if 'Last activity date of' in col]
+        for col in tool_cols:
+            if col not in self.tool_cols:
+                self.tool_cols.append(col)
+        codes = np.array([self.tool_cols.index(col) for col in tool_cols], dtype=np.int16)
+
+        report_dates = df[REPORT_DATE]
+        if report_dates.notna().any():
+            self.min_report_date = min(filter(pd.notna, [self.min_report_date, report_dates.min()]))
+            self.max_report_date = max(filter(pd.notna, [self.max_report_date, report_dates.max()]))
+
+        long_df = to_long(df, tool_cols, codes, first_row=self.rows)
+        self.rows += len(df)
+        buckets = pd.util.hash_pandas_object(long_df[UPN], index=False).to_numpy() % self.partitions
+        for bucket, part in long_df.groupby(buckets, sort=False):
+            with open(self._path(bucket), 'ab') as f:
+                pickle.dump(part, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def partition(self, bucket):
+        """Long-format rows of one bucket, or None when it is empty"""
+        if not os.path.exists(self._path(bucket)):
+            return None
+        frames = []
+        with open(self._path(bucket), 'rb') as f:
+            while True:
+                try:
+                    frames.append(pickle.load(f))
+                except EOFError:
+                    break
+        return pd.concat(frames, ignore_index=True)
+
+    def wide_partitions(self, emails=None):
+        """Rebuild the wide report rows (User Principal Name, Report Refresh Date, tool columns) per partition"""
+        for bucket in range(self.partitions):
+            long_df = self.partition(bucket)
+            if long_df is not None and emails is not None:
+                long_df = long_df[long_df[UPN].isin(emails)]
+            if long_df is not None and not long_df.empty:
+                yield to_wide(long_df, self.tool_cols)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def to_long(df, tool_cols, codes=None, first_row=0):
+    """Wide usage rows -> long rows (Row, User Principal Name, Report Refresh Date, Tool, Activity Date).
+
+    ``Tool`` holds ``codes[i]`` for ``tool_cols[i]`` (default: ``i``), or NO_TOOL
+    for a report row without any activity.
+    """
+    if codes is None:
+        codes = np.arange(len(tool_cols), dtype=np.int16)
+    row_ids = np.arange(first_row, first_row + len(df), dtype=np.int64)
+    users = df[UPN].to_numpy()
+    reports = df[REPORT_DATE].to_numpy(dtype='datetime64[ns]')
+    dates = df[tool_cols].to_numpy(dtype='datetime64[ns]')
+    present = ~np.isnat(dates)
+    rows, columns = np.nonzero(present)
+    idle = np.flatnonzero(~present.any(axis=1))
+
+    return pd.DataFrame({
+        'Row': np.concatenate([row_ids[rows], row_ids[idle]]),
+        UPN: np.concatenate([users[rows], users[idle]]),
+        REPORT_DATE: np.concatenate([reports[rows], reports[idle]]),
+        'Tool': np.concatenate([codes[columns], np.full(len(idle), NO_TOOL, dtype=np.int16)]),
+        'Activity Date': np.concatenate([dates[rows, columns], np.full(len(idle), np.datetime64('NaT'), dtype='datetime64[ns]')])
+    })
+
+
+def to_wide(long_df, tool_cols):
+    """Inverse of the spill: one row per original report row, in ingestion order"""
+    reports = long_df.drop_duplicates('Row').set_index('Row')[[UPN, REPORT_DATE]]
+    activity = long_df[long_df['Tool'] != NO_TOOL]
+    dates = activity.pivot(index='Row', columns='Tool', values='Activity Date')
+    dates.columns = [tool_cols[code] for code in dates.columns]
+    wide = reports.join(dates).sort_index().reset_index(drop=True)
+    return wide.reindex(columns=[UPN, REPORT_DATE] + tool_cols)
+
+
+def halves_trend(activity, first_activity, last_activity):
+    """Increasing/Stable/Decreasing per user from distinct tools used after the midpoint of their activity span vs. up to it"""
+    midpoint = first_activity + (last_activity - first_activity) / 2
+    later = activity['Activity Date'] > activity[UPN].map(midpoint)
+    halves = activity.groupby([activity[UPN], later])['Tool'].nunique().unstack(fill_value=0)
+    halves = halves.reindex(columns=[False, True], fill_value=0)
+    return pd.Series(np.select([halves[True] > halves[False], halves[True] < halves[False]],
+                               ['Increasing', 'Decreasing'], 'Stable'), index=halves.index)
+
+
+def slope_trend(activity, tolerance=DEFAULT_TREND_TOLERANCE):
+    """Increasing/Stable/Decreasing per user from the least-squares slope of distinct tools per month.
+
+    Counts go into a dense (users x months) matrix; each user's fit covers the
+    months from their first to their last activity (idle months count as 0) and
+    all slopes come from the closed-form sums at once.
+    """
+    codes, users = pd.factorize(activity[UPN])
+    months = activity['Activity Date'].to_numpy(dtype='datetime64[M]').astype(np.int64)
+    months -= months.min()
+    width = int(months.max()) + 1
+    cells = pd.DataFrame({'cell': codes * width + months, 'Tool': activity['Tool'].to_numpy()}).drop_duplicates()
+    counts = np.bincount(cells['cell'].to_numpy(), minlength=len(users) * width).reshape(len(users), width).astype(float)
+
+    x = np.arange(width, dtype=float)
+    active = counts > 0
+    first = active.argmax(axis=1)
+    last = width - 1 - active[:, ::-1].argmax(axis=1)
+    span = (x >= first[:, None]) & (x <= last[:, None])
+    n = span.sum(axis=1)
+    sum_x = span @ x
+    sum_xx = span @ (x * x)
+    denominator = n * sum_xx - sum_x ** 2
+    numerator = n * (counts @ x) - sum_x * counts.sum(axis=1)
+    slope = np.divide(numerator, denominator, out=np.zeros(len(users)), where=denominator > 0)
+    return pd.Series(np.select([slope > tolerance, slope < -tolerance], ['Increasing', 'Decreasing'], 'Stable'),
+                     index=users)
+
+
+def compute_user_metrics(long_df, total_months_in_period, trend_model='halves', trend_tolerance=DEFAULT_TREND_TOLERANCE):
+    """Per-user metrics (one row per user) from long-format usage rows; every user must be wholly inside long_df"""
+    reports = long_df.groupby(UPN)[REPORT_DATE]
+    metrics = pd.DataFrame({'Appearances': reports.nunique(), 'First Report': reports.min()})
+
+    activity = long_df[long_df['Tool'] != NO_TOOL].assign(Month=lambda df: df['Activity Date'].dt.to_period('M'))
+    by_user = activity.groupby(UPN)
+    first_activity = by_user['Activity Date'].min()
+    last_activity = by_user['Activity Date'].max()
+    distinct_dates = by_user['Activity Date'].nunique()
+    active_months = by_user['Month'].nunique()
+    complexity = by_user['Tool'].nunique()
+    avg_tools = activity.groupby([UPN, 'Month'])['Tool'].nunique().groupby(level=0).mean()
+
+    if activity.empty:
+        trend = pd.Series(dtype=object)
+    elif trend_model == 'slope':
+        trend = slope_trend(activity, trend_tolerance)
+    else:
+        trend = halves_trend(activity, first_activity, last_activity)
+    trend = trend.where(distinct_dates.reindex(trend.index) > 1, 'N/A')
+
+    index = metrics.index
+    active_months = active_months.reindex(index, fill_value=0)
+    return pd.DataFrame({
+        'Email': index,
+        'Usage Consistency (%)': (active_months / total_months_in_period * 100 if total_months_in_period > 0 else 0.0),
+        'Overall Recency': last_activity.reindex(index),
+        'Usage Complexity': complexity.reindex(index, fill_value=0),
+        'Avg Tools / Report': avg_tools.reindex(index, fill_value=0),
+        'Usage Trend': trend.reindex(index, fill_value='N/A'),
+        'Appearances': metrics['Appearances'],
+        'First Appearance': first_activity.reindex(index).fillna(metrics['First Report'])
+    }).reset_index(drop=True)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Map-reduce computation of per-user metrics across a process pool.
+
+Long-format usage rows are sharded by a hash of the User Principal Name, so
+every user's rows land in a single shard. Users are replaced by integer
+codes, and the shard-ordered columns are copied once into shared memory
+blocks. Workers get block names plus their row range, never a pickled
+DataFrame, and return only the raw per-user metrics of their shard. The
+caller then applies the global normalization and classification.
+"""
+import multiprocessing
+import signal
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from out_of_core import DEFAULT_TREND_TOLERANCE, REPORT_DATE, UPN, compute_user_metrics
+
+# More shards than workers keeps the pool busy when shard sizes vary
+SHARDS_PER_WORKER = 4
+
+
+def _restore_default_signals():
+    # Workers inherit the analyzer's SIGTERM handler; the pool stops them with SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _shard_metrics(task):
+    blocks, start, end, total_months_in_period, trend_model, trend_tolerance = task
+    attached = []
+    try:
+        columns = {}
+        for name, (block_name, dtype, length) in blocks.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            attached.append(block)
+            # Copied out so no view into the block outlives close()
+            columns[name] = np.ndarray(length, dtype=dtype, buffer=block.buf)[start:end].copy()
+        long_df = pd.DataFrame({
+            UPN: columns[UPN],
+            REPORT_DATE: columns[REPORT_DATE].view('datetime64[ns]'),
+            'Tool': columns['Tool'],
+            'Activity Date': columns['Activity Date'].view('datetime64[ns]')
+        })
+        return compute_user_metrics(long_df, total_months_in_period, trend_model, trend_tolerance)
+    finally:
+        for block in attached:
+            block.close()
+
+
+def parallel_user_metrics(long_df, total_months_in_period, workers, on_shard_done=None,
+                          trend_model='halves', trend_tolerance=DEFAULT_TREND_TOLERANCE):
+    """Per-user metrics for ``long_df`` (see out_of_core.to_long), computed by ``workers`` processes"""
+    user_codes, emails = pd.factorize(long_df[UPN])
+    shards = workers * SHARDS_PER_WORKER
+    user_shards = pd.util.hash_pandas_object(pd.Series(emails), index=False).to_numpy() % shards
+    row_shards = user_shards[user_codes]
+    order = np.argsort(row_shards, kind='stable')
+    bounds = np.searchsorted(row_shards[order], np.arange(shards + 1))
+
+    arrays = {
+        UPN: user_codes.astype(np.int32)[order],
+        REPORT_DATE: long_df[REPORT_DATE].to_numpy(dtype='datetime64[ns]').view(np.int64)[order],
+        'Tool': long_df['Tool'].to_numpy(dtype=np.int16)[order],
+        'Activity Date': long_df['Activity Date'].to_numpy(dtype='datetime64[ns]').view(np.int64)[order]
+    }
+    created = []
+    try:
+        blocks = {}
+        for name, values in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            created.append(block)
+            np.ndarray(len(values), dtype=values.dtype, buffer=block.buf)[:] = values
+            blocks[name] = (block.name, values.dtype.str, len(values))
+        del arrays
+
+        tasks = [(blocks, bounds[shard], bounds[shard + 1], total_months_in_period, trend_model, trend_tolerance)
+                 for shard in range(shards) if bounds[shard + 1] > bounds[shard]]
+        results = []
+        users_done = 0
+        with multiprocessing.get_context('fork').Pool(workers, initializer=_restore_default_signals) as pool:
+            for metrics in pool.imap_unordered(_shard_metrics, tasks):
+                results.append(metrics)
+                users_done += len(metrics)
+                if on_shard_done:
+                    on_shard_done(users_done, len(emails))
+    finally:
+        for block in created:
+            block.close()
+            block.unlink()
+
+    metrics_df = pd.concat(results, ignore_index=True)
+    metrics_df['Email'] = np.asarray(emails)[metrics_df['Email'].to_numpy()]
+    return metrics_df
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Estimated class sizes from a sample of users, for a preview ahead of the full run.
+
+In memory, users are drawn by stratified random sampling (one stratum per
+Company / Department of the target list, proportional allocation) and class
+totals use the stratified estimator. Out of core, every spilled partition is
+already a random cluster of users (bucketed by hash), so whole partitions are
+analyzed and totals use the cluster estimator. Both report normal-approximation
+confidence intervals, clipped to the possible range.
+"""
+import numpy as np
+import pandas as pd
+
+CLASSES = {
+    'top_utilizers': 'Top Utilizer',
+    'under_utilized': 'Under-Utilized',
+    'for_reallocation': 'For Reallocation'
+}
+Z_95 = 1.959964
+# Each stratum gets at least this many sampled users, so its variance is defined
+MIN_PER_STRATUM = 2
+
+
+def stratified_sample(strata, sample_size, seed=0):
+    """Sample emails from ``strata`` (stratum label indexed by email), allocated proportionally"""
+    rng = np.random.default_rng(seed)
+    sizes = strata.value_counts()
+    allocation = np.maximum(np.round(sizes * sample_size / max(len(strata), 1)), MIN_PER_STRATUM)
+    allocation = np.minimum(allocation, sizes).astype(int)
+    sampled = []
+    for stratum, emails in strata.groupby(strata).groups.items():
+        sampled.extend(rng.choice(np.asarray(emails), allocation[stratum], replace=False))
+    return sampled
+
+
+def _interval(estimate, variance, population):
+    margin = Z_95 * np.sqrt(max(variance, 0.0))
+    return {
+        'estimate': int(round(estimate)),
+        'low': int(max(0, np.floor(estimate - margin))),
+        'high': int(min(population, np.ceil(estimate + margin)))
+    }
+
+
+def stratified_estimate(strata, sampled_classes):
+    """Class totals from a stratified sample.
+
+    ``strata`` labels every user in the population; ``sampled_classes`` maps
+    sampled emails to their classification.
+    """
+    population = len(strata)
+    sizes = strata.value_counts()
+    sample = pd.DataFrame({'stratum': strata.reindex(sampled_classes.index).to_numpy(),
+                           'classification': sampled_classes.to_numpy()})
+    counts = pd.crosstab(sample['stratum'], sample['classification'])
+    taken = counts.sum(axis=1)
+    weights = sizes.reindex(counts.index)
+
+    estimates = {}
+    for key, label in CLASSES.items():
+        p = (counts[label] if label in counts else pd.Series(0, index=counts.index)) / taken
+        # Finite population correction; strata sampled in full contribute no variance
+        variance = (weights ** 2 * (1 - taken / weights) * p * (1 - p) / (taken - 1).clip(lower=1)).sum()
+        estimates[key] = _interval((weights * p).sum(), variance, population)
+    return population, estimates
+
+
+def cluster_estimate(cluster_classes, clusters_total):
+    """Class totals from ``cluster_classes`` (one classification Series per sampled cluster) of ``clusters_total``"""
+    sampled = len(cluster_classes)
+    totals = pd.DataFrame([classes.value_counts() for classes in cluster_classes]).fillna(0)
+    sizes = np.array([len(classes) for classes in cluster_classes], dtype=float)
+    scale = clusters_total / sampled
+    population = int(round(sizes.sum() * scale))
+
+    estimates = {}
+    for key, label in CLASSES.items():
+        per_cluster = totals[label].to_numpy() if label in totals else np.zeros(sampled)
+        spread = per_cluster.var(ddof=1) if sampled > 1 else 0.0
+        variance = clusters_total ** 2 * (1 - sampled / clusters_total) * spread / sampled
+        estimates[key] = _interval(per_cluster.sum() * scale, variance, population)
+    return population, estimates
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Known Microsoft 365 Copilot usage report layouts, matched from a file's header row.
+
+Only the header is read to decide whether a file is usable, so unknown or
+incomplete reports are rejected before any parsing. A matched layout maps the
+file's columns onto the canonical names the analyzer works with
+(``Report Refresh Date``, ``User Principal Name`` and one
+``Last activity date of <Tool> (UTC)`` column per Copilot tool) and tells the
+parser which columns to read and how.
+"""
+import re
+
+import pandas as pd
+from openpyxl import load_workbook
+
+UPN = 'User Principal Name'
+REPORT_DATE = 'Report Refresh Date'
+TOOL_PREFIX = 'Last activity date of '
+TOOL_SUFFIX = ' (UTC)'
+
+
+def tool_column(tool):
+    return f"{TOOL_PREFIX}{tool}{TOOL_SUFFIX}"
+
+
+def tool_name(column):
+    """'Last activity date of Word Copilot (UTC)' -> 'Word Copilot'"""
+    return column.replace(TOOL_PREFIX, '').replace(TOOL_SUFFIX, '')
+
+
+def _key(column):
+    return ' '.join(str(column).split()).lower()
+
+
+class ReportLayout:
+    def __init__(self, name, aliases, tool_pattern):
+        self.name = name
+        # Canonical column -> accepted header spellings
+        self.aliases = aliases
+        # Matches a tool column's normalized header; group 1 is the tool name
+        self.tool_pattern = re.compile(tool_pattern)
+
+    def match(self, columns):
+        """Rename map (file header -> canonical name) and canonical tool columns, or the missing columns"""
+        keys = {_key(column): column for column in columns}
+        rename, missing = {}, []
+        for canonical, spellings in self.aliases.items():
+            found = next((keys[_key(spelling)] for spelling in spellings if _key(spelling) in keys), None)
+            if found is None:
+                missing.append(canonical)
+            else:
+                rename[found] = canonical
+        if missing:
+            return None, missing
+
+        tool_cols = []
+        for column in columns:
+            if column in rename:
+                continue
+            match = self.tool_pattern.fullmatch(_key(column))
+            if match:
+                # Tool names keep the file's capitalization
+                start, end = match.span(1)
+                canonical = tool_column(' '.join(str(column).split())[start:end])
+                rename[column] = canonical
+                tool_cols.append(canonical)
+        if not tool_cols:
+            return None, ['Copilot tool activity columns']
+        return rename, tool_cols
+
+
+LAYOUTS = [
+    # Microsoft 365 admin center export
+    ReportLayout('admin_center', {
+        REPORT_DATE: [REPORT_DATE],
+        UPN: [UPN, 'UserPrincipalName']
+    }, r'last activity date of (.+) \(utc\)'),
+    # Microsoft Graph getMicrosoft365CopilotUsageUserDetail (CSV)
+    ReportLayout('graph_user_detail', {
+        REPORT_DATE: [REPORT_DATE],
+        UPN: [UPN, 'UserPrincipalName']
+    }, r'(.+) last activity date')
+]
+
+
+class ReportSchema:
+    """A file's matched layout: what to read, what to call it and how to type it"""
+
+    def __init__(self, layout, rename, tool_cols):
+        self.layout = layout
+        self.rename = rename
+        self.tool_cols = tool_cols
+
+    @property
+    def usecols(self):
+        return list(self.rename)
+
+    @property
+    def dtypes(self):
+        # Everything is read as text; dates are parsed once, after renaming
+        return {column: str for column in self.rename}
+
+    def apply(self, df):
+        """Keep and rename the mapped columns"""
+        return df[self.usecols].rename(columns=self.rename)
+
+
+def match_columns(columns):
+    """ReportSchema for a header; ValueError naming what is missing when no layout fits"""
+    columns = list(columns)
+    problems = []
+    for layout in LAYOUTS:
+        rename, found = layout.match(columns)
+        if rename is not None:
+            return ReportSchema(layout.name, rename, found)
+        problems.append(f"{layout.name}: missing {', '.join(found)}")
+    raise ValueError(f"Unrecognized usage report layout ({'; '.join(problems)})")
+
+
+def read_header(filepath):
+    """Column names from the first row only"""
+    lower = filepath.lower()
+    if lower.endswith('.csv'):
+        return list(pd.read_csv(filepath, nrows=0).columns)
+    if not lower.endswith(('.xlsx', '.xlsm')):
+        return list(pd.read_excel(filepath, nrows=0).columns)
+    workbook = load_workbook(filepath, read_only=True)
+    try:
+        header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        return [column for column in header if column is not None]
+    finally:
+        workbook.close()
+
+
+def sniff_report(filepath):
+    """ReportSchema for a usage report file, from its header alone"""
+    return match_columns(read_header(filepath))
+
+
+def merge_tool_columns(schemas):
+    """Canonical tool columns across reports, in first-seen order"""
+    tool_cols = []
+    for schema in schemas:
+        tool_cols.extend(column for column in schema.tool_cols if column not in tool_cols)
+    return tool_cols
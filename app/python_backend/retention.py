@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Cohort retention by first-appearance month.
+
+Users are grouped into cohorts by the month of their ``First Appearance``; a
+cohort's retention at offset ``k`` is the share of its users with any tool
+activity ``k`` months later. Activity is held as a sparse (user x month)
+matrix in coordinate form, built once from the long-format usage rows, so the
+whole triangle comes from one grouped count over its non-zero cells.
+
+Counts are kept per (Company, Department, City) group of the target file and
+are additive: any filter on those dimensions is answered by summing groups.
+"""
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import UNKNOWN
+from out_of_core import UPN, NO_TOOL
+
+DIMENSIONS = ['Company', 'Department', 'City']
+
+
+class ActivityMatrix:
+    """Sparse boolean (user x month) activity: ``users[rows[i]]`` was active in ``months[cols[i]]``"""
+
+    def __init__(self, users, months, rows, cols):
+        self.users = users
+        self.months = months
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def shape(self):
+        return len(self.users), len(self.months)
+
+    @property
+    def nnz(self):
+        return len(self.rows)
+
+
+def _month_codes(values):
+    return np.asarray(values, dtype='datetime64[M]').astype(np.int64)
+
+
+def build_activity_matrix(long_parts, emails, first_month, last_month):
+    """ActivityMatrix of ``emails`` over the months ``first_month``..``last_month`` (``pd.Period``s).
+
+    ``long_parts`` yields long-format rows (out_of_core.to_long); a user may
+    span several parts.
+    """
+    users = pd.Index(emails)
+    months = pd.period_range(first_month, last_month, freq='M')
+    base = _month_codes([first_month.start_time])[0]
+    width = len(months)
+
+    # Cells are marked in a dense byte mask (users x months is small next to
+    # the long rows), which also yields them sorted and deduplicated
+    seen = np.zeros(len(users) * width, dtype=bool)
+    for long_df in long_parts:
+        activity = long_df[long_df['Tool'] != NO_TOOL]
+        rows = users.get_indexer(activity[UPN])
+        cols = _month_codes(activity['Activity Date'].to_numpy()) - base
+        keep = (rows >= 0) & (cols >= 0) & (cols < width)
+        seen[rows[keep].astype(np.int64) * width + cols[keep]] = True
+
+    rows, cols = np.divmod(np.flatnonzero(seen), width)
+    return ActivityMatrix(users, months, rows, cols)
+
+
+def cohort_retention(matrix, first_appearance, dimensions=None):
+    """Cohort sizes and active counts per (Company, Department, City) group.
+
+    ``first_appearance`` holds each matrix user's first appearance date, in
+    matrix order; ``dimensions`` their Company, Department and City (all
+    unknown without a target file). Returns ``(cohorts, cells)``: one row per
+    group and cohort month with its ``Users``, and one row per group, cohort
+    and ``Offset`` (months since the cohort month) with its ``Active`` users.
+    """
+    n_users, width = matrix.shape
+    if dimensions is None:
+        dimensions = pd.DataFrame(UNKNOWN, index=range(n_users), columns=DIMENSIONS)
+    dimensions = dimensions[DIMENSIONS].reset_index(drop=True).fillna(UNKNOWN).astype(str)
+    group_codes, groups = pd.MultiIndex.from_frame(dimensions).factorize(sort=True)
+    groups = pd.DataFrame(list(groups), columns=DIMENSIONS)
+
+    base = _month_codes([matrix.months[0].start_time])[0]
+    cohort = np.clip(_month_codes(pd.to_datetime(first_appearance).to_numpy()) - base, 0, width - 1)
+
+    # Cohort sizes: one count per (group, cohort)
+    sizes = np.bincount(group_codes * width + cohort, minlength=len(groups) * width).reshape(len(groups), width)
+    group_index, cohort_index = np.nonzero(sizes)
+    cohorts = groups.loc[group_index].reset_index(drop=True)
+    cohorts['Cohort'] = matrix.months[cohort_index].strftime('%Y-%m')
+    cohorts['Users'] = sizes[group_index, cohort_index]
+
+    # Active users: every non-zero (user, month) at or after the user's cohort
+    offsets = matrix.cols - cohort[matrix.rows]
+    later = offsets >= 0
+    keys = (group_codes[matrix.rows[later]] * width + cohort[matrix.rows[later]]) * width + offsets[later]
+    keys, active = np.unique(keys, return_counts=True)
+    group_cohort, offset = np.divmod(keys, width)
+    group_index, cohort_index = np.divmod(group_cohort, width)
+    cells = groups.loc[group_index].reset_index(drop=True)
+    cells['Cohort'] = matrix.months[cohort_index].strftime('%Y-%m')
+    cells['Offset'] = offset
+    cells['Active'] = active
+    return cohorts, cells
+
+
+def retention_triangle(cohorts, cells, months):
+    """Cohort x offset table of the share of each cohort still active, across all groups"""
+    sizes = cohorts.groupby('Cohort')['Users'].sum()
+    active = cells.groupby(['Cohort', 'Offset'])['Active'].sum().unstack(fill_value=0)
+    width = len(months)
+    active = active.reindex(index=sizes.index, columns=range(width), fill_value=0)
+    triangle = active.div(sizes, axis=0)
+    # Offsets past the last report month are unknown, not zero
+    position = pd.Series(range(width), index=months.strftime('%Y-%m'))
+    remaining = width - position.reindex(sizes.index).to_numpy()
+    triangle = triangle.where(np.arange(width)[None, :] < remaining[:, None])
+    triangle.columns = [f"Month {offset}" for offset in triangle.columns]
+    triangle.insert(0, 'Users', sizes)
+    return triangle.dropna(axis=1, how='all')
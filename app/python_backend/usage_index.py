@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Per-session index of raw usage rows for single-user timeline lookups.
+
+``usage_timeline.dat`` holds one contiguous block per user: a little-endian
+uint16 email length, the UTF-8 email, then that user's rows as int32 records
+``[report day, activity day per tool...]`` (days since 1970-01-01, ``-1`` for
+no activity), sorted by report date. ``usage_timeline.idx`` is a table of
+fixed-width entries sorted by the first 8 bytes of the SHA-1 of the email
+(big-endian, so byte order is numeric order), each pointing at one block.
+A lookup is a binary search over the entries plus one contiguous read; the
+email stored in the block resolves hash collisions.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+INDEX_ENTRY = np.dtype([('hash', '>u8'), ('offset', '<u8'), ('length', '<u4'), ('rows', '<u4')])
+NO_ACTIVITY = -1
+
+
+def email_hash(email):
+    return int.from_bytes(hashlib.sha1(email.encode('utf-8')).digest()[:8], 'big')
+
+
+def _days(values):
+    """datetime64 values -> int32 days since the epoch, NO_ACTIVITY for NaT"""
+    values = pd.to_datetime(values)
+    days = values.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return np.where(pd.isna(values), NO_ACTIVITY, days).astype('<i4')
+
+
+def write_usage_timeline(usage_parts, tool_cols, data_path, index_path):
+    """Write the data and index files; return the number of rows written.
+
+    ``usage_parts`` yields usage frames that never split a user across two
+    frames: the whole (filtered) frame, or one out-of-core partition each.
+    """
+    entries = []
+    offset = 0
+    rows_written = 0
+    with open(data_path, 'wb') as f:
+        for usage_df in usage_parts:
+            usage_df = usage_df.sort_values(['User Principal Name', 'Report Refresh Date'], kind='stable')
+            records = np.empty((len(usage_df), 1 + len(tool_cols)), dtype='<i4')
+            records[:, 0] = _days(usage_df['Report Refresh Date'])
+            for column, tool_col in enumerate(tool_cols, 1):
+                records[:, column] = _days(usage_df[tool_col])
+
+            users = usage_df['User Principal Name'].to_numpy()
+            starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.array([], dtype=int)
+            ends = np.r_[starts[1:], len(users)]
+            part_entries = np.empty(len(starts), dtype=INDEX_ENTRY)
+            for position, (start, end) in enumerate(zip(starts, ends)):
+                email = users[start]
+                encoded = email.encode('utf-8')
+                block = len(encoded).to_bytes(2, 'little') + encoded + records[start:end].tobytes()
+                f.write(block)
+                part_entries[position] = (email_hash(email), offset, len(block), end - start)
+                offset += len(block)
+            entries.append(part_entries)
+            rows_written += len(records)
+
+    entries = np.concatenate(entries) if entries else np.empty(0, dtype=INDEX_ENTRY)
+    entries.sort(order=['hash', 'offset'])
+    entries.tofile(index_path)
+    return rows_written
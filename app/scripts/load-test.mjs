@@ -0,0 +1,504 @@
+#!/usr/bin/env node
+// Load test for the analysis API, run against a local server with generated
+// reports. Offline and dependency-free (Node 20+, Linux for RSS sampling).
+//
+//   npm run loadtest -- --start --users 2000 --months 6 --rate 2 --duration 60
+//   npm run loadtest -- --url http://localhost:3000 --server-pid 1234 --concurrency 8 --rate 0
+//
+// Requests arrive as a Poisson process at --rate per second (open loop), or
+// back to back from --concurrency workers when --rate is 0 (closed loop). At
+// most --concurrency requests are in flight; arrivals beyond that are counted
+// as dropped, not queued, so a saturated server shows up as drops and latency.
+//
+// Every analyze request appends a row of its own to each report, so uploads
+// never repeat and each one runs the analyzer instead of restoring a cached
+// result; --same-uploads sends identical bytes to measure cache restores. With
+// --start the server keeps its sessions, caches and history in the throwaway
+// data directory rather than the app's temp/.
+
+import { spawn } from 'child_process'
+import { mkdtempSync, openAsBlob, readdirSync, readFileSync, rmSync, writeFileSync } from 'fs'
+import os from 'os'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+const APP_DIR = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '..')
+
+const TOOLS = [
+  'Microsoft Teams Copilot', 'Word Copilot', 'Excel Copilot', 'PowerPoint Copilot',
+  'Outlook Copilot', 'OneNote Copilot', 'Loop Copilot', 'Copilot Chat'
+]
+const COMPANIES = ['Contoso', 'Fabrikam', 'Northwind']
+const DEPARTMENTS = ['Sales', 'IT', 'HR', 'Finance', 'Marketing', 'Operations']
+const CITIES = ['London', 'Paris', 'Seattle', 'Singapore']
+const DOWNLOAD_TYPES = ['excel', 'html', 'org-rollup', 'docx']
+
+const DEFAULTS = {
+  url: 'http://localhost:3000',
+  start: false,
+  port: 3100,
+  // Without --start, the server's pid (e.g. `pgrep -f "next start"`) enables server RSS
+  serverPid: 0,
+  users: 1000,
+  months: 6,
+  seed: 1,
+  concurrency: 4,
+  rate: 1,
+  duration: 30,
+  timeout: 600,
+  mix: 'analyze=1,deep-dive-get=4,deep-dive-post=2,download=3',
+  json: null,
+  keepData: false,
+  sameUploads: false
+}
+
+function parseArgs(argv) {
+  const options = { ...DEFAULTS }
+  for (let i = 0; i < argv.length; i++) {
+    const arg = argv[i]
+    if (!arg.startsWith('--')) throw new Error(`Unexpected argument "${arg}"`)
+    const key = arg.slice(2).replace(/-([a-z])/g, (_, letter) => letter.toUpperCase())
+    if (!(key in DEFAULTS)) throw new Error(`Unknown option ${arg}`)
+    if (typeof DEFAULTS[key] === 'boolean') {
+      options[key] = true
+      continue
+    }
+    const value = argv[++i]
+    if (value === undefined) throw new Error(`${arg} needs a value`)
+    options[key] = typeof DEFAULTS[key] === 'number' ? Number(value) : value
+    if (typeof DEFAULTS[key] === 'number' && !(Number.isFinite(options[key]) && options[key] >= 0)) {
+      throw new Error(`${arg} must be a non-negative number`)
+    }
+  }
+  if (options.start) options.url = `http://localhost:${options.port}`
+  options.concurrency = Math.max(1, Math.floor(options.concurrency))
+  return options
+}
+
+function parseMix(mix) {
+  const weights = {}
+  for (const part of mix.split(',')) {
+    const [name, weight] = part.split('=')
+    if (!(name in SCENARIOS)) throw new Error(`Unknown scenario "${name}" in --mix`)
+    weights[name] = Number(weight ?? 1)
+  }
+  return weights
+}
+
+// Deterministic PRNG so runs with the same --seed upload the same reports
+function mulberry32(seed) {
+  return () => {
+    seed = (seed + 0x6D2B79F5) | 0
+    let t = Math.imul(seed ^ (seed >>> 15), 1 | seed)
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296
+  }
+}
+
+// A target users file and one admin-center usage report per month
+function generateReports(dir, { users, months, seed }) {
+  const random = mulberry32(seed)
+  const pick = values => values[Math.floor(random() * values.length)]
+  const isoDate = date => date.toISOString().slice(0, 10)
+
+  const target = ['UserPrincipalName,Company,Department,City,ManagerLine']
+  // Per-user activity propensity: heavy, occasional, rare or dormant
+  const propensity = []
+  for (let i = 0; i < users; i++) {
+    const department = pick(DEPARTMENTS)
+    target.push([
+      `user${i}@contoso.com`, pick(COMPANIES), department, pick(CITIES),
+      `Chief Executive -> VP ${department} -> Manager ${department} ${i % 12}`
+    ].join(','))
+    propensity.push([0.8, 0.4, 0.1, 0][i % 4])
+  }
+  const targetPath = path.join(dir, 'target_users.csv')
+  writeFileSync(targetPath, target.join('\n') + '\n')
+
+  const header = ['Report Refresh Date', 'User Principal Name', 'Display Name',
+    ...TOOLS.map(tool => `Last activity date of ${tool} (UTC)`)]
+  const reportPaths = []
+  const refreshDates = []
+  const end = new Date(Date.UTC(2024, 11, 28))
+  for (let month = 0; month < months; month++) {
+    const refresh = new Date(Date.UTC(end.getUTCFullYear(), end.getUTCMonth() - (months - 1 - month), 28))
+    const rows = [header.join(',')]
+    for (let i = 0; i < users; i++) {
+      if (random() < 0.05) continue
+      const dates = TOOLS.map(() => random() < propensity[i]
+        ? isoDate(new Date(refresh.getTime() - Math.floor(random() * 27) * 86400000))
+        : '')
+      rows.push([isoDate(refresh), `user${i}@contoso.com`, `User ${i}`, ...dates].join(','))
+    }
+    const reportPath = path.join(dir, `usage_${String(month).padStart(2, '0')}.csv`)
+    writeFileSync(reportPath, rows.join('\n') + '\n')
+    reportPaths.push(reportPath)
+    refreshDates.push(isoDate(refresh))
+  }
+  return { targetPath, reportPaths, refreshDates }
+}
+
+// `upload` numbers the analyze requests; unless it is null (--same-uploads)
+// each report gets a trailing row for an inactive user unique to the request,
+// which changes every content hash without changing the classifications
+async function analysisForm(data, upload) {
+  const form = new FormData()
+  form.append('targetUsersFile', await openAsBlob(data.targetPath), 'target_users.csv')
+  for (const [i, reportPath] of data.reportPaths.entries()) {
+    const parts = [await openAsBlob(reportPath)]
+    if (upload !== null) {
+      parts.push([data.refreshDates[i], `loadtest${upload}@contoso.com`, `Load Test ${upload}`,
+        ...TOOLS.map(() => '')].join(',') + '\n')
+    }
+    form.append(`usageReportFile_${i}`, new Blob(parts), path.basename(reportPath))
+  }
+  form.append('filters', JSON.stringify({ departments: DEPARTMENTS.slice(0, 3) }))
+  return form
+}
+
+// Each scenario issues one request; `state` holds the session the read-only
+// scenarios target (the warm-up analysis, replaced by later ones)
+const SCENARIOS = {
+  'analyze': async (options, state) => ({
+    url: '/api/analyze',
+    init: { method: 'POST', body: await analysisForm(state.data, options.sameUploads ? null : state.uploads++) },
+    onBody: body => {
+      const sessionId = JSON.parse(body.toString()).sessionId
+      if (sessionId) state.sessionId = sessionId
+    }
+  }),
+  'deep-dive-get': async (options, state) => ({
+    url: `/api/deep-dive?sessionId=${state.sessionId}`,
+    init: { headers: { 'accept-encoding': 'br, gzip' } }
+  }),
+  'deep-dive-post': async (options, state) => ({
+    url: `/api/deep-dive?sessionId=${state.sessionId}`,
+    init: {
+      method: 'POST',
+      headers: { 'content-type': 'application/json' },
+      body: JSON.stringify({ selectedUsers: sampleUsers(state, 5) })
+    }
+  }),
+  'download': async (options, state) => {
+    const type = DOWNLOAD_TYPES[Math.floor(Math.random() * DOWNLOAD_TYPES.length)]
+    return {
+      label: `download/${type}`,
+      url: `/api/download/${type}?sessionId=${state.sessionId}`,
+      init: { headers: { 'accept-encoding': 'br, gzip' } }
+    }
+  }
+}
+
+function sampleUsers(state, count) {
+  const users = []
+  for (let i = 0; i < count; i++) {
+    users.push(`user${Math.floor(Math.random() * state.users)}@contoso.com`)
+  }
+  return users
+}
+
+function percentile(sorted, p) {
+  if (sorted.length === 0) return null
+  return sorted[Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)]
+}
+
+class Recorder {
+  constructor() {
+    this.byEndpoint = new Map()
+    this.dropped = 0
+  }
+
+  record(label, { ms, ok, status, bytes, error }) {
+    let entry = this.byEndpoint.get(label)
+    if (!entry) {
+      entry = { latencies: [], errors: 0, statuses: {}, bytes: 0, lastError: null }
+      this.byEndpoint.set(label, entry)
+    }
+    entry.latencies.push(ms)
+    entry.bytes += bytes
+    entry.statuses[status] = (entry.statuses[status] || 0) + 1
+    if (!ok) {
+      entry.errors++
+      entry.lastError = error || `HTTP ${status}`
+    }
+  }
+
+  summary(elapsedSeconds) {
+    const endpoints = {}
+    const all = []
+    let errors = 0
+    for (const [label, entry] of [...this.byEndpoint].sort()) {
+      const sorted = [...entry.latencies].sort((a, b) => a - b)
+      all.push(...sorted)
+      errors += entry.errors
+      endpoints[label] = summarize(sorted, entry.errors, elapsedSeconds, {
+        statuses: entry.statuses,
+        bytes: entry.bytes,
+        lastError: entry.lastError
+      })
+    }
+    all.sort((a, b) => a - b)
+    return {
+      total: summarize(all, errors, elapsedSeconds, { dropped: this.dropped }),
+      endpoints
+    }
+  }
+}
+
+function summarize(sorted, errors, elapsedSeconds, extra) {
+  const round = value => value === null ? null : Math.round(value * 10) / 10
+  return {
+    requests: sorted.length,
+    errors,
+    errorRate: sorted.length ? errors / sorted.length : 0,
+    throughput: sorted.length / elapsedSeconds,
+    p50Ms: round(percentile(sorted, 50)),
+    p95Ms: round(percentile(sorted, 95)),
+    p99Ms: round(percentile(sorted, 99)),
+    maxMs: round(sorted[sorted.length - 1] ?? null),
+    ...extra
+  }
+}
+
+async function issue(options, state, recorder, scenario) {
+  const request = await SCENARIOS[scenario](options, state)
+  const label = request.label || scenario
+  const started = performance.now()
+  try {
+    const response = await fetch(options.url + request.url, {
+      ...request.init,
+      signal: AbortSignal.timeout(options.timeout * 1000)
+    })
+    // Latency includes reading the whole body
+    const body = Buffer.from(await response.arrayBuffer())
+    const ms = performance.now() - started
+    const ok = response.status < 400
+    if (ok && request.onBody) request.onBody(body)
+    recorder.record(label, { ms, ok, status: response.status, bytes: body.length, error: ok ? null : errorMessage(body) })
+    return ok
+  } catch (error) {
+    recorder.record(label, { ms: performance.now() - started, ok: false, status: 'network', bytes: 0, error: error.message })
+    return false
+  }
+}
+
+function errorMessage(body) {
+  try {
+    const parsed = JSON.parse(body.toString())
+    return parsed.error || parsed.message || body.toString().slice(0, 200)
+  } catch {
+    return body.toString().slice(0, 200)
+  }
+}
+
+// RSS of the server process tree (node) and of its analyzer children
+// (python), summed per kind and sampled from /proc
+class RssSampler {
+  constructor(rootPid) {
+    this.rootPid = rootPid
+    this.pageSize = 4096
+    this.samples = { server: [], python: [] }
+  }
+
+  processes() {
+    const parents = new Map()
+    const info = new Map()
+    for (const entry of readdirSync('/proc')) {
+      if (!/^\d+$/.test(entry)) continue
+      try {
+        const stat = readFileSync(`/proc/${entry}/stat`, 'utf-8')
+        // comm may contain spaces; fields after it are space separated
+        const comm = stat.slice(stat.indexOf('(') + 1, stat.lastIndexOf(')'))
+        const fields = stat.slice(stat.lastIndexOf(')') + 2).split(' ')
+        const pid = Number(entry)
+        parents.set(pid, Number(fields[1]))
+        info.set(pid, { comm, rssBytes: Number(fields[21]) * this.pageSize })
+      } catch {
+        // Exited while scanning
+      }
+    }
+    return { parents, info }
+  }
+
+  sample() {
+    const { parents, info } = this.processes()
+    let server = 0
+    let python = 0
+    for (const [pid, { comm, rssBytes }] of info) {
+      const isAnalyzer = comm.startsWith('python')
+      if (this.rootPid) {
+        let ancestor = pid
+        while (ancestor && ancestor !== this.rootPid) ancestor = parents.get(ancestor)
+        if (!ancestor) continue
+      } else if (!isAnalyzer || !this.isAnalyzerCommand(pid)) {
+        continue
+      }
+      if (isAnalyzer) python += rssBytes
+      else server += rssBytes
+    }
+    if (this.rootPid) this.samples.server.push(server)
+    this.samples.python.push(python)
+  }
+
+  isAnalyzerCommand(pid) {
+    try {
+      return readFileSync(`/proc/${pid}/cmdline`, 'utf-8').includes('copilot_analyzer.py')
+    } catch {
+      return false
+    }
+  }
+
+  start(intervalMs = 500) {
+    if (process.platform !== 'linux') return
+    this.sample()
+    this.timer = setInterval(() => this.sample(), intervalMs)
+  }
+
+  stop() {
+    clearInterval(this.timer)
+    const mb = bytes => Math.round(bytes / 1024 / 1024)
+    const describe = samples => samples.length === 0 ? null : {
+      meanMb: mb(samples.reduce((total, value) => total + value, 0) / samples.length),
+      peakMb: mb(Math.max(...samples))
+    }
+    return { server: describe(this.samples.server), python: describe(this.samples.python) }
+  }
+}
+
+async function waitForServer(url, deadlineMs) {
+  const deadline = Date.now() + deadlineMs
+  while (Date.now() < deadline) {
+    try {
+      await fetch(url, { signal: AbortSignal.timeout(2000) })
+      return
+    } catch {
+      await new Promise(resolve => setTimeout(resolve, 500))
+    }
+  }
+  throw new Error(`Server at ${url} did not respond within ${deadlineMs / 1000}s`)
+}
+
+// `next start` on --port, from a production build in .next. Sessions, caches
+// and the history store go under `dataDir`, so synthetic runs leave no trace
+// in the app's own temp/.
+function startServer(options, dataDir) {
+  const child = spawn(path.join(APP_DIR, 'node_modules', '.bin', 'next'), ['start', '-p', String(options.port)], {
+    cwd: APP_DIR,
+    env: {
+      ...process.env,
+      APP_TEMP_DIR: path.join(dataDir, 'server-temp'),
+      HISTORY_DATABASE_URL: `file:${path.join(dataDir, 'history.sqlite3')}`
+    },
+    stdio: ['ignore', 'ignore', 'inherit'],
+    detached: true
+  })
+  child.on('exit', code => {
+    if (code) console.error(`Server exited with code ${code}`)
+  })
+  return child
+}
+
+async function run(options) {
+  const mix = parseMix(options.mix)
+  const scenarios = Object.keys(mix).filter(name => mix[name] > 0)
+  const totalWeight = scenarios.reduce((total, name) => total + mix[name], 0)
+  if (totalWeight === 0) throw new Error('--mix gives every scenario a weight of 0')
+  const chooseScenario = () => {
+    let roll = Math.random() * totalWeight
+    for (const name of scenarios) {
+      roll -= mix[name]
+      if (roll < 0) return name
+    }
+    return scenarios[scenarios.length - 1]
+  }
+
+  const dataDir = mkdtempSync(path.join(os.tmpdir(), 'copilot-loadtest-'))
+  const data = generateReports(dataDir, options)
+  const state = { data, users: options.users, sessionId: null, uploads: 0 }
+  console.log(`Generated ${options.users} users x ${options.months} monthly reports in ${dataDir}`)
+
+  const server = options.start ? startServer(options, dataDir) : null
+  try {
+    await waitForServer(options.url, 120000)
+
+    // One analysis up front gives the read-only scenarios a session to hit
+    const warmup = new Recorder()
+    if (!(await issue(options, state, warmup, 'analyze')) || !state.sessionId) {
+      const { lastError } = warmup.byEndpoint.get('analyze')
+      throw new Error(`Warm-up analysis failed: ${lastError}`)
+    }
+    console.log(`Warm-up analysis took ${Math.round(warmup.byEndpoint.get('analyze').latencies[0])} ms; session ${state.sessionId}`)
+
+    const recorder = new Recorder()
+    const sampler = new RssSampler(server?.pid || options.serverPid)
+    sampler.start()
+    const started = performance.now()
+    const deadline = started + options.duration * 1000
+    const pending = new Set()
+    const launch = () => {
+      const request = issue(options, state, recorder, chooseScenario()).finally(() => pending.delete(request))
+      pending.add(request)
+      return request
+    }
+
+    if (options.rate > 0) {
+      let nextArrival = started
+      while (nextArrival < deadline) {
+        await new Promise(resolve => setTimeout(resolve, Math.max(0, nextArrival - performance.now())))
+        if (pending.size < options.concurrency) launch()
+        else recorder.dropped++
+        nextArrival += -Math.log(1 - Math.random()) / options.rate * 1000
+      }
+    } else {
+      const worker = async () => {
+        while (performance.now() < deadline) await launch()
+      }
+      await Promise.all(Array.from({ length: options.concurrency }, worker))
+    }
+    await Promise.all(pending)
+    const elapsedSeconds = (performance.now() - started) / 1000
+
+    return {
+      config: { ...options, mix },
+      elapsedSeconds,
+      ...recorder.summary(elapsedSeconds),
+      rss: sampler.stop()
+    }
+  } finally {
+    if (server) process.kill(-server.pid, 'SIGTERM')
+    if (!options.keepData) rmSync(dataDir, { recursive: true, force: true })
+  }
+}
+
+function printReport(report) {
+  const rows = [['endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms']]
+  const row = (label, stats) => [
+    label, stats.requests, `${stats.errors} (${(stats.errorRate * 100).toFixed(1)}%)`,
+    stats.throughput.toFixed(2), stats.p50Ms ?? '-', stats.p95Ms ?? '-', stats.p99Ms ?? '-', stats.maxMs ?? '-'
+  ].map(String)
+  for (const [label, stats] of Object.entries(report.endpoints)) rows.push(row(label, stats))
+  rows.push(row('total', report.total))
+  const widths = rows[0].map((_, column) => Math.max(...rows.map(cells => cells[column].length)))
+  console.log()
+  for (const cells of rows) {
+    console.log(cells.map((cell, column) => column === 0 ? cell.padEnd(widths[column]) : cell.padStart(widths[column])).join('  '))
+  }
+  console.log(`\n${report.elapsedSeconds.toFixed(1)} s, ${report.total.dropped} arrivals dropped at the concurrency limit`)
+  const { server, python } = report.rss
+  if (server) console.log(`Server RSS: mean ${server.meanMb} MB, peak ${server.peakMb} MB`)
+  if (python) console.log(`Analyzer (python) RSS, all processes: mean ${python.meanMb} MB, peak ${python.peakMb} MB`)
+  for (const [label, stats] of Object.entries(report.endpoints)) {
+    if (stats.lastError) console.log(`Last ${label} error: ${stats.lastError}`)
+  }
+}
+
+try {
+  const options = parseArgs(process.argv.slice(2))
+  const report = await run(options)
+  printReport(report)
+  if (options.json) writeFileSync(options.json, JSON.stringify(report, null, 2))
+  process.exit(report.total.errors > 0 ? 1 : 0)
+} catch (error) {
+  console.error(error.message)
+  process.exit(1)
+}